@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import Field
 
@@ -26,15 +26,70 @@ class Settings(BaseSettings):
     frontend_url: str = Field(default="http://localhost:5173")
 
     openrouter_api_key: Optional[str] = Field(default=None)
+    openrouter_max_connections: int = Field(default=100, ge=1)
+    openrouter_max_keepalive_connections: int = Field(default=20, ge=0)
+    openrouter_keepalive_expiry: float = Field(default=30.0, ge=0.0)
+    openrouter_http2: bool = Field(default=False)
+    openrouter_timeout: float = Field(default=30.0, gt=0.0)
+    openrouter_connect_timeout: float = Field(default=10.0, gt=0.0)
+    openrouter_max_retries: int = Field(default=2, ge=0)
+    openrouter_retry_base_delay: float = Field(default=0.5, ge=0.0)
+    openrouter_retry_max_delay: float = Field(default=8.0, ge=0.0)
+    openrouter_max_retry_after: float = Field(default=30.0, ge=0.0)
+    openrouter_hedge_after: Optional[float] = Field(default=None, gt=0.0)
     default_provider: Literal["openrouter", "huggingface"] = Field(default="openrouter")
+    enabled_providers: List[str] = Field(
+        default_factory=lambda: ["openrouter", "huggingface"]
+    )
+    model_catalog_ttl: float = Field(default=300.0, ge=0.0)
+    model_list_timeout: float = Field(default=5.0, gt=0.0)
+    model_list_timeouts: Dict[str, float] = Field(default_factory=dict)
     local_models_path: str = Field(default="./models")
     huggingface_download_path: str = Field(default="./models")
     huggingface_token: Optional[str] = Field(default=None)
+    huggingface_mmap_weights: bool = Field(default=True)
     huggingface_max_parallel_downloads: int = Field(default=1, ge=1, le=4)
+    huggingface_model_pool_bytes: Optional[int] = Field(default=None, ge=0)
+    huggingface_model_idle_ttl: Optional[float] = Field(default=None, gt=0.0)
+    huggingface_inference_workers: int = Field(default=2, ge=1)
+    huggingface_torch_threads: Optional[int] = Field(default=None, ge=1)
+    huggingface_torch_interop_threads: Optional[int] = Field(default=None, ge=1)
+    huggingface_pin_cpus: bool = Field(default=False)
+    huggingface_worker_processes: int = Field(default=0, ge=0)
+    huggingface_worker_start_method: Literal["spawn", "forkserver", "fork"] = Field(
+        default="spawn"
+    )
+    huggingface_stream_queue_size: int = Field(default=32, ge=1)
+    huggingface_generation_timeout: Optional[float] = Field(default=None, gt=0.0)
+    huggingface_engine: Literal["pipeline", "micro_batch", "continuous"] = Field(
+        default="micro_batch"
+    )
+    huggingface_max_batch_size: int = Field(default=8, ge=1)
+    huggingface_batch_window: float = Field(default=0.01, ge=0.0)
+    huggingface_prefix_cache_bytes: int = Field(default=512 * 1024 * 1024, ge=0)
+    huggingface_prefix_cache_block_size: int = Field(default=16, ge=1)
+    preload_models: List[str] = Field(default_factory=list)
+    preload_concurrency: int = Field(default=2, ge=1)
+    preload_memory_bytes: Optional[int] = Field(default=None, ge=0)
+    preload_warmup_tokens: int = Field(default=8, ge=0)
     device: Literal["cpu", "cuda", "mps"] = Field(default="cpu")
 
     enable_interpretability: bool = Field(default=True)
 
+    provider_concurrency: Dict[str, int] = Field(
+        default_factory=lambda: {"openrouter": 64, "huggingface": 4}
+    )
+    model_concurrency: Dict[str, int] = Field(default_factory=dict)
+    admission_queue_size: int = Field(default=128, ge=0)
+    admission_queue_timeout: float = Field(default=30.0, gt=0.0)
+    batch_concurrency_per_provider: int = Field(default=4, ge=1)
+    batch_journal_path: str = Field(default="./batches")
+    coalesce_requests: bool = Field(default=True)
+    response_cache_enabled: bool = Field(default=True)
+    response_cache_max_entries: int = Field(default=512, ge=1)
+    response_cache_path: Optional[str] = Field(default=None)
+    response_cache_disk_max_bytes: int = Field(default=256 * 1024 * 1024, ge=0)
+
     if _MODEL_CONFIG is not None:
         model_config = _MODEL_CONFIG
     else:  # pragma: no cover - legacy Pydantic v1 configuration path
@@ -1,10 +1,14 @@
 from functools import lru_cache
+from typing import Optional
 
 from ..hooks.examples import AttentionCaptureHook, TokenLogHook
 from ..hooks.manager import HookManager
 from ..providers.registry import ProviderRegistry
+from ..services.batch import BatchRunner
 from ..services.chat import ChatService
 from ..services.hf_downloads import HuggingFaceDownloadManager
+from ..services.preload import ModelPreloader
+from ..services.response_cache import ResponseCache
 from .config import get_settings
 
 
@@ -29,15 +33,40 @@ def get_provider_registry() -> ProviderRegistry:
     return _provider_registry_factory()
 
 
+@lru_cache(maxsize=1)
+def _response_cache_factory() -> Optional[ResponseCache]:
+    settings = get_settings()
+    if not settings.response_cache_enabled:
+        return None
+    return ResponseCache(
+        max_entries=settings.response_cache_max_entries,
+        path=settings.response_cache_path,
+        disk_max_bytes=settings.response_cache_disk_max_bytes,
+    )
+
+
 @lru_cache(maxsize=1)
 def _chat_service_factory() -> ChatService:
-    return ChatService(get_provider_registry(), get_hook_manager())
+    return ChatService(
+        get_provider_registry(),
+        get_hook_manager(),
+        response_cache=_response_cache_factory(),
+    )
 
 
 def get_chat_service() -> ChatService:
     return _chat_service_factory()
 
 
+@lru_cache(maxsize=1)
+def _batch_runner_factory() -> BatchRunner:
+    return BatchRunner(get_chat_service(), get_settings())
+
+
+def get_batch_runner() -> BatchRunner:
+    return _batch_runner_factory()
+
+
 @lru_cache(maxsize=1)
 def _hf_download_manager_factory() -> HuggingFaceDownloadManager:
     return HuggingFaceDownloadManager(get_settings(), get_provider_registry())
@@ -45,3 +74,12 @@ def _hf_download_manager_factory() -> HuggingFaceDownloadManager:
 
 def get_hf_download_manager() -> HuggingFaceDownloadManager:
     return _hf_download_manager_factory()
+
+
+@lru_cache(maxsize=1)
+def _model_preloader_factory() -> ModelPreloader:
+    return ModelPreloader(get_settings(), get_provider_registry())
+
+
+def get_model_preloader() -> ModelPreloader:
+    return _model_preloader_factory()
@@ -56,6 +56,14 @@ class BaseHook(abc.ABC):
     async def on_token(self, context: HookContext, event: TokenEvent) -> None:
         """Called for each generated token."""
 
+    def observes_stream(self) -> bool:
+        """Whether this hook needs the token and chunk events of a stream.
+
+        Streams that no registered hook observes are relayed to the client
+        without being parsed.
+        """
+        return True
+
     def to_info(self, is_builtin: bool = False) -> HookInfo:
         return HookInfo(
             id=self.id,
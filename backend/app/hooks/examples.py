@@ -30,6 +30,9 @@ class TokenLogHook(BaseHook):
             event.probability,
         )
 
+    def observes_stream(self) -> bool:
+        return logger.isEnabledFor(logging.DEBUG)
+
 
 class AttentionCaptureHook(BaseHook):
     """Captures attention weights emitted by providers that support them."""
@@ -63,3 +66,7 @@ class AttentionCaptureHook(BaseHook):
 
     def get_attention(self, provider_id: str, model_id: str) -> Dict[str, object]:
         return self.storage.get(f"{provider_id}:{model_id}", {})
+
+    def observes_stream(self) -> bool:
+        # Streamed chunks never carry attention weights.
+        return False
@@ -38,6 +38,14 @@ class HookManager:
             for hook in sorted(merged.values(), key=lambda h: h.name.lower())
         ]
 
+    def observes_stream(self) -> bool:
+        """Return whether any token or post hook needs a stream's events."""
+        return any(
+            hook.observes_stream()
+            for hook_type in (HookType.TOKEN, HookType.POST)
+            for hook in self._iter_hooks_for_type(hook_type)
+        )
+
     async def dispatch_pre(
         self, request: ChatCompletionRequest, provider_id: str, model_id: str
     ) -> HookContext:
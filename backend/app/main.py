@@ -1,18 +1,45 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .core.config import get_settings
-from .core.dependencies import get_hook_manager, get_provider_registry
+from .core.dependencies import (
+    get_chat_service,
+    get_hook_manager,
+    get_model_preloader,
+    get_provider_registry,
+)
 from .routers import chat, hooks, huggingface, models, providers
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Open provider resources on startup and release them on shutdown."""
+    registry = get_provider_registry()
+    await registry.startup()
+    # Preloading runs in the background; /healthz reports not-ready until done.
+    preloader = get_model_preloader()
+    preloader.start()
+    try:
+        yield
+    finally:
+        await preloader.aclose()
+        await get_chat_service().aclose()
+        await registry.aclose()
+
+
 app = FastAPI(
     title="LLM Playground API",
     version="0.1.0",
     description="Backend service for hybrid LLM experimentation.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -32,9 +59,12 @@ app.include_router(huggingface.router)
 
 @app.get("/healthz")
 async def healthcheck():
-    """Simple health endpoint for readiness probes."""
-    return {
-        "status": "ok",
-        "providers": [info.id for info in get_provider_registry().list_providers()],
+    """Readiness probe: 503 until configured models are preloaded and warm."""
+    preloader = get_model_preloader()
+    body = {
+        "status": "ok" if preloader.ready else "starting",
+        "providers": get_provider_registry().provider_ids(),
         "hooks": [hook.id for hook in get_hook_manager().list_hooks()],
+        "preload": preloader.snapshot(),
     }
+    return JSONResponse(body, status_code=200 if preloader.ready else 503)
@@ -71,6 +71,9 @@ class ChatCompletionRequest(BaseModel):
 
     hook_ids: Optional[List[str]] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    # None caches deterministic (temperature=0) requests only; True/False force it.
+    cache: Optional[bool] = None
+    priority: Literal["interactive", "batch"] = "interactive"
 
     @validator("messages")
     def ensure_messages(cls, value: Iterable[ChatMessage]) -> List[ChatMessage]:
@@ -80,6 +83,43 @@ class ChatCompletionRequest(BaseModel):
         return messages
 
 
+class CompareTarget(BaseModel):
+    provider: str
+    model: str
+
+
+class ChatCompareRequest(ChatCompletionRequest):
+    targets: List[CompareTarget]
+
+    @validator("targets")
+    def ensure_targets(cls, value: Iterable[CompareTarget]) -> List[CompareTarget]:
+        targets = list(value)
+        if not targets:
+            raise ValueError("At least one target is required for comparison.")
+        return targets
+
+
+class CompareTargetStats(BaseModel):
+    target: int
+    provider: str
+    model: str
+    status: Literal["ok", "error"] = "ok"
+    error: Optional[str] = None
+    latency_ms: float = 0.0
+    first_token_ms: Optional[float] = None
+    completion_tokens: int = 0
+    tokens_per_second: Optional[float] = None
+
+
+class CompareEvent(BaseModel):
+    type: Literal["chunk", "done", "summary"]
+    target: Optional[int] = None
+    chunk: Optional[ChatCompletionChunk] = None
+    stats: Optional[CompareTargetStats] = None
+    summary: List[CompareTargetStats] = Field(default_factory=list)
+    wall_ms: Optional[float] = None
+
+
 class ProviderInfo(BaseModel):
     id: str
     name: str
@@ -97,6 +137,23 @@ class ModelInfo(BaseModel):
     meta: Dict[str, Any] = Field(default_factory=dict)
 
 
+class ProviderModelsStatus(BaseModel):
+    provider: str
+    status: Literal["ok", "timeout", "error"]
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    model_count: int = 0
+
+
+class ModelCatalogResponse(BaseModel):
+    models: List[ModelInfo] = Field(default_factory=list)
+    providers: List[ProviderModelsStatus] = Field(default_factory=list)
+
+
+class ModelCacheInvalidation(BaseModel):
+    providers: List[str] = Field(default_factory=list)
+
+
 class DownloadStatus(str, enum.Enum):
     QUEUED = "queued"
     RUNNING = "running"
@@ -1,6 +1,6 @@
+from typing import Any
+
 from .base import LLMProvider, ProviderError, StreamingNotSupportedError
-from .huggingface import HuggingFaceProvider
-from .openrouter import OpenRouterProvider
 from .registry import ProviderRegistry
 
 __all__ = [
@@ -11,3 +11,16 @@ __all__ = [
     "OpenRouterProvider",
     "ProviderRegistry",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # Provider modules are imported on demand to keep application start fast.
+    if name == "HuggingFaceProvider":
+        from .huggingface import HuggingFaceProvider
+
+        return HuggingFaceProvider
+    if name == "OpenRouterProvider":
+        from .openrouter import OpenRouterProvider
+
+        return OpenRouterProvider
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
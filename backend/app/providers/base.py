@@ -27,10 +27,17 @@ class LLMProvider(abc.ABC):
     id: str
     name: str
     supports_streaming: bool = False
+    supports_relay: bool = False
 
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
 
+    async def startup(self) -> None:
+        """Acquire long-lived resources such as connection pools."""
+
+    async def aclose(self) -> None:
+        """Release resources acquired in :meth:`startup`."""
+
     @abc.abstractmethod
     async def generate(self, payload: ChatCompletionRequest) -> ChatCompletionResponse:
         """Return a full completion response."""
@@ -43,10 +50,19 @@ class LLMProvider(abc.ABC):
             f"Provider {self.id} does not support streaming responses."
         )
 
+    async def relay(self, payload: ChatCompletionRequest) -> AsyncIterator[bytes]:
+        """Yield ready-to-send SSE frames without building chunk models."""
+        raise StreamingNotSupportedError(
+            f"Provider {self.id} does not support relayed streaming."
+        )
+
     @abc.abstractmethod
     async def get_models(self) -> List[ModelInfo]:
         """Return metadata about models available for this provider."""
 
+    def invalidate_models(self) -> None:
+        """Discard any cached model catalog; no-op for uncached providers."""
+
     async def load_model(
         self,
         model_id: str,
@@ -60,6 +76,13 @@ class LLMProvider(abc.ABC):
             f"Provider {self.id} does not support manual model loading."
         )
 
+    @classmethod
+    def describe(cls, settings: Settings) -> ProviderInfo:
+        """Details known from the class and settings, without constructing it."""
+        return ProviderInfo(
+            id=cls.id, name=cls.name, supports_streaming=cls.supports_streaming
+        )
+
     def to_info(self, *, models: Iterable[str] | None = None) -> ProviderInfo:
         return ProviderInfo(
             id=self.id,
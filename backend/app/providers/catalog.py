@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..models.schemas import ModelInfo
+from .base import ProviderError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CatalogValidators:
+    """HTTP validators used to revalidate a cached catalog upstream."""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+@dataclass
+class CatalogFetch:
+    """Result of a catalog fetch; ``models`` is ``None`` when upstream replied 304."""
+
+    models: Optional[List[ModelInfo]]
+    validators: CatalogValidators = field(default_factory=CatalogValidators)
+
+
+CatalogFetcher = Callable[[CatalogValidators], Awaitable[CatalogFetch]]
+
+
+class ModelCatalogCache:
+    """Stale-while-revalidate cache for a provider's model catalog.
+
+    Fresh entries are served from memory. Stale entries are also served
+    immediately while a single background refresh revalidates them; only a
+    cold cache makes callers wait for the network.
+    """
+
+    def __init__(
+        self,
+        fetcher: CatalogFetcher,
+        *,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self._fetcher = fetcher
+        self._clock = clock
+        self._models: Optional[List[ModelInfo]] = None
+        self._validators = CatalogValidators()
+        self._fetched_at = 0.0
+        self._generation = 0
+        self._refresh: Optional[asyncio.Task] = None
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "not_modified": 0,
+            "errors": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    async def get(self) -> List[ModelInfo]:
+        models = self._models
+        if models is not None:
+            if self._clock() - self._fetched_at < self.ttl:
+                self._counters["hits"] += 1
+            else:
+                self._counters["stale_hits"] += 1
+                self._start_refresh()
+            return list(models)
+
+        self._counters["misses"] += 1
+        while self._models is None:
+            # Shield the shared fetch so one caller timing out does not cancel
+            # it for every other waiter.
+            await asyncio.shield(self._start_refresh())
+        return list(self._models)
+
+    def invalidate(self) -> None:
+        """Drop cached data so the next lookup fetches a fresh catalog."""
+        self._generation += 1
+        self._models = None
+        self._validators = CatalogValidators()
+        self._fetched_at = 0.0
+        self._refresh = None
+
+    def stats(self) -> Dict[str, Any]:
+        cached = self._models is not None
+        return {
+            **self._counters,
+            "ttl": self.ttl,
+            "cached_models": len(self._models) if cached else 0,
+            "age": round(self._clock() - self._fetched_at, 3) if cached else None,
+            "refreshing": self._refresh is not None and not self._refresh.done(),
+            "conditional": bool(
+                self._validators.etag or self._validators.last_modified
+            ),
+            "last_error": self._last_error,
+        }
+
+    def _start_refresh(self) -> asyncio.Task:
+        task = self._refresh
+        if task is None or task.done():
+            task = asyncio.create_task(self._revalidate(self._generation))
+            task.add_done_callback(self._on_refresh_done)
+            self._refresh = task
+        return task
+
+    async def _revalidate(self, generation: int) -> None:
+        self._counters["refreshes"] += 1
+        validators = (
+            self._validators if self._models is not None else CatalogValidators()
+        )
+        result = await self._fetcher(validators)
+        if generation != self._generation:
+            return
+        if result.models is None:
+            if self._models is None:
+                raise ProviderError("Catalog revalidated without a cached copy.")
+            self._counters["not_modified"] += 1
+        else:
+            self._models = result.models
+        self._validators = result.validators
+        self._fetched_at = self._clock()
+        self._last_error = None
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self._counters["errors"] += 1
+            self._last_error = str(exc)
+            logger.warning("Model catalog refresh failed: %s", exc)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+
+from .hf_prefix_cache import PrefixCache, prefill
+from .hf_stopping import GenerationControl
+from .hf_streaming import IncrementalDecoder
+
+# A prompt as text or as already tokenized ids.
+BatchPrompt = Union[str, List[int]]
+# (prompts, per-prompt max_new_tokens, shared generate kwargs, per-prompt
+# controls) -> (text, tokens)
+BatchRunner = Callable[
+    [
+        List[BatchPrompt],
+        List[int],
+        Dict[str, Any],
+        List[Optional[GenerationControl]],
+    ],
+    List[Tuple[str, int]],
+]
+
+
+@dataclass
+class _Pending:
+    prompt: BatchPrompt
+    max_new_tokens: int
+    future: asyncio.Future
+    control: Optional[GenerationControl] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _BatchSizeStats:
+    batches: int = 0
+    requests: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+
+
+class MicroBatcher:
+    """Collects concurrent generations for one model and runs them as a batch.
+
+    Requests are grouped by their sampling parameters. A group is flushed once
+    it reaches ``max_batch_size`` or ``window`` seconds after its first request
+    arrived. Batches run one at a time in a worker thread; groups that fill up
+    meanwhile wait for the model instead of competing with it for cores.
+
+    Requests that were cancelled or ran past their deadline while queued are
+    dropped before their batch is dispatched and return no text. Each
+    request's :class:`GenerationControl` is handed to the batch runner, which
+    ends that row early; cancelling ``submit`` cancels its control.
+    """
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        *,
+        max_batch_size: int,
+        window: float,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._executor = executor
+        self._run_batch = run_batch
+        self._groups: Dict[Hashable, List[_Pending]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._kwargs: Dict[Hashable, Dict[str, Any]] = {}
+        self._model_lock = asyncio.Lock()
+        self._by_size: Dict[int, _BatchSizeStats] = {}
+        self._queue_wait = 0.0
+
+    async def submit(
+        self,
+        prompt: BatchPrompt,
+        max_new_tokens: int,
+        generate_kwargs: Dict[str, Any],
+        control: Optional[GenerationControl] = None,
+    ) -> Tuple[str, int]:
+        loop = asyncio.get_running_loop()
+        key = _group_key(generate_kwargs)
+        pending = _Pending(prompt, max_new_tokens, loop.create_future(), control)
+        group = self._groups.setdefault(key, [])
+        self._kwargs.setdefault(key, dict(generate_kwargs))
+        group.append(pending)
+        if len(group) >= self.max_batch_size:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        try:
+            return await pending.future
+        except asyncio.CancelledError:
+            if control is not None:
+                # Free the row if the batch is already running.
+                control.cancel()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        requests = sum(entry.requests for entry in self._by_size.values())
+        batches = sum(entry.batches for entry in self._by_size.values())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": round(self.window * 1000, 3),
+            "batches": batches,
+            "requests": requests,
+            "avg_batch_size": round(requests / batches, 2) if batches else None,
+            "avg_queue_wait_ms": (
+                round(self._queue_wait / requests * 1000, 2) if requests else None
+            ),
+            "pending": sum(len(group) for group in self._groups.values()),
+            "by_batch_size": {
+                size: {
+                    "batches": entry.batches,
+                    "requests_per_sec": round(entry.requests / entry.seconds, 2),
+                    "tokens_per_sec": round(entry.tokens / entry.seconds, 2),
+                }
+                for size, entry in sorted(self._by_size.items())
+                if entry.seconds > 0
+            },
+        }
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._groups.pop(key, None)
+        kwargs = self._kwargs.pop(key, {})
+        if batch:
+            asyncio.ensure_future(self._execute(batch, kwargs))
+
+    async def _execute(self, batch: List[_Pending], kwargs: Dict[str, Any]) -> None:
+        async with self._model_lock:
+            # Callers that disconnected, were cancelled or timed out while
+            # queued do not take a batch slot.
+            live = []
+            for pending in batch:
+                if pending.future.done():
+                    continue
+                if pending.control is not None and pending.control.should_abort():
+                    pending.future.set_result(("", 0))
+                    continue
+                live.append(pending)
+            if not live:
+                return
+            started = time.monotonic()
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor,
+                    self._run_batch,
+                    [pending.prompt for pending in live],
+                    [pending.max_new_tokens for pending in live],
+                    kwargs,
+                    [pending.control for pending in live],
+                )
+            except Exception as exc:
+                for pending in live:
+                    if not pending.future.done():
+                        pending.future.set_exception(exc)
+                return
+            self._record(live, results, started)
+            for pending, result in zip(live, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    def _record(
+        self,
+        batch: List[_Pending],
+        results: List[Tuple[str, int]],
+        started: float,
+    ) -> None:
+        entry = self._by_size.setdefault(len(batch), _BatchSizeStats())
+        entry.batches += 1
+        entry.requests += len(batch)
+        entry.tokens += sum(tokens for _, tokens in results)
+        entry.seconds += time.monotonic() - started
+        self._queue_wait += sum(started - pending.enqueued_at for pending in batch)
+
+
+def _group_key(generate_kwargs: Dict[str, Any]) -> Hashable:
+    return tuple(sorted(generate_kwargs.items()))
+
+
+def make_batch_runner(
+    model: Any, tokenizer: Any, prefix_cache: Optional[PrefixCache] = None
+) -> BatchRunner:
+    """Build a :data:`BatchRunner` that left-pads prompts for ``model.generate``.
+
+    With a ``prefix_cache``, tokenized prompts reuse the key/values of
+    earlier prompts that share a prefix (typically the previous chat turn),
+    so only their new tokens are prefilled.
+
+    Every row ends on its own: at its ``max_new_tokens``, at end of sequence,
+    or when its control stops it (stop sequence, deadline or cancellation).
+    ``generate`` returns as soon as every row has ended.
+    """
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+    def run(
+        prompts: List[BatchPrompt],
+        limits: List[int],
+        kwargs: Dict[str, Any],
+        controls: List[Optional[GenerationControl]],
+    ) -> List[Tuple[str, int]]:
+        from transformers import StoppingCriteriaList
+
+        if all(isinstance(prompt, str) for prompt in prompts):
+            inputs = tokenizer(prompts, return_tensors="pt", padding=True)
+        else:
+            inputs = tokenizer.pad(
+                {"input_ids": [_prompt_ids(tokenizer, prompt) for prompt in prompts]},
+                return_tensors="pt",
+            )
+        inputs = inputs.to(model.device)
+        if prefix_cache is not None and not any(isinstance(p, str) for p in prompts):
+            past = prefill(model, prompts, prefix_cache)
+            if past is not None:
+                inputs["past_key_values"] = past
+        rows = _RowStopping(tokenizer, limits, controls)
+        model.generate(
+            **inputs,
+            max_new_tokens=max(limits),
+            stopping_criteria=StoppingCriteriaList([rows]),
+            **kwargs,
+        )
+        return rows.results()
+
+    return run
+
+
+class _Row:
+    def __init__(
+        self, tokenizer: Any, limit: int, control: Optional[GenerationControl]
+    ) -> None:
+        self.limit = limit
+        self.control = control or GenerationControl()
+        self.decoder = IncrementalDecoder(tokenizer)
+        self.text: List[str] = []
+        self.tokens = 0
+        self.done = False
+
+    def push(self, token: int, eos: Set[int]) -> None:
+        if token in eos:
+            self.done = True
+            return
+        self.tokens += 1
+        self.text.append(self.control.feed(self.decoder.push([token])))
+        if self.tokens >= self.limit or self.control.done:
+            self.done = True
+
+    def result(self) -> Tuple[str, int]:
+        if not self.control.cancelled:
+            self.text.append(
+                self.control.feed(self.decoder.flush()) + self.control.flush()
+            )
+        return "".join(self.text), self.tokens
+
+
+class _RowStopping:
+    """``generate`` stopping criterion that tracks each row of a batch.
+
+    Called once per decoding step with the ids so far; it decodes each row's
+    newest token and reports which rows have ended. Rows that end early are
+    padded by ``generate`` until the rest of the batch finishes (transformers
+    releases a whole batch at once) but stop contributing text.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        limits: List[int],
+        controls: List[Optional[GenerationControl]],
+    ) -> None:
+        eos = tokenizer.eos_token_id
+        self._eos = set(eos if isinstance(eos, list) else [eos]) - {None}
+        self._rows = [_Row(tokenizer, *row) for row in zip(limits, controls)]
+        self._per_row = _per_row_stopping()
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        import torch
+
+        for row, token in zip(self._rows, input_ids[:, -1].tolist()):
+            if row.done:
+                continue
+            if row.control.should_abort():
+                row.done = True
+            else:
+                row.push(token, self._eos)
+        done = [row.done for row in self._rows]
+        if not self._per_row:
+            return all(done)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def results(self) -> List[Tuple[str, int]]:
+        return [row.result() for row in self._rows]
+
+
+def _per_row_stopping() -> bool:
+    """Whether ``generate`` accepts a per-row result from stopping criteria."""
+    import transformers
+
+    major, minor = (int(part) for part in transformers.__version__.split(".")[:2])
+    return (major, minor) >= (4, 39)
+
+
+def _prompt_ids(tokenizer: Any, prompt: BatchPrompt) -> List[int]:
+    if isinstance(prompt, str):
+        return tokenizer(prompt)["input_ids"]
+    return prompt
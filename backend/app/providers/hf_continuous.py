@@ -0,0 +1,469 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .hf_prefix_cache import PrefixCache, from_legacy, to_legacy
+from .hf_stopping import GenerationControl
+from .hf_streaming import IncrementalDecoder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    completion_tokens: int
+    finish_reason: str
+
+
+@dataclass(eq=False)
+class _Sequence:
+    id: int
+    prompt_ids: List[int]
+    max_new_tokens: int
+    do_sample: bool
+    temperature: float
+    top_p: float
+    max_pending: int
+    loop: asyncio.AbstractEventLoop
+    wakeup: asyncio.Event
+    control: GenerationControl
+    # Written by the engine thread, drained by the event loop.
+    buffer: Deque[int] = field(default_factory=collections.deque)
+    generated: int = 0
+    cache_len: int = 0
+    next_token: Optional[int] = None
+    past: Any = None
+    finish_reason: Optional[str] = None
+    error: Optional[BaseException] = None
+    cancelled: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.finish_reason is not None or self.error is not None
+
+    def notify(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # The caller's loop is gone; nothing is left to wake.
+            self.cancelled = True
+
+
+class ContinuousBatchingEngine:
+    """Iteration-level scheduler running several generations on one model.
+
+    A single engine thread owns the model. Between decoding steps it admits
+    newly submitted sequences (prefilling each prompt on its own) and retires
+    finished or abandoned ones, so short requests never wait for long ones.
+    Every sequence keeps its own KV cache; sequences that are decoded together
+    share a right-aligned, left-padded batch cache that is only rebuilt when
+    the batch membership changes. A sequence whose ``GenerationControl``
+    matches a stop sequence, passes its deadline or is cancelled leaves the
+    batch at the next step.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: Any,
+        *,
+        max_batch_size: int,
+        prefix_cache: Optional[PrefixCache] = None,
+        thread_initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self._thread_initializer = thread_initializer
+        self._eos_token_id = tokenizer.eos_token_id
+        self._submitted: "queue.SimpleQueue[Optional[_Sequence]]" = queue.SimpleQueue()
+        self._ids = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._closed = False
+        self._active: List[_Sequence] = []
+        self._batch: Optional[Tuple[List[_Sequence], Any, Any]] = None
+        self._counters: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "aborted": 0,
+            "steps": 0,
+            "step_rows": 0,
+            "tokens": 0,
+            "rebatches": 0,
+            "busy_seconds": 0.0,
+        }
+
+    async def generate(
+        self,
+        prompt: Union[str, Sequence[int]],
+        *,
+        max_new_tokens: int,
+        do_sample: bool = False,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        control: Optional[GenerationControl] = None,
+    ) -> GenerationResult:
+        sequence = self._submit(
+            prompt, max_new_tokens, do_sample, temperature, top_p, 0, control
+        )
+        chunks = [text async for text in self._drain(sequence)]
+        return GenerationResult(
+            "".join(chunks),
+            sequence.generated,
+            sequence.control.finish_reason or sequence.finish_reason or "stop",
+        )
+
+    async def stream(
+        self,
+        prompt: Union[str, Sequence[int]],
+        *,
+        max_new_tokens: int,
+        do_sample: bool = False,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        max_pending: int = 32,
+        usage: Optional[Dict[str, int]] = None,
+        control: Optional[GenerationControl] = None,
+    ) -> AsyncIterator[str]:
+        sequence = self._submit(
+            prompt, max_new_tokens, do_sample, temperature, top_p, max_pending, control
+        )
+        async for text in self._drain(sequence):
+            yield text
+        if usage is not None:
+            usage["completion_tokens"] = sequence.generated
+
+    def stats(self) -> Dict[str, Any]:
+        busy = self._counters["busy_seconds"]
+        steps = self._counters["steps"]
+        return {
+            **self._counters,
+            "busy_seconds": round(busy, 3),
+            "active": len(self._active),
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": (
+                round(self._counters["step_rows"] / steps, 2) if steps else None
+            ),
+            "tokens_per_sec": round(self._counters["tokens"] / busy, 2)
+            if busy
+            else None,
+            "prefix_cache": (
+                self.prefix_cache.stats() if self.prefix_cache is not None else None
+            ),
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        self._submitted.put(None)
+        with self._thread_lock:
+            running = self._thread is not None and self._thread.is_alive()
+        if not running:
+            self._fail_queued(RuntimeError("Inference engine is closed."))
+
+    def _submit(
+        self,
+        prompt: Union[str, Sequence[int]],
+        max_new_tokens: int,
+        do_sample: bool,
+        temperature: float,
+        top_p: float,
+        max_pending: int,
+        control: Optional[GenerationControl] = None,
+    ) -> _Sequence:
+        if self._closed:
+            raise RuntimeError("Inference engine is closed.")
+        sequence = _Sequence(
+            id=next(self._ids),
+            prompt_ids=(
+                self.tokenizer(prompt)["input_ids"]
+                if isinstance(prompt, str)
+                else list(prompt)
+            ),
+            max_new_tokens=max_new_tokens,
+            do_sample=do_sample,
+            temperature=temperature,
+            top_p=top_p,
+            max_pending=max_pending,
+            loop=asyncio.get_running_loop(),
+            wakeup=asyncio.Event(),
+            control=control or GenerationControl(),
+        )
+        self._counters["submitted"] += 1
+        self._ensure_thread()
+        self._submitted.put(sequence)
+        if self._closed:
+            # Closed meanwhile; the engine thread may already have drained.
+            self._fail_queued(RuntimeError("Inference engine is closed."))
+        return sequence
+
+    async def _drain(self, sequence: _Sequence) -> AsyncIterator[str]:
+        decoder = IncrementalDecoder(self.tokenizer)
+        control = sequence.control
+        try:
+            while not control.matcher.stopped:
+                ids = []
+                while sequence.buffer:
+                    ids.append(sequence.buffer.popleft())
+                if ids:
+                    text = control.feed(decoder.push(ids))
+                    if text:
+                        yield text
+                    continue
+                if sequence.finished:
+                    break
+                await sequence.wakeup.wait()
+                sequence.wakeup.clear()
+            if sequence.error is not None:
+                raise sequence.error
+            tail = control.feed(decoder.flush()) + control.flush()
+            if tail:
+                yield tail
+        finally:
+            # Picked up by the engine between steps; frees the sequence's cache.
+            sequence.cancelled = True
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="hf-continuous-batching", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        error: BaseException = RuntimeError("Inference engine is closed.")
+        try:
+            self._serve()
+        except BaseException as exc:  # noqa: BLE001 - reported to every caller
+            logger.exception("Continuous batching engine stopped")
+            error = exc
+        for sequence in self._active:
+            sequence.error = error
+            sequence.notify()
+        self._active = []
+        self._batch = None
+        self._fail_queued(error)
+
+    def _serve(self) -> None:
+        import torch
+
+        if self._thread_initializer is not None:
+            self._thread_initializer()
+        with torch.inference_mode():
+            while not self._closed:
+                if not self._admit(block=not self._active):
+                    break
+                if not self._active:
+                    continue
+                started = time.monotonic()
+                try:
+                    self._step()
+                except Exception as exc:  # noqa: BLE001 - reported to every caller
+                    logger.exception("Continuous batching step failed")
+                    for sequence in self._active:
+                        sequence.error = exc
+                        sequence.notify()
+                    self._active = []
+                    self._batch = None
+                self._counters["busy_seconds"] += time.monotonic() - started
+
+    def _fail_queued(self, error: BaseException) -> None:
+        """Resolve sequences that were submitted but never admitted."""
+        while True:
+            try:
+                sequence = self._submitted.get_nowait()
+            except queue.Empty:
+                return
+            if sequence is not None:
+                sequence.error = error
+                sequence.notify()
+
+    def _admit(self, *, block: bool) -> bool:
+        """Move submitted sequences into the running set; False on shutdown."""
+        while len(self._active) < self.max_batch_size:
+            try:
+                sequence = self._submitted.get(block=block)
+            except queue.Empty:
+                return True
+            if sequence is None:
+                return False
+            block = False
+            if sequence.cancelled:
+                continue
+            if sequence.control.should_abort():
+                sequence.finish_reason = sequence.control.finish_reason
+                self._counters["aborted"] += 1
+                sequence.notify()
+                continue
+            try:
+                self._prefill(sequence)
+            except Exception as exc:  # noqa: BLE001 - reported to the caller
+                sequence.error = exc
+                sequence.notify()
+                continue
+            if not sequence.finished:
+                self._active.append(sequence)
+        return True
+
+    def _prefill(self, sequence: _Sequence) -> None:
+        import torch
+
+        prompt_ids = sequence.prompt_ids
+        cached, reused = None, 0
+        if self.prefix_cache is not None:
+            cached, reused = self.prefix_cache.lookup(prompt_ids)
+        input_ids = torch.tensor([prompt_ids[reused:]], device=self.model.device)
+        output = self.model(
+            input_ids=input_ids,
+            past_key_values=from_legacy(cached) if cached is not None else None,
+            use_cache=True,
+        )
+        sequence.past = to_legacy(output.past_key_values)
+        if self.prefix_cache is not None:
+            # The next turn's transcript starts with this prompt.
+            self.prefix_cache.store(prompt_ids, sequence.past)
+        sequence.cache_len = len(sequence.prompt_ids)
+        self._accept(sequence, self._sample(sequence, output.logits[0, -1]))
+
+    def _step(self) -> None:
+        import torch
+
+        for sequence in self._active:
+            if sequence.finished:
+                continue
+            if sequence.cancelled:
+                sequence.finish_reason = "cancelled"
+                self._counters["cancelled"] += 1
+            elif sequence.control.should_abort():
+                # Deadline passed or the caller cancelled: free the slot now.
+                sequence.finish_reason = sequence.control.finish_reason
+                sequence.past = None
+                self._counters["aborted"] += 1
+                sequence.notify()
+        self._active = [sequence for sequence in self._active if not sequence.finished]
+        # Sequences whose consumer is behind sit out this step; they keep their cache.
+        running = [
+            sequence
+            for sequence in self._active
+            if not sequence.max_pending or len(sequence.buffer) < sequence.max_pending
+        ]
+        if not running:
+            self._release_batch()
+            time.sleep(0.001)
+            return
+
+        past, mask = self._batch_cache(running)
+        device = self.model.device
+        input_ids = torch.tensor([[s.next_token] for s in running], device=device)
+        position_ids = torch.tensor([[s.cache_len] for s in running], device=device)
+        mask = torch.cat([mask, mask.new_ones((len(running), 1))], dim=1)
+        output = self.model(
+            input_ids=input_ids,
+            past_key_values=from_legacy(past),
+            attention_mask=mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        self._batch = (running, to_legacy(output.past_key_values), mask)
+        self._counters["steps"] += 1
+        self._counters["step_rows"] += len(running)
+        for row, sequence in enumerate(running):
+            sequence.cache_len += 1
+            self._accept(sequence, self._sample(sequence, output.logits[row, -1]))
+
+    def _batch_cache(self, running: List[_Sequence]) -> Tuple[Any, Any]:
+        if self._batch is not None and self._batch[0] == running:
+            return self._batch[1], self._batch[2]
+        self._release_batch()
+        self._counters["rebatches"] += 1
+        return _merge_caches(running)
+
+    def _release_batch(self) -> None:
+        """Hand the shared batch cache back to its sequences."""
+        if self._batch is None:
+            return
+        members, past, _ = self._batch
+        self._batch = None
+        width = past[0][0].shape[2]
+        for row, sequence in enumerate(members):
+            if sequence.finished:
+                sequence.past = None
+                continue
+            start = width - sequence.cache_len
+            sequence.past = tuple(
+                (key[row : row + 1, :, start:], value[row : row + 1, :, start:])
+                for key, value in past
+            )
+
+    def _sample(self, sequence: _Sequence, logits: Any) -> int:
+        import torch
+
+        if not sequence.do_sample:
+            return int(torch.argmax(logits))
+        probs = torch.softmax(logits.float() / max(sequence.temperature, 1e-5), dim=-1)
+        if sequence.top_p < 1.0:
+            sorted_probs, order = torch.sort(probs, descending=True)
+            keep = torch.cumsum(sorted_probs, dim=-1) - sorted_probs < sequence.top_p
+            probs = torch.zeros_like(probs).scatter(0, order[keep], sorted_probs[keep])
+        return int(torch.multinomial(probs, 1))
+
+    def _accept(self, sequence: _Sequence, token: int) -> None:
+        if token == self._eos_token_id:
+            sequence.finish_reason = "stop"
+        else:
+            sequence.generated += 1
+            sequence.buffer.append(token)
+            sequence.next_token = token
+            self._counters["tokens"] += 1
+            if sequence.generated >= sequence.max_new_tokens:
+                sequence.finish_reason = "length"
+        if sequence.finished:
+            sequence.past = None
+            self._counters["completed"] += 1
+        sequence.notify()
+
+
+def _merge_caches(sequences: List[_Sequence]) -> Tuple[Any, Any]:
+    """Left-pad per-sequence caches into one batch cache plus attention mask."""
+    import torch
+
+    width = max(sequence.cache_len for sequence in sequences)
+    layers = []
+    for layer in range(len(sequences[0].past)):
+        keys, values = [], []
+        for sequence in sequences:
+            key, value = sequence.past[layer]
+            pad = width - sequence.cache_len
+            keys.append(torch.nn.functional.pad(key, (0, 0, pad, 0)))
+            values.append(torch.nn.functional.pad(value, (0, 0, pad, 0)))
+        layers.append((torch.cat(keys), torch.cat(values)))
+    mask = torch.zeros(
+        (len(sequences), width), dtype=torch.long, device=layers[0][0].device
+    )
+    for row, sequence in enumerate(sequences):
+        mask[row, width - sequence.cache_len :] = 1
+        sequence.past = None
+    return tuple(layers), mask
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class InferenceExecutor(Executor):
+    """Thread pool reserved for local model inference.
+
+    Torch's intra-op thread count is process-wide, so it is set once, when
+    the first worker thread starts, to ``torch_threads`` (by default the
+    available CPUs divided by ``workers``): concurrent calls then share about
+    as many threads as there are CPUs instead of each fanning out across all
+    cores. With ``pin_cpus`` each worker thread is additionally restricted to
+    its own slice of those CPUs.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        torch_threads: Optional[int] = None,
+        interop_threads: Optional[int] = None,
+        pin_cpus: bool = False,
+    ) -> None:
+        cpus = available_cpus()
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, len(cpus) // workers)
+        self.interop_threads = interop_threads
+        self._cpu_slices: Optional[List[List[int]]] = None
+        if pin_cpus and hasattr(os, "sched_setaffinity"):
+            size = max(1, len(cpus) // workers)
+            self._cpu_slices = [
+                cpus[(index * size) % len(cpus) :][:size] for index in range(workers)
+            ]
+        self._slots = itertools.count()
+        self._torch_configured = False
+        self._configure_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="hf-inference",
+            initializer=self.initialize_thread,
+        )
+        self._lock = threading.Lock()
+        self._created_at = time.monotonic()
+        self._counters: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "queued": 0,
+            "active": 0,
+            "busy_seconds": 0.0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def initialize_thread(self) -> None:
+        """Pin the calling thread and, on first use, apply the torch thread budget."""
+        slot = next(self._slots)
+        if self._cpu_slices is not None:
+            cpus = self._cpu_slices[slot % len(self._cpu_slices)]
+            try:
+                # On Linux, pid 0 targets the calling thread only.
+                os.sched_setaffinity(0, cpus)
+            except OSError as exc:
+                logger.warning("Could not pin inference thread to %s: %s", cpus, exc)
+        # Held by every new thread, so no work starts before torch is set up.
+        with self._configure_lock:
+            if not self._torch_configured:
+                configure_torch_threads(self.torch_threads, self.interop_threads)
+                self._torch_configured = True
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        enqueued = time.monotonic()
+        with self._lock:
+            self._counters["submitted"] += 1
+            self._counters["queued"] += 1
+
+        def run() -> Any:
+            started = time.monotonic()
+            waited = started - enqueued
+            with self._lock:
+                self._counters["queued"] -= 1
+                self._counters["active"] += 1
+                self._counters["wait_seconds"] += waited
+                self._counters["max_wait_seconds"] = max(
+                    self._counters["max_wait_seconds"], waited
+                )
+            outcome = "failed"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "completed"
+                return result
+            finally:
+                with self._lock:
+                    self._counters["active"] -= 1
+                    self._counters[outcome] += 1
+                    self._counters["busy_seconds"] += time.monotonic() - started
+
+        return self._pool.submit(run)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        started = counters["submitted"] - counters["queued"]
+        uptime = time.monotonic() - self._created_at
+        return {
+            **counters,
+            "busy_seconds": round(counters["busy_seconds"], 3),
+            "wait_seconds": round(counters["wait_seconds"], 3),
+            "max_wait_seconds": round(counters["max_wait_seconds"], 3),
+            "avg_wait_ms": (
+                round(counters["wait_seconds"] / started * 1000, 2) if started else None
+            ),
+            "utilization": round(counters["busy_seconds"] / (self.workers * uptime), 4),
+            "workers": self.workers,
+            "torch_threads": self.torch_threads,
+            "interop_threads": self.interop_threads,
+            "cpu_affinity": self._cpu_slices,
+        }
+
+
+_interop_configured = False
+
+
+def configure_torch_threads(threads: int, interop_threads: Optional[int]) -> None:
+    """Set torch's intra-op thread count and, once, its interop pool size.
+
+    Both settings are process-wide: call this once at startup rather than
+    per inference thread or call.
+    """
+    global _interop_configured
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    if interop_threads and not _interop_configured:
+        _interop_configured = True
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as exc:
+            # Only allowed before torch starts any inter-op parallel work.
+            logger.warning("Could not set torch interop threads: %s", exc)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# safetensors dtype codes -> torch dtype attribute names.
+_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def find_local_model(model_id: str, roots: Iterable[str]) -> Optional[Path]:
+    """Directory holding ``model_id``'s config and safetensors weights, if any.
+
+    Looks for ``<root>/<model_id>`` and for the latest snapshot of a hub
+    cache layout (``<root>/models--org--name/snapshots/<revision>``).
+    """
+    candidates: List[Path] = [Path(model_id)]
+    for root in roots:
+        base = Path(root)
+        candidates.append(base / model_id)
+        snapshots = base / ("models--" + model_id.replace("/", "--")) / "snapshots"
+        if snapshots.is_dir():
+            candidates.extend(
+                sorted(snapshots.iterdir(), key=lambda path: path.stat().st_mtime)[::-1]
+            )
+    for candidate in candidates:
+        if (candidate / "config.json").is_file() and _weight_files(candidate):
+            return candidate
+    return None
+
+
+def read_safetensors_header(path: Path) -> Tuple[Dict[str, Any], int]:
+    """Return a safetensors file's tensor index and the offset its data starts at."""
+    with open(path, "rb") as handle:
+        (length,) = struct.unpack("<Q", handle.read(8))
+        header = json.loads(handle.read(length))
+    header.pop("__metadata__", None)
+    return header, 8 + length
+
+
+def map_safetensors(path: Path) -> Dict[str, Any]:
+    """Tensors of a safetensors file as views over a private memory map.
+
+    The mapping is copy-on-write, so pages stay shared with the page cache
+    (and with every other process mapping the file) until written to.
+    """
+    import torch
+
+    header, data_start = read_safetensors_header(path)
+    with open(path, "rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+    tensors = {}
+    for name, entry in header.items():
+        dtype = getattr(torch, _DTYPES[entry["dtype"]])
+        begin, end = entry["data_offsets"]
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        tensor = torch.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + begin
+        )
+        tensors[name] = tensor.reshape(entry["shape"])
+    return tensors
+
+
+def load_mapped_pipeline(
+    path: Path, *, torch_dtype: Any = None, device: int = -1
+) -> Any:
+    """Build a text-generation pipeline whose weights are mapped from ``path``.
+
+    The model is constructed without initialising weights and the mapped
+    tensors are assigned to it directly. Weights are only copied when a
+    different ``torch_dtype`` is requested or the model moves off the CPU.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, pipeline
+
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:  # pragma: no cover - older transformers
+        from contextlib import nullcontext as no_init_weights
+
+    config = AutoConfig.from_pretrained(path)
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(config)
+    state: Dict[str, Any] = {}
+    for weights in _weight_files(path):
+        state.update(map_safetensors(weights))
+    dtype = getattr(torch, torch_dtype) if isinstance(torch_dtype, str) else torch_dtype
+    if dtype is not None:
+        state = {
+            name: tensor.to(dtype) if tensor.is_floating_point() else tensor
+            for name, tensor in state.items()
+        }
+    missing, _ = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    if missing and not _all_assigned(model, state):
+        raise ValueError(f"{path} is missing weights: {', '.join(missing)}")
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    return pipeline("text-generation", model=model, tokenizer=tokenizer, device=device)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux), else ``None``."""
+    try:
+        with open("/proc/self/statm") as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class LoadMeter:
+    """Measures wall time and RSS growth across a model load."""
+
+    def __init__(self, loader: str) -> None:
+        self.loader = loader
+        self._rss = current_rss()
+        self._started = time.perf_counter()
+
+    def report(self) -> Dict[str, Any]:
+        rss = current_rss()
+        return {
+            "loader": self.loader,
+            "load_seconds": round(time.perf_counter() - self._started, 3),
+            "rss_bytes": rss,
+            "rss_delta_bytes": (
+                rss - self._rss if rss is not None and self._rss is not None else None
+            ),
+        }
+
+
+def _weight_files(path: Path) -> List[Path]:
+    return sorted(path.glob("*.safetensors"))
+
+
+def _all_assigned(model: Any, state: Dict[str, Any]) -> bool:
+    """Whether every parameter came from ``state``, directly or through tying."""
+    assigned = {tensor.data_ptr() for tensor in state.values()}
+    return all(parameter.data_ptr() in assigned for parameter in model.parameters())
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledModel:
+    model_id: str
+    pipeline: Any
+    nbytes: int
+    loaded_at: float
+    last_used: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+    # Generations currently using the model; pinned entries are never evicted.
+    active: int = 0
+
+
+@dataclass
+class ModelLoadState:
+    """Progress of a single model load, kept after it finishes for inspection."""
+
+    model_id: str
+    status: str = "loading"
+    phase: str = "queued"
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.finished_at = time.time()
+        self.status = "failed" if error is not None else "loaded"
+        self.phase = "done"
+        self.error = str(error) if error is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "status": self.status,
+            "phase": self.phase,
+            "elapsed_seconds": round(end - self.started_at, 3),
+            "error": self.error,
+        }
+
+
+def model_footprint(pipeline: Any) -> int:
+    """Bytes held by a pipeline's parameters and buffers."""
+    model = getattr(pipeline, "model", pipeline)
+    total = 0
+    for tensors in (
+        getattr(model, "parameters", None),
+        getattr(model, "buffers", None),
+    ):
+        if tensors is None:
+            continue
+        for tensor in tensors():
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelPool:
+    """Keeps loaded pipelines within a memory budget.
+
+    Models are ordered by last use. Adding a model evicts the least recently
+    used ones until the pool fits ``max_bytes``, and :meth:`evict_idle` unloads
+    models unused for longer than ``idle_ttl``. A model larger than the whole
+    budget is still admitted, alone. Models held through :meth:`acquire` are
+    skipped by both until released; releasing one trims the pool back to its
+    budget.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[PooledModel], None]] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._on_evict = on_evict
+        self._clock = clock
+        self._models: "OrderedDict[str, PooledModel]" = OrderedDict()
+        self._counters: Dict[str, int] = {"loads": 0, "evictions": 0, "idle_unloads": 0}
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._models
+
+    def get(self, model_id: str) -> Optional[Any]:
+        entry = self._models.get(model_id)
+        if entry is None:
+            return None
+        entry.last_used = self._clock()
+        self._models.move_to_end(model_id)
+        return entry.pipeline
+
+    def acquire(self, model_id: str) -> Optional[PooledModel]:
+        """Like :meth:`get`, but pins the entry until :meth:`release`."""
+        entry = self._models.get(model_id)
+        if entry is None:
+            return None
+        entry.active += 1
+        entry.last_used = self._clock()
+        self._models.move_to_end(model_id)
+        return entry
+
+    def release(self, entry: PooledModel) -> List[str]:
+        """Unpin ``entry`` and return the ids evicted to get back within budget."""
+        entry.active -= 1
+        entry.last_used = self._clock()
+        if self._models.get(entry.model_id) is entry:
+            self._models.move_to_end(entry.model_id)
+        return self._fit(0, keep=entry.model_id)
+
+    def add(
+        self,
+        model_id: str,
+        pipeline: Any,
+        meta: Optional[Dict[str, Any]] = None,
+        *,
+        nbytes: Optional[int] = None,
+    ) -> List[str]:
+        """Register a loaded pipeline and return the ids evicted to make room.
+
+        ``nbytes`` overrides the measured footprint, for models held elsewhere.
+        """
+        now = self._clock()
+        self.remove(model_id)
+        if nbytes is None:
+            nbytes = model_footprint(pipeline)
+        entry = PooledModel(model_id, pipeline, nbytes, now, now, dict(meta or {}))
+        evicted = self._fit(entry.nbytes)
+        self._models[model_id] = entry
+        self._counters["loads"] += 1
+        return evicted
+
+    def remove(self, model_id: str) -> bool:
+        if model_id not in self._models:
+            return False
+        self._evict(model_id)
+        return True
+
+    def evict_idle(self) -> List[str]:
+        if self.idle_ttl is None:
+            return []
+        cutoff = self._clock() - self.idle_ttl
+        idle = [
+            model_id
+            for model_id, entry in self._models.items()
+            if entry.last_used < cutoff and not entry.active
+        ]
+        for model_id in idle:
+            self._evict(model_id)
+            self._counters["idle_unloads"] += 1
+        return idle
+
+    def entries(self) -> List[PooledModel]:
+        return list(self._models.values())
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._models.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "models": len(self._models),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+        }
+
+    def _fit(self, extra: int, *, keep: Optional[str] = None) -> List[str]:
+        """Evict unpinned models, oldest first, until ``extra`` more bytes fit."""
+        evicted: List[str] = []
+        if self.max_bytes is None:
+            return evicted
+        for model_id, entry in list(self._models.items()):
+            if self.resident_bytes + extra <= self.max_bytes:
+                break
+            if entry.active or model_id == keep:
+                continue
+            self._evict(model_id)
+            evicted.append(model_id)
+            self._counters["evictions"] += 1
+        return evicted
+
+    def _evict(self, model_id: str) -> None:
+        entry = self._models.pop(model_id)
+        logger.info("Unloading HuggingFace model %s (%d bytes)", model_id, entry.nbytes)
+        if self._on_evict is not None:
+            self._on_evict(entry)
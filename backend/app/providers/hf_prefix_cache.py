@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Per-layer ``(key, value)`` tensors shaped ``[1, heads, tokens, head_dim]``.
+LegacyCache = Tuple[Tuple[Any, Any], ...]
+
+
+@dataclass(eq=False)
+class _Node:
+    parent: Optional["_Node"]
+    block: Tuple[int, ...]
+    children: Dict[Tuple[int, ...], "_Node"] = field(default_factory=dict)
+    entry: Optional["_Entry"] = None
+
+
+@dataclass(eq=False)
+class _Entry:
+    past: LegacyCache
+    tokens: int
+    nbytes: int
+    nodes: List[_Node] = field(default_factory=list)
+
+
+class PrefixCache:
+    """Reuses the key/values of previously encoded prompt prefixes.
+
+    Prompts are split into fixed-size token blocks and indexed in a trie, so a
+    lookup finds the longest cached block-aligned prefix in one walk. Each
+    stored entry holds the cache for a whole prompt; shorter matches slice it.
+    Entries are evicted least-recently-used once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, *, max_bytes: int, block_size: int = 16) -> None:
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self._root = _Node(None, ())
+        self._entries: "OrderedDict[_Entry, None]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "lookups": 0,
+            "hits": 0,
+            "prompt_tokens": 0,
+            "reused_tokens": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def lookup(self, token_ids: Sequence[int]) -> Tuple[Optional[LegacyCache], int]:
+        """Return the cache for the longest stored prefix and its token length.
+
+        At least one prompt token is always left uncached so the caller still
+        gets logits for the next position.
+        """
+        with self._lock:
+            self._counters["lookups"] += 1
+            self._counters["prompt_tokens"] += len(token_ids)
+            node, best, depth = self._root, None, 0
+            for block in self._blocks(token_ids[:-1]):
+                node = node.children.get(block)
+                if node is None:
+                    break
+                depth += 1
+                if node.entry is not None:
+                    best = (node.entry, depth * self.block_size)
+            if best is None:
+                return None, 0
+            entry, length = best
+            self._entries.move_to_end(entry)
+            self._counters["hits"] += 1
+            self._counters["reused_tokens"] += length
+        past = tuple(
+            (key[:, :, :length], value[:, :, :length]) for key, value in entry.past
+        )
+        return past, length
+
+    def store(self, token_ids: Sequence[int], past: LegacyCache) -> None:
+        blocks = list(self._blocks(token_ids))
+        if not blocks:
+            return
+        nbytes = sum(key.nbytes + value.nbytes for key, value in past)
+        if nbytes > self.max_bytes:
+            return
+        entry = _Entry(past, len(token_ids), nbytes)
+        with self._lock:
+            node = self._root
+            for block in blocks:
+                child = node.children.get(block)
+                if child is None:
+                    child = node.children[block] = _Node(node, block)
+                node = child
+                if node.entry is not None and node.entry is not entry:
+                    self._detach(node.entry, node)
+                node.entry = entry
+                entry.nodes.append(node)
+            self._entries[entry] = None
+            self._bytes += nbytes
+            self._counters["stores"] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._drop(oldest)
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._root = _Node(None, ())
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["lookups"]
+            prompt_tokens = self._counters["prompt_tokens"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4)
+                if lookups
+                else None,
+                "token_hit_rate": (
+                    round(self._counters["reused_tokens"] / prompt_tokens, 4)
+                    if prompt_tokens
+                    else None
+                ),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "block_size": self.block_size,
+            }
+
+    def _blocks(self, token_ids: Sequence[int]) -> List[Tuple[int, ...]]:
+        size = self.block_size
+        return [
+            tuple(token_ids[start : start + size])
+            for start in range(0, len(token_ids) - size + 1, size)
+        ]
+
+    def _detach(self, entry: _Entry, node: _Node) -> None:
+        """Stop ``entry`` covering ``node``; drop it once it covers nothing."""
+        entry.nodes.remove(node)
+        if not entry.nodes and entry in self._entries:
+            del self._entries[entry]
+            self._bytes -= entry.nbytes
+
+    def _drop(self, entry: _Entry) -> None:
+        self._bytes -= entry.nbytes
+        for node in entry.nodes:
+            if node.entry is entry:
+                node.entry = None
+            self._prune(node)
+        entry.nodes.clear()
+
+    def _prune(self, node: _Node) -> None:
+        while node.parent is not None and node.entry is None and not node.children:
+            del node.parent.children[node.block]
+            node = node.parent
+
+
+def prefill(model: Any, prompts: Sequence[Sequence[int]], cache: PrefixCache) -> Any:
+    """Encode all but the last token of each prompt, reusing cached prefixes.
+
+    Each prompt's uncached part is run through ``model`` on its own and the
+    result stored for later turns. The rows are then left-padded to a common
+    length to line up with a left-padded batch of the full prompts, so the
+    returned cache can be passed to ``model.generate`` as ``past_key_values``
+    together with that batch's attention mask. Returns ``None`` when a prompt
+    is too short to have a prefix.
+    """
+    import torch
+
+    if any(len(prompt_ids) < 2 for prompt_ids in prompts):
+        return None
+    pasts = []
+    for prompt_ids in prompts:
+        head = list(prompt_ids[:-1])
+        cached, reused = cache.lookup(prompt_ids)
+        if reused < len(head):
+            output = model(
+                input_ids=torch.tensor([head[reused:]], device=model.device),
+                past_key_values=from_legacy(cached) if cached is not None else None,
+                use_cache=True,
+            )
+            cached = to_legacy(output.past_key_values)
+            cache.store(head, cached)
+        pasts.append(cached)
+    width = max(len(prompt_ids) - 1 for prompt_ids in prompts)
+    layers = []
+    for layer in zip(*pasts):
+        keys, values = [], []
+        for key, value in layer:
+            pad = width - key.shape[2]
+            keys.append(_pad_left(torch, key, pad))
+            values.append(_pad_left(torch, value, pad))
+        layers.append((torch.cat(keys), torch.cat(values)))
+    return from_legacy(tuple(layers))
+
+
+def _pad_left(torch: Any, tensor: Any, tokens: int) -> Any:
+    if not tokens:
+        return tensor
+    shape = list(tensor.shape)
+    shape[2] = tokens
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=2)
+
+
+def to_legacy(past: Any) -> Any:
+    """Per-layer ``(key, value)`` tuples from a model's cache object."""
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    if hasattr(past, "layers"):
+        # transformers 5 dropped the legacy format; read the layers directly.
+        return tuple((layer.keys, layer.values) for layer in past.layers)
+    return past
+
+
+def from_legacy(past: Any) -> Any:
+    """A ``DynamicCache`` holding per-layer ``(key, value)`` tuples, uncopied."""
+    try:
+        from transformers import DynamicCache
+    except ImportError:  # pragma: no cover - very old transformers
+        return past
+    cache = DynamicCache()
+    for layer, (key, value) in enumerate(past):
+        cache.update(key, value, layer)
+    return cache
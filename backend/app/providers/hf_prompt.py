@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..models.schemas import ChatMessage, Role
+
+_FALLBACK_LABELS = {
+    Role.SYSTEM: "System",
+    Role.USER: "User",
+    Role.ASSISTANT: "Assistant",
+}
+
+
+@dataclass
+class Prompt:
+    text: str
+    token_ids: List[int]
+
+
+class PromptBuilder:
+    """Renders chat prompts for one tokenizer and tokenizes them incrementally.
+
+    Prompts use the tokenizer's chat template when it has one. The rendered
+    text is split at message boundaries and each segment's tokens are cached
+    under a hash of the conversation up to and including that message, so a
+    follow-up turn only tokenizes the messages it adds.
+    """
+
+    def __init__(self, tokenizer: Any, *, max_entries: int = 4096) -> None:
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.uses_chat_template = bool(getattr(tokenizer, "chat_template", None))
+        self._segments: "OrderedDict[str, Tuple[str, List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "prompts": 0,
+            "messages": 0,
+            "cached_messages": 0,
+            "prompt_tokens": 0,
+            "uncached_prompts": 0,
+        }
+
+    def build(self, messages: Sequence[ChatMessage]) -> Prompt:
+        text, token_ids = "", []
+        key = ""
+        for index, message in enumerate(messages):
+            key = _chain(key, message)
+            with self._lock:
+                cached = self._segments.get(key)
+                if cached is not None:
+                    self._segments.move_to_end(key)
+            if cached is None:
+                rendered = self._render(messages[: index + 1], generation_prompt=False)
+                if rendered is None or not rendered.startswith(text):
+                    return self._build_uncached(messages)
+                segment = rendered[len(text) :]
+                cached = (segment, self._encode(segment, first=index == 0))
+                self._remember(key, cached)
+            else:
+                self._count("cached_messages")
+            text += cached[0]
+            token_ids.extend(cached[1])
+        final = self._render(messages, generation_prompt=True)
+        if final is None or not final.startswith(text):
+            return self._build_uncached(messages)
+        token_ids.extend(self._encode(final[len(text) :], first=False))
+        return self._finish(Prompt(final, token_ids), len(messages))
+
+    def count(self, text: str) -> int:
+        """Number of tokens in generated ``text``."""
+        return len(self._encode(text, first=False))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            messages = self._counters["messages"]
+            return {
+                **self._counters,
+                "message_hit_rate": (
+                    round(self._counters["cached_messages"] / messages, 4)
+                    if messages
+                    else None
+                ),
+                "entries": len(self._segments),
+                "chat_template": self.uses_chat_template,
+            }
+
+    def _build_uncached(self, messages: Sequence[ChatMessage]) -> Prompt:
+        self._count("uncached_prompts")
+        text = self._render(messages, generation_prompt=True)
+        if text is None:
+            text = _fallback(messages, generation_prompt=True)
+        return self._finish(Prompt(text, self._encode(text, first=True)), len(messages))
+
+    def _finish(self, prompt: Prompt, messages: int) -> Prompt:
+        with self._lock:
+            self._counters["prompts"] += 1
+            self._counters["messages"] += messages
+            self._counters["prompt_tokens"] += len(prompt.token_ids)
+        return prompt
+
+    def _render(
+        self, messages: Sequence[ChatMessage], *, generation_prompt: bool
+    ) -> Optional[str]:
+        if not self.uses_chat_template:
+            return _fallback(messages, generation_prompt=generation_prompt)
+        try:
+            return self.tokenizer.apply_chat_template(
+                [
+                    {"role": message.role.value, "content": message.content}
+                    for message in messages
+                ],
+                tokenize=False,
+                add_generation_prompt=generation_prompt,
+            )
+        except Exception:  # noqa: BLE001 - templates may reject partial chats
+            return None
+
+    def _encode(self, text: str, *, first: bool) -> List[int]:
+        if not text:
+            return []
+        # Chat templates spell out their own special tokens.
+        add_special = first and not self.uses_chat_template
+        return list(self.tokenizer(text, add_special_tokens=add_special)["input_ids"])
+
+    def _remember(self, key: str, segment: Tuple[str, List[int]]) -> None:
+        with self._lock:
+            self._segments[key] = segment
+            while len(self._segments) > self.max_entries:
+                self._segments.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+def _chain(previous: str, message: ChatMessage) -> str:
+    digest = hashlib.sha1(previous.encode())
+    digest.update(message.role.value.encode())
+    digest.update(b"\0")
+    digest.update(message.content.encode())
+    return digest.hexdigest()
+
+
+def _fallback(messages: Sequence[ChatMessage], *, generation_prompt: bool) -> str:
+    """Plain-text template for tokenizers without a chat template."""
+    segments = [
+        f"[{_FALLBACK_LABELS[message.role]}]\n{message.content.strip()}\n"
+        for message in messages
+    ]
+    if generation_prompt:
+        segments.append("[Assistant]\n")
+    return "\n".join(segments)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+from .base import ProviderError
+
+# Accepted spellings of each quantization mode.
+_ALIASES = {
+    "none": None,
+    "fp32": None,
+    "float32": None,
+    "int8": "int8",
+    "qint8": "int8",
+    "dynamic-int8": "int8",
+    "bf16": "bf16",
+    "bfloat16": "bf16",
+    "fp16": "fp16",
+    "float16": "fp16",
+    "half": "fp16",
+}
+
+QUANTIZATION_MODES = ("int8", "bf16", "fp16")
+
+
+def normalize_quantization(value: Optional[str]) -> Optional[str]:
+    """Map a requested quantization to one of :data:`QUANTIZATION_MODES` or ``None``."""
+    if value is None or not value.strip():
+        return None
+    key = value.strip().lower().replace("_", "-")
+    if key not in _ALIASES:
+        raise ProviderError(
+            f"Unsupported quantization '{value}'. "
+            f"Use one of: {', '.join(QUANTIZATION_MODES)} or none."
+        )
+    return _ALIASES[key]
+
+
+def load_dtype(mode: Optional[str]) -> Optional[str]:
+    """``torch_dtype`` to load weights in, so cast modes never materialise fp32."""
+    return {"bf16": "bfloat16", "fp16": "float16"}.get(mode or "")
+
+
+def apply_quantization(
+    model: Any, mode: Optional[str], *, device: int = -1
+) -> Dict[str, Any]:
+    """Quantize ``model`` in place and report its footprint.
+
+    ``int8`` swaps every ``nn.Linear`` for a dynamically quantized one (int8
+    weights, activations quantized per batch), which is CPU only. ``bf16`` and
+    ``fp16`` cast the weights. The report compares the result with the same
+    parameters held in fp32.
+    """
+    import torch
+
+    fp32_bytes = sum(
+        tensor.numel() * 4 for tensor in _tensors(model) if tensor.is_floating_point()
+    )
+    if mode == "int8":
+        if device != -1:
+            raise ProviderError("int8 dynamic quantization is only available on CPU.")
+        torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    elif mode is not None:
+        dtype = getattr(torch, load_dtype(mode))
+        if next(model.parameters()).dtype != dtype:
+            model.to(dtype)
+    nbytes = state_footprint(model)
+    return {
+        "mode": mode or "none",
+        "bytes": nbytes,
+        "fp32_bytes": fp32_bytes,
+        "compression": round(fp32_bytes / nbytes, 2) if nbytes else None,
+    }
+
+
+def state_footprint(model: Any) -> int:
+    """Bytes held by ``model``'s state, including packed quantized weights."""
+    seen = set()
+    total = 0
+    pending = list(model.state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+            continue
+        if not hasattr(value, "element_size"):
+            continue
+        key = (value.data_ptr(), value.numel())
+        if key in seen:
+            continue
+        seen.add(key)
+        total += value.numel() * value.element_size()
+    return total
+
+
+def measure_throughput(
+    model: Any, tokenizer: Any, prompt: str, *, max_new_tokens: int = 32
+) -> Dict[str, float]:
+    """Greedy-generate ``max_new_tokens`` once and report tokens per second."""
+    import torch
+
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    pad_token_id = tokenizer.pad_token_id or tokenizer.eos_token_id
+    with torch.inference_mode():
+        started = time.perf_counter()
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=pad_token_id,
+        )
+        elapsed = time.perf_counter() - started
+    tokens = output.shape[1] - inputs["input_ids"].shape[1]
+    return {
+        "tokens": tokens,
+        "seconds": round(elapsed, 4),
+        "tokens_per_second": round(tokens / elapsed, 2),
+    }
+
+
+def _tensors(model: Any):
+    yield from model.parameters()
+    yield from model.buffers()
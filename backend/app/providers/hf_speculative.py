@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from .hf_prefix_cache import from_legacy, to_legacy
+
+
+@dataclass
+class SpeculativeResult:
+    token_ids: List[int]
+    finish_reason: str
+    stats: Dict[str, Any]
+
+
+class SpeculativeDecoder:
+    """Greedy speculative decoding of a target model with a smaller draft.
+
+    Each round the draft proposes ``draft_tokens`` tokens one at a time and
+    the target scores all of them in a single forward pass. Proposals are kept
+    up to the first one the target disagrees with, followed by the target's
+    own token, so the output is exactly what greedy decoding of the target
+    alone produces. Both models keep their KV cache, cropped back to the
+    accepted tokens after every round.
+    """
+
+    def __init__(self, model: Any, draft: Any, *, draft_tokens: int = 4) -> None:
+        self.model = model
+        self.draft = draft
+        self.draft_tokens = draft_tokens
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Any] = {
+            "requests": 0,
+            "tokens": 0,
+            "proposed": 0,
+            "accepted": 0,
+            "target_forwards": 0,
+        }
+
+    def generate(
+        self,
+        prompt_ids: Sequence[int],
+        *,
+        max_new_tokens: int,
+        eos_token_id: Optional[int] = None,
+        streamer: Any = None,
+    ) -> SpeculativeResult:
+        """Decode up to ``max_new_tokens`` tokens after ``prompt_ids``.
+
+        ``streamer`` follows the ``transformers`` streamer protocol: it gets
+        the prompt first, then every accepted run of tokens, then ``end()``.
+        """
+        import torch
+
+        started = time.perf_counter()
+        ids = list(prompt_ids)
+        generated: List[int] = []
+        proposed = accepted = forwards = 0
+        target_seconds = 0.0
+        finish_reason = "length"
+        if streamer is not None:
+            streamer.put(list(ids))
+        with torch.inference_mode():
+            target_past, last = self._forward(self.model, ids, None)
+            forwards += 1
+            # The draft consumes the last prompt token with its first proposal.
+            draft_past, draft_len = None, 0
+            if len(ids) > 1:
+                draft_past, _ = self._forward(self.draft, ids[:-1], None)
+                draft_len = len(ids) - 1
+            target_len = len(ids)
+            pending = [int(last.argmax())]
+            while True:
+                # ``pending`` holds tokens accepted since the last round.
+                emit, done = self._accept(
+                    pending, generated, max_new_tokens, eos_token_id
+                )
+                if emit:
+                    ids.extend(emit)
+                    generated.extend(emit)
+                    if streamer is not None:
+                        streamer.put(emit)
+                if done is not None:
+                    finish_reason = done
+                    break
+                budget = min(self.draft_tokens, max_new_tokens - len(generated))
+                proposal: List[int] = []
+                draft_input = ids[draft_len:]
+                for _ in range(budget):
+                    draft_past, logits = self._forward(
+                        self.draft, draft_input, draft_past
+                    )
+                    draft_len += len(draft_input)
+                    proposal.append(int(logits.argmax()))
+                    draft_input = proposal[-1:]
+                step_started = time.perf_counter()
+                target_past, logits = self._forward(
+                    self.model,
+                    ids[target_len:] + proposal,
+                    target_past,
+                    all_logits=True,
+                )
+                target_seconds += time.perf_counter() - step_started
+                forwards += 1
+                choices = logits.argmax(dim=-1).tolist()
+                # The target's pick after ``proposal[:i]`` is ``choices[offset + i]``.
+                offset = len(ids) - target_len - 1
+                matched = 0
+                while (
+                    matched < len(proposal)
+                    and proposal[matched] == choices[offset + matched]
+                ):
+                    matched += 1
+                proposed += len(proposal)
+                accepted += matched
+                pending = proposal[:matched] + [choices[offset + matched]]
+                # Keep the caches for the context plus accepted proposals only.
+                target_len = len(ids) + matched
+                target_past = _crop(target_past, target_len)
+                if draft_len > target_len:
+                    draft_len = target_len
+                    draft_past = _crop(draft_past, draft_len)
+        if streamer is not None:
+            streamer.end()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "draft_tokens": self.draft_tokens,
+            "proposed": proposed,
+            "accepted": accepted,
+            "accept_rate": round(accepted / proposed, 4) if proposed else None,
+            "target_forwards": forwards,
+            "tokens_per_target_forward": (
+                round(len(generated) / forwards, 2) if forwards else None
+            ),
+            "seconds": round(elapsed, 4),
+            "tokens_per_second": round(len(generated) / elapsed, 2)
+            if elapsed
+            else None,
+            # Plain decoding needs one target forward per token; a verify pass
+            # costs about as much as one decode step.
+            "estimated_speedup": (
+                round(len(generated) * (target_seconds / (forwards - 1)) / elapsed, 2)
+                if forwards > 1 and elapsed
+                else None
+            ),
+        }
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["tokens"] += len(generated)
+            self._counters["proposed"] += proposed
+            self._counters["accepted"] += accepted
+            self._counters["target_forwards"] += forwards
+        return SpeculativeResult(generated, finish_reason, stats)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "draft_tokens": self.draft_tokens,
+            "accept_rate": (
+                round(counters["accepted"] / counters["proposed"], 4)
+                if counters["proposed"]
+                else None
+            ),
+        }
+
+    def _forward(
+        self, model: Any, input_ids: List[int], past: Any, *, all_logits: bool = False
+    ):
+        import torch
+
+        output = model(
+            input_ids=torch.tensor([input_ids], device=model.device),
+            past_key_values=from_legacy(past) if past is not None else None,
+            use_cache=True,
+        )
+        logits = output.logits[0] if all_logits else output.logits[0, -1]
+        return to_legacy(output.past_key_values), logits
+
+    @staticmethod
+    def _accept(
+        pending: List[int],
+        generated: List[int],
+        max_new_tokens: int,
+        eos_token_id: Optional[int],
+    ):
+        emit = pending[: max_new_tokens - len(generated)]
+        if eos_token_id is not None and eos_token_id in emit:
+            return emit[: emit.index(eos_token_id) + 1], "stop"
+        if len(generated) + len(emit) >= max_new_tokens:
+            return emit, "length"
+        return emit, None
+
+
+def _crop(past: Any, length: int) -> Any:
+    return tuple((key[:, :, :length], value[:, :, :length]) for key, value in past)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class StopSequenceMatcher:
+    """Finds stop sequences in text that arrives a piece at a time.
+
+    Text that could be the start of a stop sequence is held back until the
+    next piece shows whether it matches, so a stop sequence is never emitted,
+    even when it is split across tokens.
+    """
+
+    def __init__(self, stops: Optional[Sequence[str]] = None) -> None:
+        self.stops: List[str] = [stop for stop in stops or () if stop]
+        self.stopped = False
+        self._longest = max((len(stop) for stop in self.stops), default=0)
+        self._held = ""
+
+    def push(self, text: str) -> str:
+        """Return the part of ``text`` that is safe to emit."""
+        if self.stopped:
+            return ""
+        if not self.stops:
+            return text
+        text = self._held + text
+        matches = [index for index in map(text.find, self.stops) if index >= 0]
+        if matches:
+            self.stopped = True
+            self._held = ""
+            return text[: min(matches)]
+        keep = self._partial_match(text)
+        self._held = text[len(text) - keep :]
+        return text[: len(text) - keep]
+
+    def flush(self) -> str:
+        """Release held-back text once no more text will arrive."""
+        held, self._held = self._held, ""
+        return "" if self.stopped else held
+
+    def _partial_match(self, text: str) -> int:
+        """Length of the longest suffix of ``text`` that starts a stop sequence."""
+        for size in range(min(len(text), self._longest - 1), 0, -1):
+            suffix = text[-size:]
+            if any(stop.startswith(suffix) for stop in self.stops):
+                return size
+        return 0
+
+
+class GenerationControl:
+    """Decides when one local generation should end early.
+
+    Shared between the event loop and the thread running the model: the
+    generating thread calls :meth:`should_abort` before each token and feeds
+    decoded text through :meth:`feed`, while the event loop may :meth:`cancel`
+    once the result is no longer wanted. ``finish_reason`` records why the
+    generation ended early (``"stop"``, ``"timeout"`` or ``"cancelled"``).
+    """
+
+    def __init__(
+        self,
+        stop: Optional[Sequence[str]] = None,
+        *,
+        timeout: Optional[float] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> None:
+        self.matcher = StopSequenceMatcher(stop)
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.finish_reason: Optional[str] = None
+        self._cancelled = cancelled if cancelled is not None else threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self.finish_reason is not None or self.cancelled
+
+    def cancel(self) -> None:
+        self._end("cancelled")
+        self._cancelled.set()
+
+    def should_abort(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._end("timeout")
+        return self.done
+
+    def feed(self, text: str) -> str:
+        text = self.matcher.push(text)
+        if self.matcher.stopped:
+            self._end("stop")
+        return text
+
+    def flush(self) -> str:
+        return self.matcher.flush()
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def options(self) -> Dict[str, Any]:
+        """Settings to rebuild an equivalent control in another process."""
+        return {"stop": self.matcher.stops, "timeout": self.remaining()}
+
+    def _end(self, reason: str) -> None:
+        if self.finish_reason is None:
+            self.finish_reason = reason
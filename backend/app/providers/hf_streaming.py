@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .hf_stopping import GenerationControl
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class GenerationCancelled(Exception):
+    """Raised inside the generation thread once its consumer has gone away."""
+
+
+class IncrementalDecoder:
+    """Turns a growing list of token ids into text deltas.
+
+    Only a short window of recent tokens is re-decoded per step, and text is
+    withheld while it ends in an incomplete UTF-8 sequence.
+    """
+
+    def __init__(self, tokenizer: Any, *, skip_special_tokens: bool = True) -> None:
+        self.tokenizer = tokenizer
+        self.token_ids: List[int] = []
+        self._skip_special_tokens = skip_special_tokens
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def push(self, ids: List[int]) -> str:
+        self.token_ids.extend(ids)
+        return self._pending(final=False)
+
+    def flush(self) -> str:
+        return self._pending(final=True)
+
+    def _pending(self, *, final: bool) -> str:
+        prefix = self._decode(self.token_ids[self._prefix_offset : self._read_offset])
+        text = self._decode(self.token_ids[self._prefix_offset :])
+        if len(text) <= len(prefix) or (text.endswith("\ufffd") and not final):
+            return ""
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self.token_ids)
+        return text[len(prefix) :]
+
+    def _decode(self, ids: List[int]) -> str:
+        if not ids:
+            return ""
+        return self.tokenizer.decode(ids, skip_special_tokens=self._skip_special_tokens)
+
+
+class TokenStreamer:
+    """Feeds decoded text from a generation thread into an asyncio queue.
+
+    Implements the ``put``/``end`` protocol of ``transformers`` streamers, so it
+    can be handed to ``model.generate(streamer=...)``. The queue is bounded:
+    when the consumer falls behind, the generation thread blocks instead of
+    buffering the completion. ``control`` applies stop sequences and the
+    deadline; once it ends the generation, ``generate`` is aborted at its next
+    token.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        max_queue: int = 32,
+        skip_prompt: bool = True,
+        skip_special_tokens: bool = True,
+        control: Optional[GenerationControl] = None,
+    ) -> None:
+        self.queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_queue)
+        self.token_count = 0
+        self.control = control or GenerationControl()
+        self._loop = loop
+        self._skip_prompt = skip_prompt
+        self._decoder = IncrementalDecoder(
+            tokenizer, skip_special_tokens=skip_special_tokens
+        )
+        self._finished = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self.control.cancelled
+
+    def cancel(self) -> None:
+        self.control.cancel()
+
+    def put(self, value: Any) -> None:
+        if self.control.should_abort():
+            raise GenerationCancelled()
+        if self._skip_prompt:
+            # ``generate`` reports the prompt ids first.
+            self._skip_prompt = False
+            return
+        ids = _flatten_ids(value)
+        self.token_count += len(ids)
+        text = self.control.feed(self._decoder.push(ids))
+        if text:
+            self._push(text)
+        if self.control.done:
+            raise GenerationCancelled()
+
+    def end(self) -> None:
+        if not self.cancelled:
+            text = self.control.feed(self._decoder.flush()) + self.control.flush()
+            if text:
+                self._push(text)
+        self._finish(_END)
+
+    def fail(self, exc: BaseException) -> None:
+        self._finish(exc)
+
+    def run(self, generate: Callable[["TokenStreamer"], Any]) -> None:
+        """Run ``generate`` in the calling thread, routing its output here."""
+        try:
+            generate(self)
+        except GenerationCancelled:
+            # A stop sequence or the deadline ended it early; release the tail.
+            self.end()
+        except BaseException as exc:  # noqa: BLE001 - relayed to the consumer
+            self.fail(exc)
+        else:
+            # Streamers normally get ``end()`` from ``generate`` itself; make
+            # sure the consumer is released even if it did not.
+            self._finish(_END)
+
+    def _push(self, item: Any) -> None:
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self._loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return
+            except concurrent.futures.TimeoutError:
+                if self.cancelled:
+                    future.cancel()
+                    raise GenerationCancelled()
+
+    def _finish(self, item: Any) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        if self.cancelled or self._loop.is_closed():
+            return
+        try:
+            self._push(item)
+        except (GenerationCancelled, RuntimeError):
+            pass
+
+
+async def stream_generation(
+    generate: Callable[[TokenStreamer], Any],
+    tokenizer: Any,
+    *,
+    max_queue: int = 32,
+    executor: Optional[Executor] = None,
+    usage: Optional[Dict[str, int]] = None,
+    control: Optional[GenerationControl] = None,
+) -> AsyncIterator[str]:
+    """Run ``generate`` in a worker thread and yield text as it is decoded.
+
+    Closing the iterator early (for example on client disconnect) cancels the
+    streamer, which aborts ``generate`` at its next token. When given,
+    ``usage["completion_tokens"]`` is set once the generation completes.
+    """
+    loop = asyncio.get_running_loop()
+    streamer = TokenStreamer(tokenizer, loop, max_queue=max_queue, control=control)
+    worker = loop.run_in_executor(executor, streamer.run, generate)
+    try:
+        while True:
+            item = await streamer.queue.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        await worker
+        if usage is not None:
+            usage["completion_tokens"] = streamer.token_count
+    finally:
+        if not worker.done():
+            streamer.cancel()
+            worker.add_done_callback(_log_worker_failure)
+
+
+def _flatten_ids(value: Any) -> List[int]:
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, int):
+        return [value]
+    ids: List[int] = []
+    for item in value:
+        ids.extend(_flatten_ids(item))
+    return ids
+
+
+def _log_worker_failure(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Abandoned generation failed: %s", future.exception())
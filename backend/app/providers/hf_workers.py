@@ -0,0 +1,592 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Union
+
+from ..models.schemas import ChatMessage
+from .base import ProviderError
+from .hf_executor import configure_torch_threads
+from .hf_local import LoadMeter, load_mapped_pipeline
+from .hf_prompt import PromptBuilder
+from .hf_quantization import apply_quantization
+from .hf_stopping import GenerationControl
+from .hf_streaming import GenerationCancelled, IncrementalDecoder
+
+logger = logging.getLogger(__name__)
+
+Emit = Callable[[str], None]
+# Prompt text, or chat messages as ``{"role": ..., "content": ...}`` dicts.
+WorkerPrompt = Union[str, List[Dict[str, str]]]
+
+
+class TransformersWorkerBackend:
+    """Hosts ``transformers`` pipelines inside a worker process.
+
+    The first worker to load a model exports its weights to
+    ``<weights_dir>/<model>-<options hash>.pt``; every worker, the exporting
+    one included, then builds the model without initialising weights and
+    assigns tensors memory-mapped from that file, so the weights are backed by
+    one set of shared page-cache pages rather than a private copy per process. Models found as local safetensors
+    (``options["local_path"]``) are mapped from those files directly.
+
+    bf16/fp16 weights are exported in that dtype and stay shared. int8
+    quantization replaces the linear layers after loading, so each worker
+    holds its own quantized copy of them.
+    """
+
+    def __init__(self, weights_dir: str, device: int = -1) -> None:
+        self.weights_dir = Path(weights_dir)
+        self.device = device
+        self._pipelines: Dict[str, Any] = {}
+        self._prompts: Dict[str, PromptBuilder] = {}
+
+    def load(self, model_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        import torch
+        from transformers import pipeline
+
+        shared = options.get("shared_weights")
+        exported = False
+        local_path = options.get("local_path")
+        meter = LoadMeter("mmap" if local_path else "pipeline")
+        if local_path:
+            generator = load_mapped_pipeline(
+                Path(local_path),
+                torch_dtype=options.get("torch_dtype"),
+                device=self.device,
+            )
+            shared = local_path
+        elif shared and Path(shared).exists():
+            generator = self._load_shared(model_id, options, shared)
+        else:
+            generator = pipeline(
+                "text-generation",
+                model=model_id,
+                revision=options.get("revision"),
+                model_kwargs={"torch_dtype": options.get("torch_dtype")},
+                device=self.device,
+            )
+            shared = self._export(model_id, generator.model, torch, options)
+            exported = shared is not None
+            if exported:
+                # Map the export as well, dropping this worker's private copy.
+                generator = self._load_shared(model_id, options, shared)
+        load_stats = meter.report()
+        report = apply_quantization(
+            generator.model, options.get("quantization"), device=self.device
+        )
+        self._pipelines[model_id] = generator
+        self._prompts[model_id] = PromptBuilder(generator.tokenizer)
+        return {
+            "nbytes": report["bytes"],
+            "shared_weights": shared,
+            "quantization": report,
+            "load_stats": load_stats,
+            "exported": exported,
+        }
+
+    def unload(self, model_id: str) -> None:
+        self._pipelines.pop(model_id, None)
+        self._prompts.pop(model_id, None)
+
+    def generate(
+        self,
+        model_id: str,
+        prompt: WorkerPrompt,
+        options: Dict[str, Any],
+        emit: Optional[Emit],
+        cancelled: threading.Event,
+    ) -> Dict[str, Any]:
+        import torch
+
+        generator = self._pipelines.get(model_id)
+        if generator is None:
+            raise ProviderError(f"Model {model_id} is not loaded in this worker.")
+        model, tokenizer = generator.model, generator.tokenizer
+        control = GenerationControl(
+            options.get("stop"), timeout=options.get("timeout"), cancelled=cancelled
+        )
+        streamer = _CallbackStreamer(tokenizer, emit, control)
+        kwargs = {
+            "max_new_tokens": options["max_new_tokens"],
+            "do_sample": options["do_sample"],
+            "pad_token_id": tokenizer.pad_token_id or tokenizer.eos_token_id,
+        }
+        if options["do_sample"]:
+            kwargs.update(temperature=options["temperature"], top_p=options["top_p"])
+        if isinstance(prompt, str):
+            prompt_ids = tokenizer(prompt)["input_ids"]
+        else:
+            messages = [ChatMessage(**message) for message in prompt]
+            prompt_ids = self._prompts[model_id].build(messages).token_ids
+        input_ids = torch.tensor([prompt_ids], device=model.device)
+        try:
+            model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                streamer=streamer,
+                **kwargs,
+            )
+        except GenerationCancelled:
+            if control.cancelled:
+                raise
+            streamer.end()
+        return {
+            "text": streamer.text,
+            "prompt_tokens": len(prompt_ids),
+            "completion_tokens": streamer.tokens,
+            "finish_reason": control.finish_reason,
+        }
+
+    def _load_shared(self, model_id: str, options: Dict[str, Any], path: str) -> Any:
+        import torch
+        from transformers import (
+            AutoConfig,
+            AutoModelForCausalLM,
+            AutoTokenizer,
+            pipeline,
+        )
+
+        try:
+            from transformers.modeling_utils import no_init_weights
+        except ImportError:  # pragma: no cover - older transformers
+            from contextlib import nullcontext as no_init_weights
+
+        revision = options.get("revision")
+        config = AutoConfig.from_pretrained(model_id, revision=revision)
+        with no_init_weights():
+            model = AutoModelForCausalLM.from_config(
+                config, torch_dtype=options.get("torch_dtype")
+            )
+        state = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+        model.load_state_dict(state, assign=True)
+        model.tie_weights()
+        model.eval()
+        tokenizer = AutoTokenizer.from_pretrained(model_id, revision=revision)
+        return pipeline(
+            "text-generation", model=model, tokenizer=tokenizer, device=self.device
+        )
+
+    def _export(
+        self, model_id: str, model: Any, torch: Any, options: Dict[str, Any]
+    ) -> Optional[str]:
+        if self.device != -1:
+            return None
+        # Name the file after everything that changes the weights, and always
+        # rewrite it: a file left by an earlier load may be stale.
+        variant = json.dumps(
+            {
+                name: str(options.get(name))
+                for name in ("revision", "torch_dtype", "quantization")
+            },
+            sort_keys=True,
+        )
+        digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+        path = self.weights_dir / f"{model_id.replace('/', '--')}-{digest}.pt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(f".{os.getpid()}.tmp")
+        torch.save(model.state_dict(), partial)
+        partial.replace(path)
+        return str(path)
+
+
+class _CallbackStreamer:
+    def __init__(
+        self, tokenizer: Any, emit: Optional[Emit], control: GenerationControl
+    ):
+        self._decoder = IncrementalDecoder(tokenizer)
+        self._emit = emit
+        self._control = control
+        self._prompt_pending = True
+        self._parts: List[str] = []
+        self.tokens = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def put(self, value: Any) -> None:
+        if self._control.should_abort():
+            raise GenerationCancelled()
+        if self._prompt_pending:
+            self._prompt_pending = False
+            return
+        ids = value.tolist() if hasattr(value, "tolist") else list(value)
+        ids = [
+            token for row in ids for token in (row if isinstance(row, list) else [row])
+        ]
+        self.tokens += len(ids)
+        self._publish(self._control.feed(self._decoder.push(ids)))
+        if self._control.done:
+            raise GenerationCancelled()
+
+    def end(self) -> None:
+        self._publish(self._control.feed(self._decoder.flush()) + self._control.flush())
+
+    def _publish(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+            if self._emit is not None:
+                self._emit(text)
+
+
+def worker_main(
+    conn: Any, backend_factory: Callable[[], Any], torch_threads: Optional[int]
+) -> None:
+    """Entry point of a worker process: serve requests read from ``conn``."""
+    if torch_threads:
+        configure_torch_threads(torch_threads, None)
+    backend = backend_factory()
+    send_lock = threading.Lock()
+    cancels: Dict[int, threading.Event] = {}
+    # Threads let a worker interleave requests and still notice cancellations.
+    pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hf-worker")
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def handle(kind: str, request_id: int, args: tuple) -> None:
+        cancelled = cancels[request_id]
+        try:
+            if kind == "load":
+                result = backend.load(*args)
+            elif kind == "unload":
+                result = backend.unload(*args)
+            else:
+                model_id, prompt, options, stream = args
+                emit = (
+                    (lambda text: send(("chunk", request_id, text))) if stream else None
+                )
+                result = backend.generate(model_id, prompt, options, emit, cancelled)
+            send(("done", request_id, result))
+        except GenerationCancelled:
+            send(("done", request_id, {"cancelled": True}))
+        except BaseException as exc:  # noqa: BLE001 - reported to the API process
+            send(("error", request_id, f"{exc.__class__.__name__}: {exc}"))
+        finally:
+            cancels.pop(request_id, None)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind, request_id, *args = message
+        if kind == "shutdown":
+            break
+        if kind == "cancel":
+            event = cancels.get(request_id)
+            if event is not None:
+                event.set()
+            continue
+        cancels[request_id] = threading.Event()
+        pool.submit(handle, kind, request_id, tuple(args))
+    for event in cancels.values():
+        event.set()
+    pool.shutdown(wait=True)
+
+
+@dataclass(eq=False)
+class _Worker:
+    index: int
+    process: Any
+    conn: Any
+    alive: bool = True
+    inflight: Set[int] = field(default_factory=set)
+    restarts: int = 0
+    served: int = 0
+
+
+class WorkerPool:
+    """Dispatches local inference to a pool of worker processes.
+
+    Requests go to the alive worker with the fewest in-flight requests, and
+    streamed text is relayed back as it arrives. Loaded models are replayed
+    onto a replacement process whenever a worker dies; its in-flight requests
+    fail with :class:`ProviderError` instead of taking the API down.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        backend_factory: Callable[[], Any],
+        start_method: str = "spawn",
+        torch_threads: Optional[int] = None,
+    ) -> None:
+        self.size = workers
+        self._backend_factory = backend_factory
+        self._context = multiprocessing.get_context(start_method)
+        self._torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self._workers: List[_Worker] = []
+        self._requests: Dict[int, asyncio.Queue] = {}
+        self._ids = itertools.count()
+        self._models: Dict[str, Dict[str, Any]] = {}
+        # Weight files exported by a worker, removed on unload and shutdown.
+        self._exports: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        self._crashes = 0
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        self._workers = [self._spawn(index) for index in range(self.size)]
+
+    async def close(self) -> None:
+        self._closing = True
+        for worker in self._workers:
+            if worker.alive:
+                try:
+                    worker.conn.send(("shutdown", -1))
+                except OSError:
+                    pass
+        for worker in self._workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._workers = []
+        for model_id in list(self._exports):
+            self._remove_export(model_id)
+
+    async def load(self, model_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Load ``model_id`` on every worker; the first one exports shared weights."""
+        workers = self._alive()
+        meta = await self._call(workers[0], "load", model_id, options)
+        options = {**options, "shared_weights": meta.get("shared_weights")}
+        await asyncio.gather(
+            *(self._call(worker, "load", model_id, options) for worker in workers[1:])
+        )
+        self._models[model_id] = options
+        if meta.get("exported"):
+            if self._exports.get(model_id) != meta["shared_weights"]:
+                self._remove_export(model_id)
+            self._exports[model_id] = meta["shared_weights"]
+        return meta
+
+    async def unload(self, model_id: str) -> None:
+        self._models.pop(model_id, None)
+        await asyncio.gather(
+            *(self._call(worker, "unload", model_id) for worker in self._alive()),
+            return_exceptions=True,
+        )
+        self._remove_export(model_id)
+
+    async def generate(
+        self,
+        model_id: str,
+        prompt: WorkerPrompt,
+        options: Dict[str, Any],
+        *,
+        control: Optional[GenerationControl] = None,
+    ) -> Dict[str, Any]:
+        if control is not None:
+            options = {**options, **control.options()}
+        result = await self._call(
+            self._least_loaded(), "generate", model_id, prompt, options, False
+        )
+        if control is not None and result.get("finish_reason"):
+            control.finish_reason = result["finish_reason"]
+        return result
+
+    async def stream(
+        self,
+        model_id: str,
+        prompt: WorkerPrompt,
+        options: Dict[str, Any],
+        *,
+        usage: Optional[Dict[str, int]] = None,
+        control: Optional[GenerationControl] = None,
+    ) -> AsyncIterator[str]:
+        """Stream text from the least-loaded worker.
+
+        ``control``'s stop sequences and remaining deadline are enforced in the
+        worker, and its ``finish_reason`` is updated when the worker finishes.
+        """
+        if control is not None:
+            options = {**options, **control.options()}
+        worker = self._least_loaded()
+        request_id, replies = self._send(
+            worker, "generate", model_id, prompt, options, True
+        )
+        finished = False
+        try:
+            while True:
+                kind, payload = await replies.get()
+                if kind == "chunk":
+                    yield payload
+                    continue
+                finished = True
+                if kind == "error":
+                    raise ProviderError(payload)
+                if usage is not None:
+                    for name in ("prompt_tokens", "completion_tokens"):
+                        if name in payload:
+                            usage[name] = payload[name]
+                if control is not None and payload.get("finish_reason"):
+                    control.finish_reason = payload["finish_reason"]
+                return
+        finally:
+            self._finish(worker, request_id)
+            if not finished:
+                # The client went away: stop generating in the worker too.
+                self._cancel(worker, request_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": [
+                {
+                    "index": worker.index,
+                    "pid": worker.process.pid,
+                    "alive": worker.alive,
+                    "inflight": len(worker.inflight),
+                    "served": worker.served,
+                    "restarts": worker.restarts,
+                }
+                for worker in self._workers
+            ],
+            "crashes": self._crashes,
+            "models": sorted(self._models),
+            "torch_threads": self._torch_threads,
+        }
+
+    def _remove_export(self, model_id: str) -> None:
+        path = self._exports.pop(model_id, None)
+        if path is not None:
+            # Workers still mapping it keep their pages until they exit.
+            Path(path).unlink(missing_ok=True)
+
+    def _spawn(self, index: int) -> _Worker:
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=worker_main,
+            args=(child, self._backend_factory, self._torch_threads),
+            name=f"hf-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        worker = _Worker(index, process, parent)
+        threading.Thread(
+            target=self._read,
+            args=(worker,),
+            name=f"hf-worker-{index}-reader",
+            daemon=True,
+        ).start()
+        return worker
+
+    def _read(self, worker: _Worker) -> None:
+        loop = self._loop
+        while True:
+            try:
+                kind, request_id, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                loop.call_soon_threadsafe(self._deliver, request_id, kind, payload)
+            except RuntimeError:  # the event loop is gone; nobody is waiting
+                return
+        try:
+            loop.call_soon_threadsafe(self._on_exit, worker)
+        except RuntimeError:
+            pass
+
+    def _deliver(self, request_id: int, kind: str, payload: Any) -> None:
+        replies = self._requests.get(request_id)
+        if replies is not None:
+            replies.put_nowait((kind, payload))
+
+    def _on_exit(self, worker: _Worker) -> None:
+        worker.alive = False
+        for request_id in list(worker.inflight):
+            self._deliver(
+                request_id, "error", f"Inference worker {worker.index} exited."
+            )
+        if self._closing:
+            return
+        self._crashes += 1
+        logger.warning(
+            "Inference worker %d (pid %s) exited with %s; restarting",
+            worker.index,
+            worker.process.pid,
+            worker.process.exitcode,
+        )
+        asyncio.ensure_future(self._restart(worker))
+
+    async def _restart(self, dead: _Worker) -> None:
+        await asyncio.to_thread(dead.process.join, 1)
+        replacement = self._spawn(dead.index)
+        replacement.restarts = dead.restarts + 1
+        replacement.alive = False
+        self._workers[dead.index] = replacement
+        try:
+            for model_id, options in list(self._models.items()):
+                await self._call(replacement, "load", model_id, options)
+        except ProviderError as exc:
+            logger.error("Could not restore models on worker %d: %s", dead.index, exc)
+        replacement.alive = True
+
+    def _alive(self) -> List[_Worker]:
+        workers = [worker for worker in self._workers if worker.alive]
+        if not workers:
+            raise ProviderError("No inference worker processes are available.")
+        return workers
+
+    def _least_loaded(self) -> _Worker:
+        return min(self._alive(), key=lambda worker: len(worker.inflight))
+
+    def _send(self, worker: _Worker, kind: str, *args: Any):
+        request_id = next(self._ids)
+        replies: asyncio.Queue = asyncio.Queue()
+        self._requests[request_id] = replies
+        worker.inflight.add(request_id)
+        try:
+            worker.conn.send((kind, request_id, *args))
+        except OSError as exc:
+            self._finish(worker, request_id)
+            raise ProviderError(
+                f"Inference worker {worker.index} is unreachable."
+            ) from exc
+        return request_id, replies
+
+    async def _call(self, worker: _Worker, kind: str, *args: Any) -> Any:
+        request_id, replies = self._send(worker, kind, *args)
+        try:
+            while True:
+                reply, payload = await replies.get()
+                if reply == "done":
+                    return payload
+                if reply == "error":
+                    raise ProviderError(payload)
+        except asyncio.CancelledError:
+            self._cancel(worker, request_id)
+            raise
+        finally:
+            self._finish(worker, request_id)
+
+    def _cancel(self, worker: _Worker, request_id: int) -> None:
+        if not worker.alive:
+            return
+        try:
+            worker.conn.send(("cancel", request_id))
+        except (OSError, EOFError):
+            # The pipe is gone; the reader thread restarts the worker.
+            worker.alive = False
+
+    def _finish(self, worker: _Worker, request_id: int) -> None:
+        self._requests.pop(request_id, None)
+        if request_id in worker.inflight:
+            worker.inflight.discard(request_id)
+            worker.served += 1
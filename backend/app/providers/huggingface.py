@@ -1,8 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import gc
 import logging
-from typing import Any, AsyncIterator, Dict, List
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 from ..core.config import Settings
 from ..models.schemas import (
@@ -12,68 +18,239 @@ from ..models.schemas import (
     ChatCompletionResponse,
     ChatMessage,
     ModelInfo,
+    ProviderInfo,
     Role,
+    StreamDelta,
     UsageStats,
 )
-from .base import LLMProvider, ProviderError, StreamingNotSupportedError
+from .base import LLMProvider, ProviderError
+from .hf_batching import MicroBatcher, make_batch_runner
+from .hf_continuous import ContinuousBatchingEngine
+from .hf_executor import InferenceExecutor
+from .hf_local import LoadMeter, find_local_model, load_mapped_pipeline
+from .hf_pool import ModelLoadState, ModelPool, PooledModel, model_footprint
+from .hf_prefix_cache import PrefixCache, prefill
+from .hf_prompt import Prompt, PromptBuilder
+from .hf_quantization import (
+    apply_quantization,
+    load_dtype,
+    measure_throughput,
+    normalize_quantization,
+)
+from .hf_speculative import SpeculativeDecoder
+from .hf_stopping import GenerationControl
+from .hf_streaming import TokenStreamer, stream_generation
+from .hf_workers import TransformersWorkerBackend, WorkerPool
 
 logger = logging.getLogger(__name__)
 
-try:
-    from transformers import pipeline as hf_pipeline
-except ImportError:  # pragma: no cover
-    hf_pipeline = None
+# ``transformers.pipeline``, imported on the first model load; see _pipeline_factory.
+hf_pipeline: Any = None
 
 
 class HuggingFaceProvider(LLMProvider):
     id = "huggingface"
     name = "HuggingFace Local"
-    supports_streaming = False
+    supports_streaming = True
 
     def __init__(self, settings: Settings) -> None:
         super().__init__(settings)
-        self._pipelines: Dict[str, Any] = {}
-        self._lock = asyncio.Lock()
+        self._pool = ModelPool(
+            max_bytes=settings.huggingface_model_pool_bytes,
+            idle_ttl=settings.huggingface_model_idle_ttl,
+            on_evict=self._on_model_evicted,
+        )
+        self._reaper: Optional[asyncio.Task] = None
+        self._executor = InferenceExecutor(
+            workers=settings.huggingface_inference_workers,
+            torch_threads=settings.huggingface_torch_threads,
+            interop_threads=settings.huggingface_torch_interop_threads,
+            pin_cpus=settings.huggingface_pin_cpus,
+        )
+        self._batchers: Dict[str, MicroBatcher] = {}
+        self._engines: Dict[str, ContinuousBatchingEngine] = {}
+        self._prompts: Dict[str, PromptBuilder] = {}
+        self._speculative: Dict[str, SpeculativeDecoder] = {}
+        self._prefix_caches: Dict[str, Optional[PrefixCache]] = {}
+        self._loads: Dict[str, asyncio.Task] = {}
+        self._load_states: Dict[str, ModelLoadState] = {}
+        self._workers: Optional[WorkerPool] = None
+        if settings.huggingface_worker_processes:
+            self._workers = WorkerPool(
+                workers=settings.huggingface_worker_processes,
+                backend_factory=functools.partial(
+                    TransformersWorkerBackend,
+                    str(Path(settings.local_models_path) / ".worker-weights"),
+                    self._resolve_device(),
+                ),
+                start_method=settings.huggingface_worker_start_method,
+                torch_threads=settings.huggingface_torch_threads,
+            )
 
     async def generate(self, payload: ChatCompletionRequest) -> ChatCompletionResponse:
         model_id = self._ensure_model_id(payload)
-        generator = await self._get_pipeline(model_id)
-        prompt = self._build_prompt(payload.messages)
-
-        generated = await asyncio.to_thread(
-            generator,
-            prompt,
-            max_new_tokens=payload.max_tokens or 512,
-            temperature=payload.temperature,
-        )
-        text = self._extract_text(generated)
+        entry = await self._acquire(model_id)
+        try:
+            return await self._generate(payload, model_id, entry.pipeline)
+        finally:
+            self._release(entry)
+
+    async def stream(
+        self, payload: ChatCompletionRequest
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        model_id = self._ensure_model_id(payload)
+        entry = await self._acquire(model_id)
+        try:
+            async for chunk in self._stream(payload, model_id, entry.pipeline):
+                yield chunk
+        finally:
+            self._release(entry)
+
+    async def _generate(
+        self, payload: ChatCompletionRequest, model_id: str, generator: Any
+    ) -> ChatCompletionResponse:
+        engine = self.settings.huggingface_engine
+        meta: Dict[str, Any] = {}
+        control = self._control(payload)
+        decoder = self._speculative_for(model_id, payload)
+        if self._workers is not None:
+            result = await self._workers.generate(
+                model_id,
+                _message_dicts(payload.messages),
+                self._engine_kwargs(payload),
+                control=control,
+            )
+            text = result["text"]
+            prompt_tokens = result["prompt_tokens"]
+            completion_tokens = result["completion_tokens"]
+        else:
+            prompt = self._prompt_builder(model_id, generator).build(payload.messages)
+            meta["prompt"], prompt_tokens = prompt.text, len(prompt.token_ids)
+            if decoder is None and engine == "micro_batch":
+                generate_kwargs = self._generate_kwargs(payload, generator.tokenizer)
+                max_new_tokens = generate_kwargs.pop("max_new_tokens")
+                text, completion_tokens = await self._batcher_for(
+                    model_id, generator
+                ).submit(prompt.token_ids, max_new_tokens, generate_kwargs, control)
+            else:
+                usage: Dict[str, int] = {}
+                speculative: Dict[str, Any] = {}
+                texts = self._local_texts(
+                    model_id, generator, prompt, payload, control, usage, speculative
+                )
+                try:
+                    text = "".join([chunk async for chunk in texts])
+                except asyncio.CancelledError:
+                    # The caller is gone: stop generating at the next token.
+                    control.cancel()
+                    raise
+                completion_tokens = usage.get("completion_tokens", 0)
+                if speculative:
+                    meta["speculative"] = speculative
         message = ChatMessage(role=Role.ASSISTANT, content=text)
 
         return ChatCompletionResponse(
             model=model_id,
             provider=self.id,
             choices=[
-                ChatCompletionChoice(index=0, message=message, finish_reason="stop")
+                ChatCompletionChoice(
+                    index=0,
+                    message=message,
+                    finish_reason=self._finish_reason(
+                        payload, control, completion_tokens
+                    ),
+                )
             ],
-            usage=UsageStats(total_tokens=len(prompt.split()) + len(text.split())),
-            meta={"prompt": prompt},
+            usage=UsageStats(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+            meta=meta,
         )
 
-    async def stream(
-        self, payload: ChatCompletionRequest
+    async def _stream(
+        self, payload: ChatCompletionRequest, model_id: str, generator: Any
     ) -> AsyncIterator[ChatCompletionChunk]:
-        raise StreamingNotSupportedError("Streaming disabled for HuggingFace provider.")
+        usage: Dict[str, int] = {}
+        speculative: Dict[str, Any] = {}
+        control = self._control(payload)
+        if self._workers is not None:
+            texts = self._workers.stream(
+                model_id,
+                _message_dicts(payload.messages),
+                self._engine_kwargs(payload),
+                usage=usage,
+                control=control,
+            )
+        else:
+            prompt = self._prompt_builder(model_id, generator).build(payload.messages)
+            usage["prompt_tokens"] = len(prompt.token_ids)
+            texts = self._local_texts(
+                model_id, generator, prompt, payload, control, usage, speculative
+            )
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        async for text in texts:
+            yield ChatCompletionChunk(
+                id=completion_id,
+                model=model_id,
+                index=0,
+                delta=StreamDelta(content=text),
+                provider=self.id,
+            )
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        meta: Dict[str, Any] = {
+            "usage": UsageStats(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ).dict()
+        }
+        if speculative:
+            meta["speculative"] = speculative
+        yield ChatCompletionChunk(
+            id=completion_id,
+            model=model_id,
+            index=0,
+            delta=StreamDelta(
+                finish_reason=self._finish_reason(payload, control, completion_tokens)
+            ),
+            provider=self.id,
+            meta=meta,
+        )
 
     async def get_models(self) -> List[ModelInfo]:
         loaded = [
             ModelInfo(
-                id=model_id,
+                id=entry.model_id,
                 provider=self.id,
                 loaded=True,
                 description="Loaded locally",
+                meta={
+                    **entry.meta,
+                    "resident_bytes": entry.nbytes,
+                    "loaded_at": _isoformat(entry.loaded_at),
+                    "last_used": _isoformat(entry.last_used),
+                    **self._load_meta(entry.model_id),
+                },
             )
-            for model_id in self._pipelines.keys()
+            for entry in self._pool.entries()
         ]
+        loaded.extend(
+            ModelInfo(
+                id=model_id,
+                provider=self.id,
+                loaded=False,
+                description=(
+                    "Loading" if state.status == "loading" else "Failed to load"
+                ),
+                meta={"load": state.snapshot()},
+            )
+            for model_id, state in self._load_states.items()
+            if model_id not in self._pool and state.status != "loaded"
+        )
         if not loaded:
             loaded.append(
                 ModelInfo(
@@ -93,44 +270,442 @@ class HuggingFaceProvider(LLMProvider):
         quantization: str | None = None,
         **parameters: object,
     ) -> ModelInfo:
-        if hf_pipeline is None:
-            raise ProviderError(
-                "transformers is not installed. Install it to use local HuggingFace models."
+        if model_id in self._pool:
+            return ModelInfo(id=model_id, provider=self.id, loaded=True)
+        # One load per model; callers asking for the same model share it, and
+        # loads of different models proceed concurrently.
+        task = self._loads.get(model_id)
+        if task is None:
+            state = ModelLoadState(model_id)
+            self._load_states[model_id] = state
+            task = asyncio.create_task(
+                self._load(state, revision, quantization, parameters)
             )
-        async with self._lock:
-            if model_id in self._pipelines:
-                return ModelInfo(id=model_id, provider=self.id, loaded=True)
-            logger.info("Loading HuggingFace model %s", model_id)
-            generator = await asyncio.to_thread(
-                hf_pipeline,
-                "text-generation",
-                model=model_id,
-                revision=revision,
-                model_kwargs={"torch_dtype": parameters.get("torch_dtype")},
-                device=self._resolve_device(),
+            self._loads[model_id] = task
+            task.add_done_callback(functools.partial(self._on_load_done, model_id))
+        return await asyncio.shield(task)
+
+    @classmethod
+    def describe(cls, settings: Settings) -> ProviderInfo:
+        info = super().describe(settings)
+        info.meta["engine"] = settings.huggingface_engine
+        return info
+
+    def to_info(self, *, models: Iterable[str] | None = None) -> ProviderInfo:
+        info = super().to_info(models=models)
+        info.meta["engine"] = self.settings.huggingface_engine
+        info.meta["model_pool"] = self._pool.stats()
+        info.meta["loading"] = sorted(self._loads)
+        info.meta["executor"] = self._executor.stats()
+        info.meta["batching"] = {
+            model_id: batcher.stats() for model_id, batcher in self._batchers.items()
+        }
+        info.meta["speculative"] = {
+            model_id: decoder.stats() for model_id, decoder in self._speculative.items()
+        }
+        info.meta["prompts"] = {
+            model_id: builder.stats() for model_id, builder in self._prompts.items()
+        }
+        info.meta["continuous_batching"] = {
+            model_id: engine.stats() for model_id, engine in self._engines.items()
+        }
+        info.meta["prefix_cache"] = {
+            model_id: cache.stats()
+            for model_id, cache in self._prefix_caches.items()
+            if cache is not None
+        }
+        if self._workers is not None:
+            info.meta["worker_processes"] = self._workers.stats()
+        return info
+
+    async def startup(self) -> None:
+        if self._workers is not None:
+            await self._workers.start()
+        if self._pool.idle_ttl is not None and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle_models())
+
+    async def aclose(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for engine in self._engines.values():
+            engine.close()
+        self._engines.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._workers is not None:
+            await self._workers.close()
+
+    async def _reap_idle_models(self) -> None:
+        interval = min(max(self._pool.idle_ttl / 2, 1.0), 60.0)
+        while True:
+            await asyncio.sleep(interval)
+            if self._pool.evict_idle():
+                _release_memory()
+
+    async def _load(
+        self,
+        state: ModelLoadState,
+        revision: str | None,
+        quantization: str | None,
+        parameters: Dict[str, object],
+    ) -> ModelInfo:
+        model_id = state.model_id
+        logger.info("Loading HuggingFace model %s", model_id)
+        try:
+            mode = normalize_quantization(quantization)
+            torch_dtype = parameters.get("torch_dtype") or load_dtype(mode)
+            draft_id = parameters.get("draft_model")
+            if draft_id and self._workers is not None:
+                raise ProviderError(
+                    "draft_model is not supported with worker processes."
+                )
+            state.phase = "loading weights"
+            meta: Dict[str, Any] = {
+                "quantization": None,
+                "path": self.settings.local_models_path,
+            }
+            local_path = await asyncio.to_thread(
+                self._local_weights, model_id, revision
             )
-            self._pipelines[model_id] = generator
+            if self._workers is not None:
+                await self._workers.start()
+                loaded = await self._workers.load(
+                    model_id,
+                    {
+                        "revision": revision,
+                        "torch_dtype": torch_dtype,
+                        "quantization": mode,
+                        "local_path": str(local_path) if local_path else None,
+                    },
+                )
+                meta["quantization"] = loaded.get("quantization")
+                meta["shared_weights"] = loaded.get("shared_weights")
+                meta["load_stats"] = loaded.get("load_stats")
+                state.phase = "registering"
+                # Workers map the same weights, so the budget counts one copy.
+                evicted = self._pool.add(
+                    model_id, self._workers, meta, nbytes=loaded["nbytes"]
+                )
+            else:
+                generator, meta["load_stats"] = await asyncio.to_thread(
+                    self._load_pipeline, model_id, revision, torch_dtype, local_path
+                )
+                nbytes = None
+                benchmark_tokens = parameters.get("benchmark_tokens")
+                if mode is not None or benchmark_tokens:
+                    state.phase = "quantizing"
+                    report = await asyncio.to_thread(
+                        self._quantize, generator, mode, benchmark_tokens
+                    )
+                    meta["quantization"] = report
+                    nbytes = report["bytes"]
+                if draft_id:
+                    state.phase = "loading draft"
+                    decoder, draft_bytes = await asyncio.to_thread(
+                        self._load_draft,
+                        generator,
+                        str(draft_id),
+                        torch_dtype,
+                        mode,
+                        int(parameters.get("draft_tokens") or 4),
+                    )
+                    meta["draft_model"] = {
+                        "id": draft_id,
+                        "bytes": draft_bytes,
+                        "draft_tokens": decoder.draft_tokens,
+                    }
+                    if nbytes is None:
+                        nbytes = model_footprint(generator)
+                    nbytes += draft_bytes
+                state.phase = "registering"
+                evicted = self._pool.add(model_id, generator, meta, nbytes=nbytes)
+                if draft_id:
+                    self._speculative[model_id] = decoder
+            if evicted:
+                _release_memory()
+        except BaseException as exc:
+            state.finish(exc)
+            raise
+        state.finish()
         return ModelInfo(
             id=model_id,
             provider=self.id,
             loaded=True,
-            meta={
-                "quantization": quantization,
-                "path": self.settings.local_models_path,
-            },
+            meta={**meta, "evicted": evicted, "load": state.snapshot()},
+        )
+
+    def _local_weights(self, model_id: str, revision: str | None) -> Optional[Path]:
+        """Local safetensors directory for ``model_id``, if it can be mapped."""
+        if not self.settings.huggingface_mmap_weights or revision:
+            return None
+        return find_local_model(
+            model_id,
+            [
+                self.settings.local_models_path,
+                self.settings.huggingface_download_path,
+            ],
+        )
+
+    def _load_pipeline(
+        self,
+        model_id: str,
+        revision: str | None,
+        torch_dtype: Any,
+        local_path: Optional[Path],
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Build the pipeline, preferring weights mapped from ``local_path``."""
+        if local_path is not None:
+            meter = LoadMeter("mmap")
+            try:
+                generator = load_mapped_pipeline(
+                    local_path, torch_dtype=torch_dtype, device=self._resolve_device()
+                )
+            except Exception as exc:  # noqa: BLE001 - fall back to the pipeline
+                logger.warning(
+                    "Mapping %s from %s failed, loading normally: %s",
+                    model_id,
+                    local_path,
+                    exc,
+                )
+            else:
+                return generator, {**meter.report(), "source": str(local_path)}
+        meter = LoadMeter("pipeline")
+        generator = _pipeline_factory()(
+            "text-generation",
+            model=model_id,
+            revision=revision,
+            model_kwargs={"torch_dtype": torch_dtype},
+            device=self._resolve_device(),
+        )
+        return generator, meter.report()
+
+    def _quantize(
+        self, generator: Any, mode: Optional[str], benchmark_tokens: Any
+    ) -> Dict[str, Any]:
+        report = apply_quantization(
+            generator.model, mode, device=self._resolve_device()
         )
+        if benchmark_tokens:
+            report.update(
+                measure_throughput(
+                    generator.model,
+                    generator.tokenizer,
+                    "The quick brown fox jumps over the lazy dog.",
+                    max_new_tokens=int(benchmark_tokens),
+                )
+            )
+        return report
+
+    def _load_draft(
+        self,
+        generator: Any,
+        draft_id: str,
+        torch_dtype: Any,
+        mode: Optional[str],
+        draft_tokens: int,
+    ) -> Tuple[SpeculativeDecoder, int]:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
 
-    async def _get_pipeline(self, model_id: str):
-        if hf_pipeline is None:
+        if AutoTokenizer.from_pretrained(draft_id).get_vocab() != (
+            generator.tokenizer.get_vocab()
+        ):
             raise ProviderError(
-                "transformers is not installed. Install it to use local HuggingFace models."
+                f"Draft model {draft_id} does not share the target's tokenizer."
+            )
+        draft = AutoModelForCausalLM.from_pretrained(draft_id, torch_dtype=torch_dtype)
+        draft.to(generator.model.device).eval()
+        if mode is not None:
+            nbytes = apply_quantization(draft, mode, device=self._resolve_device())[
+                "bytes"
+            ]
+        else:
+            nbytes = model_footprint(draft)
+        decoder = SpeculativeDecoder(
+            generator.model, draft, draft_tokens=max(1, draft_tokens)
+        )
+        return decoder, nbytes
+
+    def _speculative_for(
+        self, model_id: str, payload: ChatCompletionRequest
+    ) -> Optional[SpeculativeDecoder]:
+        # Verification reproduces greedy decoding only.
+        if payload.temperature > 0:
+            return None
+        return self._speculative.get(model_id)
+
+    def _on_load_done(self, model_id: str, task: asyncio.Task) -> None:
+        self._loads.pop(model_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Loading %s failed: %s", model_id, task.exception())
+
+    def _load_meta(self, model_id: str) -> Dict[str, Any]:
+        state = self._load_states.get(model_id)
+        return {"load": state.snapshot()} if state is not None else {}
+
+    def _on_model_evicted(self, entry: PooledModel) -> None:
+        if self._workers is not None and entry.pipeline is self._workers:
+            asyncio.ensure_future(self._workers.unload(entry.model_id))
+        engine = self._engines.pop(entry.model_id, None)
+        if engine is not None:
+            engine.close()
+        self._batchers.pop(entry.model_id, None)
+        self._prompts.pop(entry.model_id, None)
+        self._speculative.pop(entry.model_id, None)
+        self._prefix_caches.pop(entry.model_id, None)
+
+    def _engine_for(self, model_id: str, generator: Any) -> ContinuousBatchingEngine:
+        engine = self._engines.get(model_id)
+        if engine is None:
+            engine = ContinuousBatchingEngine(
+                generator.model,
+                generator.tokenizer,
+                max_batch_size=self.settings.huggingface_max_batch_size,
+                prefix_cache=self._prefix_cache_for(model_id),
+                thread_initializer=self._executor.initialize_thread,
+            )
+            self._engines[model_id] = engine
+        return engine
+
+    def _prompt_builder(self, model_id: str, generator: Any) -> PromptBuilder:
+        builder = self._prompts.get(model_id)
+        if builder is None:
+            builder = self._prompts[model_id] = PromptBuilder(generator.tokenizer)
+        return builder
+
+    def _prefix_cache_for(self, model_id: str) -> Optional[PrefixCache]:
+        """The model's prefix cache, shared by every engine; ``None`` if disabled."""
+        if model_id not in self._prefix_caches:
+            cache = None
+            if self.settings.huggingface_prefix_cache_bytes:
+                cache = PrefixCache(
+                    max_bytes=self.settings.huggingface_prefix_cache_bytes,
+                    block_size=self.settings.huggingface_prefix_cache_block_size,
+                )
+            self._prefix_caches[model_id] = cache
+        return self._prefix_caches[model_id]
+
+    def _engine_kwargs(self, payload: ChatCompletionRequest) -> Dict[str, Any]:
+        return {
+            "max_new_tokens": payload.max_tokens or 512,
+            "do_sample": payload.temperature > 0,
+            "temperature": payload.temperature,
+            "top_p": payload.top_p,
+        }
+
+    def _local_texts(
+        self,
+        model_id: str,
+        generator: Any,
+        prompt: Prompt,
+        payload: ChatCompletionRequest,
+        control: GenerationControl,
+        usage: Dict[str, int],
+        speculative: Dict[str, Any],
+    ) -> AsyncIterator[str]:
+        """Text of one in-process generation, streamed as it is decoded."""
+        max_queue = self.settings.huggingface_stream_queue_size
+        decoder = self._speculative_for(model_id, payload)
+        if decoder is not None:
+            eos_token_id = generator.tokenizer.eos_token_id
+
+            def speculate(streamer: TokenStreamer) -> None:
+                result = decoder.generate(
+                    prompt.token_ids,
+                    max_new_tokens=payload.max_tokens or 512,
+                    eos_token_id=eos_token_id,
+                    streamer=streamer,
+                )
+                speculative.update(result.stats)
+
+            return stream_generation(
+                speculate,
+                generator.tokenizer,
+                max_queue=max_queue,
+                executor=self._executor,
+                usage=usage,
+                control=control,
+            )
+        if self.settings.huggingface_engine == "continuous":
+            return self._engine_for(model_id, generator).stream(
+                prompt.token_ids,
+                max_pending=max_queue,
+                usage=usage,
+                control=control,
+                **self._engine_kwargs(payload),
+            )
+        model, tokenizer = generator.model, generator.tokenizer
+        generate_kwargs = self._generate_kwargs(payload, tokenizer)
+
+        prefix_cache = self._prefix_cache_for(model_id)
+
+        def generate(streamer: TokenStreamer) -> None:
+            inputs = tokenizer.pad(
+                {"input_ids": [prompt.token_ids]}, return_tensors="pt"
+            ).to(model.device)
+            if prefix_cache is not None:
+                past = prefill(model, [prompt.token_ids], prefix_cache)
+                if past is not None:
+                    inputs["past_key_values"] = past
+            model.generate(**inputs, streamer=streamer, **generate_kwargs)
+
+        return stream_generation(
+            generate,
+            tokenizer,
+            max_queue=max_queue,
+            executor=self._executor,
+            usage=usage,
+            control=control,
+        )
+
+    def _control(self, payload: ChatCompletionRequest) -> GenerationControl:
+        return GenerationControl(
+            payload.stop, timeout=self.settings.huggingface_generation_timeout
+        )
+
+    def _finish_reason(
+        self,
+        payload: ChatCompletionRequest,
+        control: GenerationControl,
+        completion_tokens: int,
+    ) -> str:
+        if control.finish_reason is not None:
+            return control.finish_reason
+        return "length" if completion_tokens >= (payload.max_tokens or 512) else "stop"
+
+    def _batcher_for(self, model_id: str, generator: Any) -> MicroBatcher:
+        batcher = self._batchers.get(model_id)
+        if batcher is None:
+            batcher = MicroBatcher(
+                make_batch_runner(
+                    generator.model,
+                    generator.tokenizer,
+                    self._prefix_cache_for(model_id),
+                ),
+                max_batch_size=self.settings.huggingface_max_batch_size,
+                window=self.settings.huggingface_batch_window,
+                executor=self._executor,
             )
-        async with self._lock:
-            pipeline = self._pipelines.get(model_id)
-            if pipeline is not None:
-                return pipeline
-        info = await self.load_model(model_id)
-        return self._pipelines[info.id]
+            self._batchers[model_id] = batcher
+        return batcher
+
+    async def _acquire(self, model_id: str) -> PooledModel:
+        """Pin ``model_id`` in the pool for one generation, loading it if needed."""
+        entry = self._pool.acquire(model_id)
+        # A concurrent load can evict the model before this caller resumes;
+        # load it once more before giving up.
+        for _ in range(2):
+            if entry is not None:
+                return entry
+            await self.load_model(model_id)
+            entry = self._pool.acquire(model_id)
+        raise ProviderError(
+            f"Model {model_id} was unloaded to make room for another model; "
+            "retry the request or raise HUGGINGFACE_MODEL_POOL_BYTES."
+        )
+
+    def _release(self, entry: PooledModel) -> None:
+        if self._pool.release(entry):
+            _release_memory()
 
     def _resolve_device(self) -> int:
         device = self.settings.device.lower()
@@ -141,28 +716,52 @@ class HuggingFaceProvider(LLMProvider):
     def _ensure_model_id(self, payload: ChatCompletionRequest) -> str:
         if payload.model:
             return payload.model
-        loaded = list(self._pipelines.keys())
+        loaded = self._pool.entries()
         if loaded:
-            return loaded[0]
+            # Most recently used first.
+            return loaded[-1].model_id
         raise ProviderError(
             "No local model loaded. Call POST /api/models/load before requesting completions."
         )
 
-    def _build_prompt(self, messages: List[ChatMessage]) -> str:
-        segments = []
-        for message in messages:
-            if message.role is Role.SYSTEM:
-                segments.append(f"[System]\n{message.content.strip()}\n")
-            elif message.role is Role.USER:
-                segments.append(f"[User]\n{message.content.strip()}\n")
-            else:
-                segments.append(f"[Assistant]\n{message.content.strip()}\n")
-        segments.append("[Assistant]\n")
-        return "\n".join(segments)
-
-    def _extract_text(self, generated: Any) -> str:
-        if isinstance(generated, list) and generated:
-            item = generated[0]
-            if isinstance(item, dict):
-                return item.get("generated_text", "")
-        return str(generated)
+    def _generate_kwargs(
+        self, payload: ChatCompletionRequest, tokenizer: Any
+    ) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "max_new_tokens": payload.max_tokens or 512,
+            "do_sample": payload.temperature > 0,
+            "pad_token_id": tokenizer.pad_token_id or tokenizer.eos_token_id,
+        }
+        if kwargs["do_sample"]:
+            kwargs.update(temperature=payload.temperature, top_p=payload.top_p)
+        return kwargs
+
+
+def _pipeline_factory() -> Any:
+    global hf_pipeline
+    if hf_pipeline is None:
+        try:
+            from transformers import pipeline
+        except ImportError as exc:
+            raise ProviderError(
+                "transformers is not installed. Install it to use local HuggingFace models."
+            ) from exc
+        hf_pipeline = pipeline
+    return hf_pipeline
+
+
+def _message_dicts(messages: List[ChatMessage]) -> List[Dict[str, str]]:
+    return [
+        {"role": message.role.value, "content": message.content} for message in messages
+    ]
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _release_memory() -> None:
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
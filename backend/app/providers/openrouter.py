@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import json
+import logging
 from contextlib import asynccontextmanager
 from typing import Any, AsyncIterator, Dict, Iterable, List, Literal, Optional
 
@@ -20,18 +23,65 @@ from ..models.schemas import (
     UsageStats,
 )
 from .base import LLMProvider, ProviderError
+from .catalog import CatalogFetch, CatalogValidators, ModelCatalogCache
+from .resilience import (
+    ResilienceStats,
+    RetryableResponseError,
+    RetryPolicy,
+    call_hedged,
+    call_with_retries,
+)
 
 OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
 
+logger = logging.getLogger(__name__)
+
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 
 class OpenRouterProvider(LLMProvider):
     id = "openrouter"
     name = "OpenRouter"
     supports_streaming = True
+    supports_relay = True
 
-    def __init__(self, settings: Settings) -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
         super().__init__(settings)
         self._api_key: Optional[str] = None
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_lock = asyncio.Lock()
+        self._closed = False
+        self._clients_created = 0
+        self._requests_total = 0
+        self._requests_in_flight = 0
+        self._catalog = ModelCatalogCache(
+            self._fetch_catalog, ttl=settings.model_catalog_ttl
+        )
+        self._retry_policy = RetryPolicy(
+            max_retries=settings.openrouter_max_retries,
+            base_delay=settings.openrouter_retry_base_delay,
+            max_delay=settings.openrouter_retry_max_delay,
+            max_retry_after=settings.openrouter_max_retry_after,
+        )
+        self._resilience = ResilienceStats()
+
+    async def startup(self) -> None:
+        self._closed = False
+        await self._ensure_client()
+
+    async def aclose(self) -> None:
+        """Close the pooled client; requests fail until :meth:`startup` reopens it."""
+        async with self._client_lock:
+            self._closed = True
+            client, self._client = self._client, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
 
     async def generate(self, payload: ChatCompletionRequest) -> ChatCompletionResponse:
         response = await self._post_chat(payload, stream=False)
@@ -49,8 +99,21 @@ class OpenRouterProvider(LLMProvider):
             yield chunk
 
     async def get_models(self) -> List[ModelInfo]:
+        return await self._catalog.get()
+
+    def invalidate_models(self) -> None:
+        self._catalog.invalidate()
+
+    async def _fetch_catalog(self, validators: CatalogValidators) -> CatalogFetch:
+        headers: Dict[str, str] = {}
+        if validators.etag:
+            headers["If-None-Match"] = validators.etag
+        if validators.last_modified:
+            headers["If-Modified-Since"] = validators.last_modified
         async with self._client_session() as client:
-            resp = await client.get("/models")
+            resp = await client.get("/models", headers=headers)
+            if resp.status_code == httpx.codes.NOT_MODIFIED:
+                return CatalogFetch(models=None, validators=validators)
             resp.raise_for_status()
             data = resp.json()
         models = []
@@ -67,7 +130,19 @@ class OpenRouterProvider(LLMProvider):
                     },
                 )
             )
-        return models
+        return CatalogFetch(
+            models=models,
+            validators=CatalogValidators(
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            ),
+        )
+
+    async def relay(self, payload: ChatCompletionRequest) -> AsyncIterator[bytes]:
+        request_payload = self._build_request(payload, stream=True)
+        headers = self._build_headers(payload)
+        async for data in self._stream_data(request_payload, headers):
+            yield _relay_frame(data)
 
     async def _post_chat(
         self,
@@ -76,44 +151,97 @@ class OpenRouterProvider(LLMProvider):
         stream: bool,
     ) -> Dict[str, Any] | AsyncIterator[ChatCompletionChunk]:
         request_payload = self._build_request(payload, stream=stream)
-        api_key = self._resolve_api_key(payload)
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": self.settings.frontend_url,
-            "X-Title": "LLM Playground",
-        }
+        headers = self._build_headers(payload)
         if stream:
             return self._streaming_request(request_payload, headers)
         async with self._client_session() as client:
-            resp = await client.post(
-                "/chat/completions", json=request_payload, headers=headers
+            request = client.build_request(
+                "POST", "/chat/completions", json=request_payload, headers=headers
+            )
+
+            async def attempt() -> httpx.Response:
+                return await call_hedged(
+                    lambda: self._send(client, request),
+                    self.settings.openrouter_hedge_after,
+                    self._resilience,
+                )
+
+            resp = await call_with_retries(
+                attempt, self._retry_policy, self._resilience
             )
             resp.raise_for_status()
             return resp.json()  # type: ignore[return-value]
 
+    async def _send(
+        self, client: httpx.AsyncClient, request: httpx.Request, *, stream: bool = False
+    ) -> httpx.Response:
+        self._resilience.incr("attempts")
+        response = await client.send(request, stream=stream)
+        if response.status_code in self._retry_policy.status_codes:
+            await response.aclose()
+            raise RetryableResponseError(response)
+        return response
+
+    def _build_headers(self, payload: ChatCompletionRequest) -> Dict[str, str]:
+        api_key = self._resolve_api_key(payload)
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": self.settings.frontend_url,
+            "X-Title": "LLM Playground",
+        }
+
     async def _streaming_request(
         self,
         payload: Dict[str, Any],
         headers: Dict[str, str],
     ) -> AsyncIterator[ChatCompletionChunk]:
+        async for data in self._stream_data(payload, headers):
+            chunk = self._parse_stream_chunk(data)
+            if chunk:
+                yield chunk
+
+    async def _stream_data(
+        self,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+    ) -> AsyncIterator[bytes]:
+        """Yield the raw payload of each upstream ``data:`` line until ``[DONE]``."""
         async with self._client_session() as client:
-            async with client.stream(
+            request = client.build_request(
                 "POST",
                 "/chat/completions",
                 json=payload,
                 headers={**headers, "Accept": "text/event-stream"},
                 timeout=None,
-            ) as response:
-                async for line in response.aiter_lines():
-                    if not line or not line.startswith("data:"):
-                        continue
-                    data = line.replace("data:", "", 1).strip()
-                    if data == "[DONE]":
-                        break
-                    chunk = self._parse_stream_chunk(data)
-                    if chunk:
-                        yield chunk
+            )
+            # Only opening the stream is retried; once bytes flow, a retry
+            # would duplicate output already sent to the client.
+            response = await call_with_retries(
+                lambda: self._send(client, request, stream=True),
+                self._retry_policy,
+                self._resilience,
+            )
+            try:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                buffer = b""
+                async for block in response.aiter_bytes():
+                    buffer += block
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        data = _sse_data(line)
+                        if data == b"[DONE]":
+                            return
+                        if data:
+                            yield data
+                # The last event may end without a newline when the stream closes.
+                data = _sse_data(buffer)
+                if data and data != b"[DONE]":
+                    yield data
+            finally:
+                await response.aclose()
 
     def _parse_chat_completion(self, data: Dict[str, Any]) -> ChatCompletionResponse:
         choices = []
@@ -149,7 +277,7 @@ class OpenRouterProvider(LLMProvider):
             meta=data.get("meta") or {},
         )
 
-    def _parse_stream_chunk(self, data: str) -> Optional[ChatCompletionChunk]:
+    def _parse_stream_chunk(self, data: str | bytes) -> Optional[ChatCompletionChunk]:
         try:
             payload = json.loads(data)
         except json.JSONDecodeError:
@@ -200,11 +328,72 @@ class OpenRouterProvider(LLMProvider):
 
     @asynccontextmanager
     async def _client_session(self) -> AsyncIterator[httpx.AsyncClient]:
-        async with httpx.AsyncClient(
-            base_url=OPENROUTER_API_BASE,
-            timeout=httpx.Timeout(30.0, connect=10.0),
-        ) as client:
+        client = await self._ensure_client()
+        self._requests_total += 1
+        self._requests_in_flight += 1
+        try:
             yield client
+        finally:
+            self._requests_in_flight -= 1
+
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        client = self._client
+        if client is not None and not client.is_closed:
+            return client
+        async with self._client_lock:
+            if self._closed:
+                raise ProviderError("OpenRouter provider is closed.")
+            if self._client is None or self._client.is_closed:
+                self._client = self._create_client()
+                self._clients_created += 1
+            return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        settings = self.settings
+        http2 = settings.openrouter_http2
+        if http2 and not _HTTP2_AVAILABLE:
+            logger.warning(
+                "OPENROUTER_HTTP2 is enabled but the 'h2' package is missing; "
+                "falling back to HTTP/1.1."
+            )
+            http2 = False
+        return httpx.AsyncClient(
+            base_url=OPENROUTER_API_BASE,
+            timeout=httpx.Timeout(
+                settings.openrouter_timeout,
+                connect=settings.openrouter_connect_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.openrouter_max_connections,
+                max_keepalive_connections=settings.openrouter_max_keepalive_connections,
+                keepalive_expiry=settings.openrouter_keepalive_expiry,
+            ),
+            http2=http2,
+            transport=self._transport,
+        )
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the shared connection pool."""
+        client = self._client
+        stats: Dict[str, Any] = {
+            "open": client is not None and not client.is_closed,
+            "http2": self.settings.openrouter_http2 and _HTTP2_AVAILABLE,
+            "max_connections": self.settings.openrouter_max_connections,
+            "max_keepalive_connections": self.settings.openrouter_max_keepalive_connections,
+            "keepalive_expiry": self.settings.openrouter_keepalive_expiry,
+            "clients_created": self._clients_created,
+            "requests_total": self._requests_total,
+            "requests_in_flight": self._requests_in_flight,
+        }
+        # httpcore does not expose pool metrics publicly; read them defensively.
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(
+                1 for connection in connections if connection.is_idle()
+            )
+        return stats
 
     def set_api_key(self, api_key: Optional[str]) -> None:
         self._api_key = api_key.strip() if api_key else None
@@ -221,10 +410,20 @@ class OpenRouterProvider(LLMProvider):
             return "env"
         return "none"
 
+    @classmethod
+    def describe(cls, settings: Settings) -> ProviderInfo:
+        info = super().describe(settings)
+        info.meta["api_key_configured"] = bool(settings.openrouter_api_key)
+        info.meta["api_key_source"] = "env" if settings.openrouter_api_key else "none"
+        return info
+
     def to_info(self, *, models: Iterable[str] | None = None) -> ProviderInfo:
         info = super().to_info(models=models)
         info.meta["api_key_configured"] = self.api_key_configured
         info.meta["api_key_source"] = self.api_key_source
+        info.meta["connection_pool"] = self.pool_stats()
+        info.meta["model_catalog"] = self._catalog.stats()
+        info.meta["resilience"] = self._resilience.snapshot()
         return info
 
 
@@ -236,3 +435,18 @@ def payload_model(data: Dict[str, Any]) -> str:
     if choices:
         return choices[0].get("model", "unknown")
     return "unknown"
+
+
+def _sse_data(line: bytes) -> Optional[bytes]:
+    """Payload of an SSE ``data:`` line, or ``None`` for any other line."""
+    if not line.startswith(b"data:"):
+        return None
+    return line[5:].strip()
+
+
+def _relay_frame(data: bytes) -> bytes:
+    """Wrap an upstream chunk, unparsed, in an SSE ``data:`` frame.
+
+    Relayed frames keep OpenRouter's OpenAI-style ``choices[0].delta`` shape.
+    """
+    return b"data: " + data + b"\n\n"
@@ -1,40 +1,197 @@
 from __future__ import annotations
 
-from typing import Dict, List
+import asyncio
+import importlib
+import logging
+import time
+from typing import Dict, List, Optional, Type
 
 from ..core.config import Settings
-from ..models.schemas import ModelInfo, ProviderInfo
+from ..models.schemas import (
+    ModelCatalogResponse,
+    ModelInfo,
+    ProviderInfo,
+    ProviderModelsStatus,
+)
 from .base import LLMProvider, ProviderError
-from .huggingface import HuggingFaceProvider
-from .openrouter import OpenRouterProvider
+
+logger = logging.getLogger(__name__)
+
+# Provider id -> "module:class", imported only when the provider is first used.
+PROVIDER_CLASSES: Dict[str, str] = {
+    "openrouter": "app.providers.openrouter:OpenRouterProvider",
+    "huggingface": "app.providers.huggingface:HuggingFaceProvider",
+}
 
 
 class ProviderRegistry:
-    """Factory and registry for configured LLM providers."""
+    """Factory and registry for configured LLM providers.
+
+    Only the providers named in ``Settings.enabled_providers`` are registered,
+    and each is imported and constructed the first time it is requested.
+    """
 
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
-        self._providers: Dict[str, LLMProvider] = {}
+        self._providers: Dict[str, Optional[LLMProvider]] = {}
+        self._started = False
+        self._startups: Dict[str, asyncio.Task] = {}
         self._bootstrap()
 
     def _bootstrap(self) -> None:
-        self._providers[OpenRouterProvider.id] = OpenRouterProvider(self.settings)
-        self._providers[HuggingFaceProvider.id] = HuggingFaceProvider(self.settings)
+        for provider_id in self.settings.enabled_providers:
+            if provider_id not in PROVIDER_CLASSES:
+                logger.warning("Ignoring unknown provider '%s'", provider_id)
+                continue
+            self._providers[provider_id] = None
+
+    async def startup(self) -> None:
+        self._started = True
+        for provider in self._initialized():
+            await provider.startup()
+
+    async def aclose(self) -> None:
+        for task in self._startups.values():
+            task.cancel()
+        for provider in self._initialized():
+            try:
+                await provider.aclose()
+            except Exception:  # pragma: no cover - shutdown must not abort early
+                logger.exception("Failed to close provider %s", provider.id)
+        self._started = False
 
     def get(self, provider_id: str) -> LLMProvider:
-        provider = self._providers.get(provider_id)
-        if not provider:
+        if provider_id not in self._providers:
             raise ProviderError(f"Provider '{provider_id}' is not registered.")
+        provider = self._providers[provider_id]
+        if provider is None:
+            provider = self._providers[provider_id] = self._create(provider_id)
+        return provider
+
+    async def get_ready(self, provider_id: str) -> LLMProvider:
+        """Like :meth:`get`, but wait until a lazily created provider started.
+
+        A failed startup is raised here and the provider discarded, so the
+        next request constructs it afresh.
+        """
+        provider = self.get(provider_id)
+        task = self._startups.get(provider_id)
+        if task is not None:
+            try:
+                # Shielded: a cancelled request must not abort a shared startup.
+                await asyncio.shield(task)
+            except Exception as exc:
+                if self._startups.get(provider_id) is task:
+                    del self._startups[provider_id]
+                    self._providers[provider_id] = None
+                raise ProviderError(
+                    f"Provider '{provider_id}' failed to start: {exc}"
+                ) from exc
+            if self._startups.get(provider_id) is task:
+                del self._startups[provider_id]
         return provider
 
     def list_providers(self) -> List[ProviderInfo]:
-        return [provider.to_info() for provider in self._providers.values()]
+        """Describe every registered provider without constructing any.
+
+        Providers already in use report live details from :meth:`to_info`;
+        the rest are described from their class and the settings.
+        """
+        return [
+            (
+                provider.to_info()
+                if provider is not None
+                else self._provider_class(provider_id).describe(self.settings)
+            )
+            for provider_id, provider in self._providers.items()
+        ]
+
+    def provider_ids(self) -> List[str]:
+        """Ids of the registered providers, constructed or not."""
+        return list(self._providers)
+
+    def initialized(self) -> List[str]:
+        """Ids of the providers constructed so far."""
+        return [provider.id for provider in self._initialized()]
+
+    def _provider_class(self, provider_id: str) -> Type[LLMProvider]:
+        module_name, _, class_name = PROVIDER_CLASSES[provider_id].partition(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def _create(self, provider_id: str) -> LLMProvider:
+        started = time.perf_counter()
+        provider = self._provider_class(provider_id)(self.settings)
+        logger.info(
+            "Initialised provider %s in %.1f ms",
+            provider_id,
+            (time.perf_counter() - started) * 1000,
+        )
+        if self._started:
+            # Created after application startup: acquire its resources now.
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                self._startups[provider_id] = loop.create_task(provider.startup())
+        return provider
+
+    def _initialized(self) -> List[LLMProvider]:
+        return [
+            provider for provider in self._providers.values() if provider is not None
+        ]
 
     async def list_models(self) -> List[ModelInfo]:
+        return (await self.collect_models()).models
+
+    async def collect_models(self) -> ModelCatalogResponse:
+        """Query every provider concurrently, each bounded by its own deadline."""
+        results = await asyncio.gather(
+            *(
+                self._models_with_deadline(provider_id)
+                for provider_id in self._providers
+            )
+        )
+        catalog = ModelCatalogResponse()
+        for models, status in results:
+            catalog.models.extend(models)
+            catalog.providers.append(status)
+        return catalog
+
+    async def _models_with_deadline(
+        self, provider_id: str
+    ) -> tuple[List[ModelInfo], ProviderModelsStatus]:
+        timeout = self.settings.model_list_timeouts.get(
+            provider_id, self.settings.model_list_timeout
+        )
+        started = time.perf_counter()
         models: List[ModelInfo] = []
-        for provider in self._providers.values():
-            models.extend(await provider.get_models())
-        return models
+        error = None
+        try:
+            provider = await self.get_ready(provider_id)
+            models = await asyncio.wait_for(provider.get_models(), timeout)
+            state = "ok"
+        except asyncio.TimeoutError:
+            state = "timeout"
+            error = f"No response within {timeout:g}s."
+        except Exception as exc:
+            state = "error"
+            error = str(exc) or exc.__class__.__name__
+            logger.warning("Listing models for %s failed: %s", provider_id, exc)
+        status = ProviderModelsStatus(
+            provider=provider_id,
+            status=state,
+            error=error,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            model_count=len(models),
+        )
+        return models, status
+
+    def invalidate_models(self, provider_id: str | None = None) -> List[str]:
+        providers = [self.get(provider_id)] if provider_id else self._initialized()
+        for provider in providers:
+            provider.invalidate_models()
+        return [provider.id for provider in providers]
 
     async def load_model(
         self,
@@ -45,7 +202,7 @@ class ProviderRegistry:
         quantization: str | None = None,
         **parameters: object,
     ) -> ModelInfo:
-        provider = self.get(provider_id)
+        provider = await self.get_ready(provider_id)
         return await provider.load_model(
             model_id,
             revision=revision,
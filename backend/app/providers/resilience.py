@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES: FrozenSet[int] = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class RetryableResponseError(Exception):
+    """Raised for an upstream response whose status code is worth retrying."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        super().__init__(f"Upstream returned HTTP {response.status_code}")
+        self.response = response
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds encoded in a ``Retry-After`` header."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    max_retry_after: float = 30.0
+    status_codes: FrozenSet[int] = RETRYABLE_STATUS_CODES
+
+    def delay_for(
+        self, attempt: int, retry_after: Optional[float] = None
+    ) -> Optional[float]:
+        """Return how long to wait before retry ``attempt`` or ``None`` to give up."""
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            # Waiting longer than the caller would tolerate is worse than failing.
+            return retry_after if retry_after <= self.max_retry_after else None
+        # Full jitter keeps concurrent retries from synchronising.
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+@dataclass
+class ResilienceStats:
+    counters: Dict[str, int] = field(
+        default_factory=lambda: {
+            "attempts": 0,
+            "retries": 0,
+            "exhausted": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+    )
+
+    def incr(self, name: str) -> None:
+        self.counters[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+
+async def call_with_retries(
+    send: Callable[[], Awaitable[httpx.Response]],
+    policy: RetryPolicy,
+    stats: ResilienceStats,
+) -> httpx.Response:
+    """Run ``send`` until it succeeds or the retry budget is spent.
+
+    ``send`` raises :class:`RetryableResponseError` for retryable statuses; once
+    retries are exhausted the final response is surfaced via ``raise_for_status``.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await send()
+        except (RetryableResponseError, httpx.TransportError) as exc:
+            response = getattr(exc, "response", None)
+            retry_after = (
+                parse_retry_after(response.headers.get("Retry-After"))
+                if isinstance(exc, RetryableResponseError)
+                else None
+            )
+            delay = policy.delay_for(attempt, retry_after)
+            if delay is None:
+                stats.incr("exhausted")
+                if isinstance(exc, RetryableResponseError):
+                    exc.response.raise_for_status()
+                raise
+            attempt += 1
+            stats.incr("retries")
+            await asyncio.sleep(delay)
+
+
+async def call_hedged(
+    send: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    stats: ResilienceStats,
+) -> T:
+    """Run ``send`` and, if it is slower than ``hedge_after``, race a duplicate.
+
+    The first attempt to succeed wins and the loser is cancelled. If every
+    attempt fails, the primary attempt's error is raised.
+    """
+    if hedge_after is None:
+        return await send()
+    primary = asyncio.ensure_future(send())
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        stats.incr("hedges")
+        hedge = asyncio.ensure_future(send())
+        pending.add(hedge)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats.incr("hedge_wins")
+                    return task.result()
+        raise primary.exception()  # type: ignore[misc]
+    finally:
+        for task in pending:
+            task.cancel()
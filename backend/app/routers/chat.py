@@ -1,37 +1,132 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.responses import StreamingResponse
 
-from ..core.dependencies import get_chat_service
-from ..models.schemas import ChatCompletionRequest, ChatCompletionResponse
+from ..core.dependencies import get_batch_runner, get_chat_service
+from ..models.schemas import (
+    ChatCompareRequest,
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+)
+from ..services.admission import AdmissionRejectedError
+from ..services.batch import BatchRunner
 from ..services.chat import ChatService
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 
+class _DuplexStreamingResponse(StreamingResponse):
+    """Streaming response that leaves ``receive`` to a still-streaming request body.
+
+    ``StreamingResponse`` watches for disconnects by draining ``receive``, which
+    would swallow body chunks the endpoint has not read yet. Disconnects still
+    surface through the body reader and failed sends.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
 @router.post(
     "/completions",
     response_model=ChatCompletionResponse,
 )
 async def create_completion(
     payload: ChatCompletionRequest,
+    request: Request,
     service: ChatService = Depends(get_chat_service),
 ):
-    result = await service.complete(payload)
+    try:
+        result = await _cancel_on_disconnect(request, service.complete(payload))
+    except AdmissionRejectedError as exc:
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
     if isinstance(result, ChatCompletionResponse):
         return result
+    return _sse_response(result)
+
+
+@router.post("/compare")
+async def compare_completions(
+    payload: ChatCompareRequest,
+    service: ChatService = Depends(get_chat_service),
+):
+    return _sse_response(service.compare(payload))
+
+
+@router.post("/batch")
+async def batch_completions(
+    request: Request,
+    concurrency: Optional[int] = Query(default=None, ge=1, le=256),
+    batch_id: Optional[str] = None,
+    runner: BatchRunner = Depends(get_batch_runner),
+):
+    """Run a JSONL body of completion requests and stream JSONL results back.
+
+    Re-posting the same body with the same ``batch_id`` skips inputs that
+    already succeeded, resuming an interrupted batch.
+    """
+    try:
+        results = runner.run(
+            request.stream(), concurrency=concurrency, batch_id=batch_id
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return _DuplexStreamingResponse(results, media_type="application/x-ndjson")
+
+
+@router.get("/stats")
+async def chat_stats(
+    service: ChatService = Depends(get_chat_service),
+) -> Dict[str, Any]:
+    return service.stats()
+
+
+async def _cancel_on_disconnect(request: Request, work: Awaitable[Any]) -> Any:
+    """Await ``work``, cancelling it if the client disconnects first.
+
+    The request body has already been read, so the next ASGI message is the
+    disconnect; generations nobody will receive stop instead of running on.
+    """
+    task = asyncio.ensure_future(work)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        disconnected.cancel()
+    if not task.done():
+        task.cancel()
+        raise HTTPException(status_code=499, detail="Client closed the request.")
+    return task.result()
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
 
-    stream = result
+def _sse_response(stream: AsyncIterator) -> StreamingResponse:
     response_holder: dict[str, StreamingResponse | None] = {"response": None}
 
     async def event_source(iterator: AsyncIterator):
         try:
             async for chunk in iterator:
-                yield f"data: {chunk.json()}\n\n"
+                # Relayed streams already arrive as encoded SSE frames.
+                if isinstance(chunk, bytes):
+                    yield chunk
+                else:
+                    yield f"data: {chunk.json()}\n\n"
         except Exception as exc:  # pragma: no cover - defensive error surfacing
             streaming_response = response_holder["response"]
             if streaming_response is not None:
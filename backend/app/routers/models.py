@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from ..core.dependencies import get_provider_registry
-from ..models.schemas import LoadModelRequest, ModelInfo
+from ..models.schemas import (
+    LoadModelRequest,
+    ModelCacheInvalidation,
+    ModelCatalogResponse,
+    ModelInfo,
+)
 from ..providers.base import ProviderError
 from ..providers.registry import ProviderRegistry
 
@@ -17,6 +22,23 @@ async def list_models(registry: ProviderRegistry = Depends(get_provider_registry
     return await registry.list_models()
 
 
+@router.get("/catalog", response_model=ModelCatalogResponse)
+async def model_catalog(registry: ProviderRegistry = Depends(get_provider_registry)):
+    return await registry.collect_models()
+
+
+@router.delete("/cache", response_model=ModelCacheInvalidation)
+async def invalidate_model_cache(
+    provider: Optional[str] = None,
+    registry: ProviderRegistry = Depends(get_provider_registry),
+) -> ModelCacheInvalidation:
+    try:
+        invalidated = registry.invalidate_models(provider)
+    except ProviderError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return ModelCacheInvalidation(providers=invalidated)
+
+
 @router.post("/load", response_model=ModelInfo, status_code=status.HTTP_202_ACCEPTED)
 async def load_model(
     payload: LoadModelRequest,
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..core.config import Settings
+
+PRIORITIES: Dict[str, int] = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a request cannot be admitted; carries a retry hint."""
+
+    def __init__(self, message: str, *, retry_after: int, status_code: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class PriorityLimiter:
+    """Concurrency limiter with a bounded wait queue ordered by priority.
+
+    Freed slots are handed straight to the highest-priority waiter (FIFO within
+    a class), so batch traffic never jumps ahead of queued interactive calls.
+    """
+
+    def __init__(self, name: str, limit: int, *, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._in_use = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._hold_ewma: Optional[float] = None
+        self._counters: Dict[str, Any] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        acquired = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_hold(time.monotonic() - acquired)
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self._counters["admitted"]
+        return {
+            **self._counters,
+            "limit": self.limit,
+            "in_use": self._in_use,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "avg_wait_ms": (
+                round(self._counters["total_wait_ms"] / admitted, 2)
+                if admitted
+                else 0.0
+            ),
+        }
+
+    async def _acquire(self, priority: int) -> None:
+        if self._in_use < self.limit and not self._waiters:
+            self._in_use += 1
+            self._counters["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise AdmissionRejectedError(
+                f"{self.name} is at capacity; try again later.",
+                retry_after=self._retry_after(),
+                status_code=429,
+            )
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._sequence), loop.create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._counters["queued"] += 1
+        expiry = loop.call_later(self.timeout, self._expire, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as we were cancelled.
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            expiry.cancel()
+        waited_ms = (time.monotonic() - waiter.enqueued_at) * 1000
+        self._counters["admitted"] += 1
+        self._counters["total_wait_ms"] += waited_ms
+        self._counters["max_wait_ms"] = max(self._counters["max_wait_ms"], waited_ms)
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self._in_use -= 1
+
+    def _expire(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            return
+        self._discard(waiter)
+        self._counters["timed_out"] += 1
+        waiter.future.set_exception(
+            AdmissionRejectedError(
+                f"Timed out after {self.timeout:g}s waiting for {self.name}.",
+                retry_after=self._retry_after(),
+                status_code=503,
+            )
+        )
+
+    def _discard(self, waiter: _Waiter) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+    def _record_hold(self, seconds: float) -> None:
+        previous = self._hold_ewma
+        self._hold_ewma = (
+            seconds if previous is None else 0.8 * previous + 0.2 * seconds
+        )
+
+    def _retry_after(self) -> int:
+        hold = self._hold_ewma or 1.0
+        return max(1, math.ceil(hold * (len(self._waiters) + 1) / self.limit))
+
+
+class AdmissionController:
+    """Applies per-provider and per-model concurrency limits to completions."""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._limiters: Dict[str, PriorityLimiter] = {}
+
+    @asynccontextmanager
+    async def admit(
+        self, provider_id: str, model_id: str, priority: str = "interactive"
+    ) -> AsyncIterator[None]:
+        rank = PRIORITIES.get(priority, PRIORITIES["interactive"])
+        async with AsyncExitStack() as stack:
+            # Model slots first: waiting on a model must not pin a provider slot.
+            for limiter in self._limiters_for(provider_id, model_id):
+                await stack.enter_async_context(limiter.slot(rank))
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
+
+    def _limiters_for(self, provider_id: str, model_id: str) -> List[PriorityLimiter]:
+        limiters = []
+        model_key = f"{provider_id}:{model_id}"
+        for key, limit in (
+            (model_key, self.settings.model_concurrency.get(model_key)),
+            (provider_id, self.settings.provider_concurrency.get(provider_id)),
+        ):
+            if not limit:
+                continue
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = PriorityLimiter(
+                    key,
+                    limit,
+                    max_queue=self.settings.admission_queue_size,
+                    timeout=self.settings.admission_queue_timeout,
+                )
+                self._limiters[key] = limiter
+            limiters.append(limiter)
+        return limiters
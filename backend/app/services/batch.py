@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Set, TextIO, Tuple
+
+from ..core.config import Settings
+from ..models.schemas import ChatCompletionRequest
+from .chat import ChatService
+
+_BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class BatchRunner:
+    """Streams a JSONL batch of completion requests through :class:`ChatService`.
+
+    Input lines are read only when a provider slot frees up and results are
+    pushed through a bounded queue, so memory stays flat regardless of batch
+    size. Results are emitted as JSONL in completion order, tagged with the
+    zero-based index of their input line.
+    """
+
+    def __init__(self, service: ChatService, settings: Settings) -> None:
+        self.service = service
+        self.settings = settings
+
+    def journal_path(self, batch_id: str) -> Path:
+        if not _BATCH_ID_PATTERN.match(batch_id):
+            raise ValueError(
+                "batch_id may only contain letters, digits, '-' and '_' (max 64)."
+            )
+        return Path(self.settings.batch_journal_path).resolve() / f"{batch_id}.jsonl"
+
+    def run(
+        self,
+        body: AsyncIterator[bytes],
+        *,
+        concurrency: Optional[int] = None,
+        batch_id: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        limit = concurrency or self.settings.batch_concurrency_per_provider
+        journal = self.journal_path(batch_id) if batch_id else None
+
+        async def generator():
+            results: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=limit * 2)
+            completed = _completed_indices(journal) if journal else set()
+            handle = _open_journal(journal) if journal else None
+            producer = asyncio.create_task(
+                self._produce(body, limit, completed, results, handle)
+            )
+            try:
+                while True:
+                    line = await results.get()
+                    if line is None:
+                        break
+                    yield line
+                await producer
+            finally:
+                producer.cancel()
+                if handle is not None:
+                    handle.close()
+
+        return generator()
+
+    async def _produce(
+        self,
+        body: AsyncIterator[bytes],
+        limit: int,
+        completed: Set[int],
+        results: asyncio.Queue[Optional[bytes]],
+        journal: Optional[TextIO],
+    ) -> None:
+        slots: Dict[str, asyncio.Semaphore] = {}
+        tasks: Set[asyncio.Task] = set()
+        try:
+            async for index, raw in _iter_lines(body):
+                if index in completed:
+                    continue
+                try:
+                    request = ChatCompletionRequest.parse_raw(raw)
+                except ValueError as exc:
+                    await self._emit(
+                        results, journal, {"index": index, "error": str(exc)}
+                    )
+                    continue
+                request.stream = False
+                request.priority = "batch"
+                provider_id = request.provider or self.settings.default_provider
+                slot = slots.setdefault(provider_id, asyncio.Semaphore(limit))
+                # Waiting here stops us reading further input until a slot frees.
+                await slot.acquire()
+                task = asyncio.create_task(
+                    self._run_item(index, request, slot, results, journal)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        except Exception as exc:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._emit(results, None, {"error": f"Batch aborted: {exc}"})
+        await results.put(None)
+
+    async def _run_item(
+        self,
+        index: int,
+        request: ChatCompletionRequest,
+        slot: asyncio.Semaphore,
+        results: asyncio.Queue[Optional[bytes]],
+        journal: Optional[TextIO],
+    ) -> None:
+        try:
+            try:
+                response = await self.service.complete(request)
+            except Exception as exc:
+                record = {"index": index, "error": str(exc) or exc.__class__.__name__}
+            else:
+                # Splice the already-encoded response instead of re-serialising it.
+                record = f'{{"index": {index}, "response": {response.json()}}}'
+            # Keep the slot until the result is queued, so a slow reader stops
+            # new work instead of piling up finished responses.
+            await self._emit(results, journal, record)
+        finally:
+            slot.release()
+
+    async def _emit(
+        self,
+        results: asyncio.Queue[Optional[bytes]],
+        journal: Optional[TextIO],
+        record: Dict[str, object] | str,
+    ) -> None:
+        line = record if isinstance(record, str) else json.dumps(record)
+        if journal is not None:
+            journal.write(line + "\n")
+            journal.flush()
+        await results.put((line + "\n").encode("utf-8"))
+
+
+async def _iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Split a byte stream into non-blank lines numbered from zero."""
+    buffer = b""
+    index = 0
+    async for block in body:
+        buffer += block
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if buffer.strip():
+        yield index, buffer
+
+
+def _completed_indices(journal: Path) -> Set[int]:
+    """Return indices that already finished successfully in a previous run."""
+    completed: Set[int] = set()
+    if not journal.exists():
+        return completed
+    with journal.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "response" in record and isinstance(record.get("index"), int):
+                completed.add(record["index"])
+    return completed
+
+
+def _open_journal(journal: Path) -> TextIO:
+    journal.parent.mkdir(parents=True, exist_ok=True)
+    return journal.open("a", encoding="utf-8")
@@ -1,47 +1,287 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import time
+from contextlib import AsyncExitStack
 from io import StringIO
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from ..hooks.base import TokenEvent
 from ..hooks.manager import HookManager
 from ..models.schemas import (
+    ChatCompareRequest,
+    ChatCompletionChoice,
     ChatCompletionChunk,
     ChatCompletionRequest,
     ChatCompletionResponse,
+    ChatMessage,
+    CompareEvent,
+    CompareTarget,
+    CompareTargetStats,
+    Role,
+    StreamDelta,
 )
+from ..providers.base import LLMProvider
 from ..providers.registry import ProviderRegistry
+from .admission import AdmissionController
+from .response_cache import ResponseCache, replay_stream, request_cache_key
+from .singleflight import SingleFlight
 
 
 class ChatService:
     """Coordinates provider calls with interpretability hooks."""
 
-    def __init__(self, registry: ProviderRegistry, hooks: HookManager) -> None:
+    def __init__(
+        self,
+        registry: ProviderRegistry,
+        hooks: HookManager,
+        *,
+        response_cache: Optional[ResponseCache] = None,
+    ) -> None:
         self.registry = registry
         self.hooks = hooks
+        self.response_cache = response_cache
+        self.admission = AdmissionController(registry.settings)
+        self._in_flight: SingleFlight[ChatCompletionResponse] = SingleFlight()
 
     async def complete(
-        self, request: ChatCompletionRequest
-    ) -> ChatCompletionResponse | AsyncIterator[ChatCompletionChunk]:
+        self, request: ChatCompletionRequest, *, allow_relay: bool = True
+    ) -> (
+        ChatCompletionResponse
+        | AsyncIterator[ChatCompletionChunk]
+        | AsyncIterator[bytes]
+    ):
         provider_id = request.provider or self.registry.settings.default_provider
-        provider = self.registry.get(provider_id)
+        provider = await self.registry.get_ready(provider_id)
         model_id = request.model or "default"
 
         context = await self.hooks.dispatch_pre(request, provider_id, model_id)
 
+        cache_key = None
+        if self._cacheable(request):
+            cache_key = request_cache_key(request, provider_id, model_id)
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                if request.stream:
+                    return self._stream_with_hooks(replay_stream(cached), context)
+                response = cached.copy(update={"meta": {**cached.meta, "cache": "hit"}})
+                await self.hooks.dispatch_post(context, response.dict())
+                return response
+
         if request.stream:
-            return self._stream_with_hooks(provider.stream(request), context)
+            # Hold the admission slot for as long as the stream is consumed.
+            slot = AsyncExitStack()
+            await slot.enter_async_context(
+                self.admission.admit(provider.id, model_id, request.priority)
+            )
+            if (
+                allow_relay
+                and cache_key is None
+                and provider.supports_relay
+                and not self.hooks.observes_stream()
+            ):
+                # No hook inspects the deltas, so pass upstream frames through.
+                return _AdmittedStream(provider.relay(request), slot)
+            stream = provider.stream(request)
+            if cache_key is not None:
+                stream = self._record_stream(stream, cache_key)
+            return _AdmittedStream(self._stream_with_hooks(stream, context), slot)
 
-        response = await provider.generate(request)
+        if self.registry.settings.coalesce_requests and request.cache is not False:
+            # Identical requests already running share one provider call.
+            response = await self._in_flight.run(
+                _coalesce_key(
+                    request,
+                    cache_key or request_cache_key(request, provider_id, model_id),
+                ),
+                lambda: self._generate(provider, request, model_id, cache_key),
+            )
+        else:
+            response = await self._generate(provider, request, model_id, cache_key)
         await self.hooks.dispatch_post(context, response.dict())
         return response
 
+    async def _generate(
+        self,
+        provider: LLMProvider,
+        request: ChatCompletionRequest,
+        model_id: str,
+        cache_key: Optional[str],
+    ) -> ChatCompletionResponse:
+        async with self.admission.admit(provider.id, model_id, request.priority):
+            response = await provider.generate(request)
+        finish_reason = response.choices[0].finish_reason if response.choices else None
+        # A deadline cut the answer short; a retry may well complete it.
+        if cache_key is not None and finish_reason != "timeout":
+            await self.response_cache.put(cache_key, response)
+        return response
+
+    async def aclose(self) -> None:
+        if self.response_cache is not None:
+            self.response_cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "response_cache": (
+                self.response_cache.stats() if self.response_cache is not None else None
+            ),
+            "coalescing": self._in_flight.stats(),
+            "admission": self.admission.stats(),
+        }
+
+    def compare(self, request: ChatCompareRequest) -> AsyncIterator[CompareEvent]:
+        """Run ``request`` against every target concurrently on one event stream."""
+
+        async def generator():
+            started = time.perf_counter()
+            events: asyncio.Queue[CompareEvent] = asyncio.Queue(maxsize=64)
+            tasks = [
+                asyncio.create_task(
+                    self._compare_target(index, target, request, events)
+                )
+                for index, target in enumerate(request.targets)
+            ]
+            summary: List[Optional[CompareTargetStats]] = [None] * len(tasks)
+            remaining = len(tasks)
+            try:
+                while remaining:
+                    event = await events.get()
+                    if event.type == "done":
+                        summary[event.target] = event.stats
+                        remaining -= 1
+                    yield event
+                yield CompareEvent(
+                    type="summary",
+                    summary=[stats for stats in summary if stats is not None],
+                    wall_ms=_elapsed_ms(started),
+                )
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return generator()
+
+    async def _compare_target(
+        self,
+        index: int,
+        target: CompareTarget,
+        request: ChatCompareRequest,
+        events: asyncio.Queue[CompareEvent],
+    ) -> None:
+        stats = CompareTargetStats(
+            target=index, provider=target.provider, model=target.model
+        )
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        decode_started = started
+        try:
+            provider = await self.registry.get_ready(target.provider)
+            fields = request.dict(exclude={"targets"})
+            fields.update(
+                provider=target.provider,
+                model=target.model,
+                stream=provider.supports_streaming,
+            )
+            result = await self.complete(
+                ChatCompletionRequest(**fields), allow_relay=False
+            )
+            if isinstance(result, ChatCompletionResponse):
+                first_token = time.perf_counter()
+                choice = result.choices[0] if result.choices else None
+                stats.completion_tokens = result.usage.completion_tokens
+                await events.put(
+                    CompareEvent(
+                        type="chunk",
+                        target=index,
+                        chunk=ChatCompletionChunk(
+                            id=result.id,
+                            model=result.model,
+                            index=0,
+                            delta=StreamDelta(
+                                content=choice.message.content if choice else "",
+                                role=Role.ASSISTANT,
+                                finish_reason=choice.finish_reason if choice else None,
+                            ),
+                            provider=result.provider,
+                            meta=result.meta,
+                        ),
+                    )
+                )
+            else:
+                async for chunk in result:
+                    if chunk.delta.content:
+                        if first_token is None:
+                            first_token = decode_started = time.perf_counter()
+                        stats.completion_tokens += 1
+                    usage = chunk.meta.get("usage")
+                    if usage and usage.get("completion_tokens"):
+                        # Providers that report usage replace the chunk count.
+                        stats.completion_tokens = usage["completion_tokens"]
+                    await events.put(
+                        CompareEvent(type="chunk", target=index, chunk=chunk)
+                    )
+        except Exception as exc:
+            stats.status = "error"
+            stats.error = str(exc) or exc.__class__.__name__
+        finished = time.perf_counter()
+        stats.latency_ms = _elapsed_ms(started, finished)
+        if first_token is not None:
+            stats.first_token_ms = _elapsed_ms(started, first_token)
+        if stats.completion_tokens and finished > decode_started:
+            stats.tokens_per_second = round(
+                stats.completion_tokens / (finished - decode_started), 2
+            )
+        await events.put(CompareEvent(type="done", target=index, stats=stats))
+
     async def list_models(self):
         return await self.registry.list_models()
 
     async def load_model(self, **kwargs):
         return await self.registry.load_model(**kwargs)
 
+    def _cacheable(self, request: ChatCompletionRequest) -> bool:
+        if self.response_cache is None or request.cache is False:
+            return False
+        return request.cache is True or request.temperature == 0
+
+    def _record_stream(
+        self, stream: AsyncIterator[ChatCompletionChunk], cache_key: str
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """Pass chunks through and cache the assembled completion once it ends."""
+
+        async def generator():
+            assembled = StringIO()
+            last: Optional[ChatCompletionChunk] = None
+            finish_reason = None
+            async for chunk in stream:
+                if chunk.delta.content:
+                    assembled.write(chunk.delta.content)
+                finish_reason = chunk.delta.finish_reason or finish_reason
+                last = chunk
+                yield chunk
+            if last is None or finish_reason == "timeout":
+                return
+            await self.response_cache.put(
+                cache_key,
+                ChatCompletionResponse(
+                    id=last.id,
+                    model=last.model,
+                    provider=last.provider,
+                    choices=[
+                        ChatCompletionChoice(
+                            index=0,
+                            message=ChatMessage(
+                                role=Role.ASSISTANT, content=assembled.getvalue()
+                            ),
+                            finish_reason=finish_reason,
+                        )
+                    ],
+                ),
+            )
+
+        return generator()
+
     def _stream_with_hooks(
         self, stream: AsyncIterator[ChatCompletionChunk], context
     ) -> AsyncIterator[ChatCompletionChunk]:
@@ -71,3 +311,59 @@ class ChatService:
             )
 
         return generator()
+
+
+class _AdmittedStream:
+    """Async iterator that holds an admission slot for the life of a stream.
+
+    The slot is released when the stream ends, fails or is closed, and also
+    when the iterator is dropped without ever being consumed (for example if
+    the client goes away before the response starts).
+    """
+
+    def __init__(self, stream: AsyncIterator[Any], slot: AsyncExitStack) -> None:
+        self._stream = stream
+        self._slot: Optional[AsyncExitStack] = slot
+        self._loop = asyncio.get_running_loop()
+
+    def __aiter__(self) -> "_AdmittedStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        slot, self._slot = self._slot, None
+        if slot is None:
+            return
+        try:
+            aclose = getattr(self._stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            await slot.aclose()
+
+    def __del__(self) -> None:
+        slot, self._slot = self._slot, None
+        if slot is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(
+                lambda: self._loop.create_task(slot.aclose())
+            )
+
+
+def _elapsed_ms(started: float, finished: float | None = None) -> float:
+    return round(((finished or time.perf_counter()) - started) * 1000, 2)
+
+
+def _coalesce_key(request: ChatCompletionRequest, key: str) -> str:
+    """Scope an in-flight key to the caller's API key, if one was given.
+
+    Requests with different credentials never share an upstream call.
+    """
+    if not request.api_key:
+        return key
+    return hashlib.sha256(f"{key}:{request.api_key}".encode("utf-8")).hexdigest()
@@ -8,8 +8,6 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Deque, Dict, List, Optional
 
-from huggingface_hub import snapshot_download
-
 from ..core.config import Settings
 from ..models.schemas import DownloadStatus, ModelDownloadJob, ModelDownloadRequest
 from ..providers.registry import ProviderRegistry
@@ -157,7 +155,7 @@ class HuggingFaceDownloadManager:
             token = job.request.token or self.settings.huggingface_token
 
             await asyncio.to_thread(
-                snapshot_download,
+                _snapshot_download,
                 repo_id=job.request.model_id,
                 revision=job.request.revision,
                 local_dir=str(local_dir),
@@ -211,3 +209,10 @@ class HuggingFaceDownloadManager:
         if not job:
             return
         job.update_progress(downloaded, total)
+
+
+def _snapshot_download(**kwargs: Any) -> str:
+    # Imported on first download: huggingface_hub is slow to import.
+    from huggingface_hub import snapshot_download
+
+    return snapshot_download(**kwargs)
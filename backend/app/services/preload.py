@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from ..core.config import Settings
+from ..models.schemas import ChatCompletionRequest, ChatMessage, Role
+from ..providers.registry import ProviderRegistry
+
+logger = logging.getLogger(__name__)
+
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".gguf")
+
+
+@dataclass
+class PreloadState:
+    model_id: str
+    status: str = "pending"
+    estimated_bytes: Optional[int] = None
+    load_seconds: Optional[float] = None
+    warmup_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "estimated_bytes": self.estimated_bytes,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+class ModelPreloader:
+    """Loads and warms up ``Settings.preload_models`` when the app starts.
+
+    Up to ``preload_concurrency`` models load at once, and the on-disk size of
+    the models in flight is kept within ``preload_memory_bytes``. Each loaded
+    model runs a short greedy generation so first-call setup happens before
+    real traffic. The preloader is ready once every model has been attempted;
+    failures are recorded rather than blocking readiness.
+    """
+
+    def __init__(self, settings: Settings, registry: ProviderRegistry) -> None:
+        self.settings = settings
+        self.registry = registry
+        self.states: Dict[str, PreloadState] = {
+            model_id: PreloadState(model_id) for model_id in settings.preload_models
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return not self.states or self._finished_at is not None
+
+    def start(self) -> None:
+        if self.states and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        self._started_at = time.perf_counter()
+        budget = _ByteBudget(self.settings.preload_memory_bytes)
+        slots = asyncio.Semaphore(self.settings.preload_concurrency)
+        try:
+            await asyncio.gather(
+                *(self._preload(state, slots, budget) for state in self.states.values())
+            )
+        finally:
+            self._finished_at = time.perf_counter()
+        logger.info(
+            "Preloaded %d model(s) in %.1fs",
+            sum(state.status == "ready" for state in self.states.values()),
+            self._finished_at - self._started_at,
+        )
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        end = self._finished_at or time.perf_counter()
+        return {
+            "ready": self.ready,
+            "elapsed_seconds": (
+                round(end - self._started_at, 3) if self._started_at else None
+            ),
+            "models": {
+                model_id: state.snapshot() for model_id, state in self.states.items()
+            },
+        }
+
+    async def _preload(
+        self, state: PreloadState, slots: asyncio.Semaphore, budget: "_ByteBudget"
+    ) -> None:
+        state.estimated_bytes = await asyncio.to_thread(
+            estimate_model_bytes, state.model_id, self._search_paths()
+        )
+        async with slots:
+            async with budget.reserve(state.estimated_bytes):
+                try:
+                    provider = await self.registry.get_ready("huggingface")
+                    state.status = "loading"
+                    started = time.perf_counter()
+                    await provider.load_model(state.model_id)
+                    state.load_seconds = round(time.perf_counter() - started, 3)
+                    if self.settings.preload_warmup_tokens:
+                        state.status = "warming"
+                        started = time.perf_counter()
+                        await provider.generate(self._warmup_request(state.model_id))
+                        state.warmup_seconds = round(time.perf_counter() - started, 3)
+                except Exception as exc:  # noqa: BLE001 - recorded per model
+                    state.status = "failed"
+                    state.error = str(exc) or exc.__class__.__name__
+                    logger.warning("Preloading %s failed: %s", state.model_id, exc)
+                    return
+        state.status = "ready"
+
+    def _warmup_request(self, model_id: str) -> ChatCompletionRequest:
+        return ChatCompletionRequest(
+            provider="huggingface",
+            model=model_id,
+            messages=[ChatMessage(role=Role.USER, content="Hello")],
+            max_tokens=self.settings.preload_warmup_tokens,
+            temperature=0,
+            cache=False,
+        )
+
+    def _search_paths(self) -> List[Path]:
+        hub_cache = os.environ.get("HF_HUB_CACHE") or os.path.join(
+            os.environ.get("HF_HOME", os.path.expanduser("~/.cache/huggingface")), "hub"
+        )
+        return [
+            Path(self.settings.local_models_path),
+            Path(self.settings.huggingface_download_path),
+            Path(hub_cache),
+        ]
+
+
+def estimate_model_bytes(model_id: str, search_paths: Iterable[Path]) -> Optional[int]:
+    """Size of a model's weight files found locally, or ``None`` if not found."""
+    hub_name = "models--" + model_id.replace("/", "--")
+    for root in search_paths:
+        for candidate in (root / model_id, root / hub_name / "snapshots"):
+            if not candidate.is_dir():
+                continue
+            total = sum(
+                path.stat().st_size
+                for path in candidate.rglob("*")
+                if path.suffix in _WEIGHT_SUFFIXES and path.is_file()
+            )
+            if total:
+                return total
+    return None
+
+
+class _ByteBudget:
+    """Admits reservations while their total stays within ``max_bytes``.
+
+    A reservation of unknown size takes the whole budget; one larger than the
+    budget is admitted once nothing else is in flight.
+    """
+
+    def __init__(self, max_bytes: Optional[int]) -> None:
+        self.max_bytes = max_bytes
+        self._used = 0
+        self._holders = 0
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: Optional[int]) -> AsyncIterator[None]:
+        if self.max_bytes is None:
+            yield
+            return
+        nbytes = self.max_bytes if nbytes is None else nbytes
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: not self._holders or self._used + nbytes <= self.max_bytes
+            )
+            self._used += nbytes
+            self._holders += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._used -= nbytes
+                self._holders -= 1
+                self._changed.notify_all()
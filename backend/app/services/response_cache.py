@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ..models.schemas import (
+    ChatCompletionChunk,
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+    Role,
+    StreamDelta,
+)
+
+
+def request_cache_key(
+    request: ChatCompletionRequest, provider_id: str, model_id: str
+) -> str:
+    """Return a canonical hash of everything that determines a completion.
+
+    Credentials, hook selection and free-form metadata are deliberately left
+    out so equivalent requests from different callers share an entry.
+    """
+    canonical = {
+        "provider": provider_id,
+        "model": model_id,
+        "messages": [
+            [message.role.value, message.content] for message in request.messages
+        ],
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+        "top_p": request.top_p,
+        "presence_penalty": request.presence_penalty,
+        "frequency_penalty": request.frequency_penalty,
+        "stop": request.stop or [],
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def replay_stream(
+    response: ChatCompletionResponse,
+) -> AsyncIterator[ChatCompletionChunk]:
+    """Replay a cached completion as the chunks a live stream would emit."""
+
+    async def generator():
+        for choice in response.choices:
+            for delta in (
+                StreamDelta(role=Role.ASSISTANT, content=choice.message.content),
+                StreamDelta(finish_reason=choice.finish_reason or "stop"),
+            ):
+                yield ChatCompletionChunk(
+                    id=response.id,
+                    model=response.model,
+                    index=choice.index,
+                    delta=delta,
+                    provider=response.provider,
+                    meta={"cache": "hit"},
+                )
+
+    return generator()
+
+
+class _DiskTier:
+    """SQLite-backed store evicting least-recently-read rows past a byte budget."""
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        Path(path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> int:
+        """Store ``value`` and return how many rows were evicted."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return 0
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._bytes += size - (previous[0] if previous else 0)
+            evicted = 0
+            while self._bytes > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (oldest[0],))
+                self._bytes -= oldest[1]
+                evicted += 1
+            self._conn.commit()
+            return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"entries": count, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Two-tier completion cache: an in-memory LRU backed by optional SQLite."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 512,
+        path: Optional[str] = None,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, ChatCompletionResponse] = OrderedDict()
+        self._disk = _DiskTier(path, disk_max_bytes) if path else None
+        self._counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    async def get(self, key: str) -> Optional[ChatCompletionResponse]:
+        response = self._memory.get(key)
+        if response is not None:
+            self._memory.move_to_end(key)
+            self._counters["memory_hits"] += 1
+            return response
+        if self._disk is not None:
+            raw = await asyncio.to_thread(self._disk.get, key)
+            if raw is not None:
+                response = ChatCompletionResponse.parse_raw(raw)
+                self._remember(key, response)
+                self._counters["disk_hits"] += 1
+                return response
+        self._counters["misses"] += 1
+        return None
+
+    async def put(self, key: str, response: ChatCompletionResponse) -> None:
+        self._remember(key, response)
+        self._counters["stores"] += 1
+        if self._disk is not None:
+            evicted = await asyncio.to_thread(self._disk.put, key, response.json())
+            self._counters["disk_evictions"] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = (
+            self._counters["memory_hits"]
+            + self._counters["disk_hits"]
+            + self._counters["misses"]
+        )
+        hits = lookups - self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk": self._disk.stats() if self._disk is not None else None,
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+    def _remember(self, key: str, response: ChatCompletionResponse) -> None:
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
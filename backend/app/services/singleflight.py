@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls sharing a key into a single execution.
+
+    Every waiter awaits the same shielded task, so one caller disconnecting
+    does not cancel the work for the rest. The task is cancelled only once
+    its last waiter is gone.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+        self._counters: Dict[str, int] = {
+            "executions": 0,
+            "coalesced": 0,
+            "abandoned": 0,
+        }
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._counters["executions"] += 1
+        else:
+            self._counters["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+                self._counters["abandoned"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "in_flight": len(self._flights),
+            "waiters": sum(flight.waiters for flight in self._flights.values()),
+        }
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
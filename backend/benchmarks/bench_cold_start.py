@@ -0,0 +1,82 @@
+"""Cold-start time and memory of the API process, with a regression guard.
+
+Each run starts a fresh interpreter, imports ``app.main`` and then uses the
+default provider once, recording wall time, peak RSS and whether any heavy
+library (torch, transformers, huggingface_hub) was imported. The script exits
+non-zero when a heavy library is loaded or a limit is exceeded, so it can run
+in CI.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_cold_start --runs 5 --max-seconds 2 --max-rss-mb 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub")
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.core.config import get_settings
+from app.core.dependencies import get_provider_registry
+get_provider_registry().get(get_settings().default_provider)
+ready = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "ready_seconds": ready - started,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (
+    HEAVY_MODULES,
+)
+
+
+def probe() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    ready = statistics.median(result["ready_seconds"] for result in results)
+    imported = statistics.median(result["import_seconds"] for result in results)
+    rss = max(result["rss_mb"] for result in results)
+    heavy = sorted({name for result in results for name in result["heavy_modules"]})
+
+    print(f"import app.main       : {imported * 1000:8.1f} ms (median)")
+    print(f"first provider ready  : {ready * 1000:8.1f} ms (median)")
+    print(f"peak RSS              : {rss:8.1f} MiB")
+    print(f"heavy modules loaded  : {', '.join(heavy) or 'none'}")
+
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if args.max_seconds is not None and ready > args.max_seconds:
+        failures.append(f"startup took {ready:.2f}s > {args.max_seconds}s")
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        failures.append(f"RSS {rss:.0f} MiB > {args.max_rss_mb} MiB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
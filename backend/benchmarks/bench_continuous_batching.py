@@ -0,0 +1,87 @@
+"""Tokens/sec of one-at-a-time generation versus the continuous batching engine.
+
+Submits ``--requests`` concurrent greedy generations whose lengths alternate
+between ``--short`` and ``--long`` new tokens, first serialised through
+``model.generate`` (what the pipeline engine does) and then through
+:class:`ContinuousBatchingEngine`. Requires ``torch`` and ``transformers``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_continuous_batching --model sshleifer/tiny-gpt2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+from app.providers.hf_continuous import ContinuousBatchingEngine
+
+
+def _workload(requests: int, short: int, long: int) -> List[Tuple[str, int]]:
+    return [
+        (f"Request {index}: tell me a story about", long if index % 2 else short)
+        for index in range(requests)
+    ]
+
+
+def _sequential(model, tokenizer, workload: List[Tuple[str, int]]) -> int:
+    tokens = 0
+    for prompt, limit in workload:
+        inputs = tokenizer(prompt, return_tensors="pt")
+        output = model.generate(
+            **inputs,
+            max_new_tokens=limit,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+        tokens += output.shape[1] - inputs["input_ids"].shape[1]
+    return tokens
+
+
+async def _continuous(engine: ContinuousBatchingEngine, workload) -> int:
+    results = await asyncio.gather(
+        *(engine.generate(prompt, max_new_tokens=limit) for prompt, limit in workload)
+    )
+    return sum(result.completion_tokens for result in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--short", type=int, default=8)
+    parser.add_argument("--long", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).eval()
+    workload = _workload(args.requests, args.short, args.long)
+
+    started = time.perf_counter()
+    tokens = _sequential(model, tokenizer, workload)
+    sequential = tokens / (time.perf_counter() - started)
+
+    engine = ContinuousBatchingEngine(
+        model, tokenizer, max_batch_size=args.max_batch_size
+    )
+    started = time.perf_counter()
+    tokens = asyncio.run(_continuous(engine, workload))
+    continuous = tokens / (time.perf_counter() - started)
+    stats = engine.stats()
+    engine.close()
+
+    print(f"requests              : {args.requests} ({args.short}/{args.long} tokens)")
+    print(f"one at a time         : {sequential:8.1f} tokens/s")
+    print(f"continuous batching   : {continuous:8.1f} tokens/s")
+    print(f"speedup               : {continuous / sequential:8.2f}x")
+    print(f"avg rows per step     : {stats['avg_batch_size']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Load time and memory of mapped safetensors versus the ``pipeline`` loader.
+
+``--model`` must be a local directory with ``config.json`` and
+``*.safetensors`` weights. For each loader, ``--processes`` fresh interpreters
+load the model at the same time and report load time, RSS and PSS. Mapped
+weights are backed by shared page-cache pages, so their PSS falls as more
+processes load the same files, while each ``pipeline`` load keeps a private
+copy. Requires ``torch`` and ``transformers``; PSS is Linux only.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_local_load --model ./models/gpt2 --processes 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import json, sys
+from pathlib import Path
+from app.providers.hf_local import LoadMeter, load_mapped_pipeline
+
+loader, model = sys.argv[1], sys.argv[2]
+meter = LoadMeter(loader)
+if loader == "mmap":
+    generator = load_mapped_pipeline(Path(model))
+else:
+    from transformers import pipeline
+    generator = pipeline("text-generation", model=model)
+report = meter.report()
+sys.stdout.write("loaded\\n")
+sys.stdout.flush()
+sys.stdin.readline()
+pss = None
+try:
+    for line in open("/proc/self/smaps_rollup"):
+        if line.startswith("Pss:"):
+            pss = int(line.split()[1]) * 1024
+except OSError:
+    pass
+print(json.dumps({**report, "pss_bytes": pss}))
+"""
+
+
+def run(loader: str, model: str, processes: int) -> list:
+    """Load in ``processes`` interpreters, sampling memory once all have loaded."""
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-c", _PROBE, loader, model],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(processes)
+    ]
+    for proc in procs:
+        if proc.stdout.readline().strip() != "loaded":
+            raise RuntimeError(f"{loader} probe failed to load {model}")
+    results = []
+    for proc in procs:
+        output, _ = proc.communicate("\n")
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--loaders", nargs="+", default=["pipeline", "mmap"])
+    args = parser.parse_args()
+
+    mib = 1024 * 1024
+    print(f"{'loader':<9} {'load s':>8} {'RSS MiB':>9} {'PSS MiB':>9}")
+    for loader in args.loaders:
+        results = run(loader, args.model, args.processes)
+        seconds = statistics.median(result["load_seconds"] for result in results)
+        rss = statistics.mean(result["rss_bytes"] or 0 for result in results) / mib
+        pss = statistics.mean(result["pss_bytes"] or 0 for result in results) / mib
+        print(f"{loader:<9} {seconds:8.2f} {rss:9.1f} {pss:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
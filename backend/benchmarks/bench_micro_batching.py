@@ -0,0 +1,93 @@
+"""Throughput of local generations versus micro-batch size and window.
+
+Without ``--model`` the batch runner is simulated: each decoding step costs a
+fixed ``--step-ms`` plus ``--row-ms`` per sequence, which approximates how a
+batched matmul amortises weight reads on CPU. With ``--model`` a real
+``transformers`` model is loaded and used instead.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_micro_batching --requests 64
+    python -m benchmarks.bench_micro_batching --model sshleifer/tiny-gpt2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.providers.hf_batching import BatchRunner, MicroBatcher, make_batch_runner
+
+
+def _simulated_runner(step_ms: float, row_ms: float) -> BatchRunner:
+    def run(
+        prompts: List[str], limits: List[int], kwargs: Dict[str, Any], controls: list
+    ) -> List[Tuple[str, int]]:
+        steps = max(limits)
+        time.sleep(steps * (step_ms + row_ms * len(prompts)) / 1000)
+        return [("x" * limit, limit) for limit in limits]
+
+    return run
+
+
+def _model_runner(model_id: str) -> BatchRunner:
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForCausalLM.from_pretrained(model_id)
+    return make_batch_runner(model, tokenizer)
+
+
+async def _measure(
+    runner: BatchRunner, *, requests: int, tokens: int, batch_size: int, window: float
+) -> Tuple[float, Dict[str, Any]]:
+    batcher = MicroBatcher(runner, max_batch_size=batch_size, window=window)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            batcher.submit(f"Prompt number {index}:", tokens, {"do_sample": False})
+            for index in range(requests)
+        )
+    )
+    return time.perf_counter() - started, batcher.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--tokens", type=int, default=16)
+    parser.add_argument("--step-ms", type=float, default=4.0)
+    parser.add_argument("--row-ms", type=float, default=0.5)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--windows-ms", default="0,5,20")
+    args = parser.parse_args()
+
+    runner = (
+        _model_runner(args.model)
+        if args.model
+        else _simulated_runner(args.step_ms, args.row_ms)
+    )
+    print(f"{'batch':>5} {'window ms':>9} {'avg batch':>9} {'req/s':>8} {'tok/s':>9}")
+    for batch_size in (int(value) for value in args.batch_sizes.split(",")):
+        for window_ms in (float(value) for value in args.windows_ms.split(",")):
+            elapsed, stats = asyncio.run(
+                _measure(
+                    runner,
+                    requests=args.requests,
+                    tokens=args.tokens,
+                    batch_size=batch_size,
+                    window=window_ms / 1000,
+                )
+            )
+            print(
+                f"{batch_size:>5} {window_ms:>9g} {stats['avg_batch_size']:>9} "
+                f"{args.requests / elapsed:>8.1f} "
+                f"{args.requests * args.tokens / elapsed:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
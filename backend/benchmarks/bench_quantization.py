@@ -0,0 +1,60 @@
+"""Memory footprint and tokens/sec of each local quantization mode.
+
+Loads ``--model`` once per mode (fp32, bf16, fp16 and dynamic int8), applies
+the same quantization the HuggingFace provider does, and greedily generates
+``--tokens`` tokens after a short warm-up. Requires ``torch`` and
+``transformers``; fp16 on CPU is slow or unsupported on many builds.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_quantization --model sshleifer/tiny-gpt2
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from app.providers.hf_quantization import (
+    apply_quantization,
+    load_dtype,
+    measure_throughput,
+)
+
+_PROMPT = "The quick brown fox jumps over the lazy dog."
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--modes", nargs="+", default=["none", "bf16", "fp16", "int8"])
+    args = parser.parse_args()
+
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    baseline = None
+    print(f"{'mode':<6} {'MiB':>9} {'vs fp32':>8} {'tokens/s':>10} {'speedup':>8}")
+    for name in args.modes:
+        mode = None if name == "none" else name
+        model = AutoModelForCausalLM.from_pretrained(
+            args.model, torch_dtype=load_dtype(mode)
+        ).eval()
+        report = apply_quantization(model, mode)
+        try:
+            measure_throughput(model, tokenizer, _PROMPT, max_new_tokens=4)
+            speed = measure_throughput(
+                model, tokenizer, _PROMPT, max_new_tokens=args.tokens
+            )["tokens_per_second"]
+        except RuntimeError as exc:
+            print(f"{name:<6} unsupported on this build: {exc}")
+            continue
+        baseline = baseline or speed
+        print(
+            f"{name:<6} {report['bytes'] / 2**20:9.1f} {report['compression']:7.2f}x"
+            f" {speed:10.1f} {speed / baseline:7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
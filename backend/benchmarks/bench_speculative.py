@@ -0,0 +1,75 @@
+"""Greedy decoding with and without a draft model (speculative decoding).
+
+Generates ``--tokens`` tokens for each prompt with ``model.generate`` and with
+:class:`SpeculativeDecoder`, checks both produce the same tokens, and reports
+the real speedup next to the draft's accept rate. Requires ``torch`` and
+``transformers``; the two models must share a tokenizer.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_speculative --model gpt2-medium --draft distilgpt2
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.providers.hf_speculative import SpeculativeDecoder
+
+_PROMPTS = [
+    "The history of the printing press begins",
+    "def fibonacci(n):\n    ",
+    "Once upon a time, in a small village by the sea,",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--draft", required=True)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--draft-tokens", type=int, default=4)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).eval()
+    draft = AutoModelForCausalLM.from_pretrained(args.draft).eval()
+    decoder = SpeculativeDecoder(model, draft, draft_tokens=args.draft_tokens)
+
+    plain_seconds = speculative_seconds = 0.0
+    for prompt in _PROMPTS:
+        ids = tokenizer(prompt)["input_ids"]
+        started = time.perf_counter()
+        with torch.inference_mode():
+            expected = model.generate(
+                torch.tensor([ids]),
+                max_new_tokens=args.tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id,
+            )[0, len(ids) :].tolist()
+        plain_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = decoder.generate(
+            ids, max_new_tokens=args.tokens, eos_token_id=tokenizer.eos_token_id
+        )
+        speculative_seconds += time.perf_counter() - started
+        status = "same" if result.token_ids == expected else "DIFFERENT"
+        print(
+            f"{status:<9} accept {result.stats['accept_rate']:.2f}"
+            f"  est. speedup {result.stats['estimated_speedup']}x  {prompt[:32]!r}"
+        )
+
+    stats = decoder.stats()
+    print(f"plain greedy          : {plain_seconds:8.2f} s")
+    print(f"speculative           : {speculative_seconds:8.2f} s")
+    print(f"speedup               : {plain_seconds / speculative_seconds:8.2f}x")
+    print(f"accept rate           : {stats['accept_rate']}")
+
+
+if __name__ == "__main__":
+    main()
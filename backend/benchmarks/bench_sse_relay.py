@@ -0,0 +1,74 @@
+"""Per-token CPU cost of the parsed streaming path versus the SSE relay.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_sse_relay --tokens 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from app.core.config import Settings
+from app.providers.openrouter import OpenRouterProvider, _relay_frame
+
+
+def _upstream_frames(count: int) -> list[bytes]:
+    frames = []
+    for index in range(count):
+        payload = {
+            "id": "gen-1729000000-abcdefghijklmnop",
+            "provider": "OpenAI",
+            "model": "openai/gpt-4o-mini",
+            "object": "chat.completion.chunk",
+            "created": 1729000000,
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": f" token{index}"},
+                    "finish_reason": None,
+                    "logprobs": None,
+                }
+            ],
+        }
+        frames.append(json.dumps(payload, separators=(",", ":")).encode())
+    return frames
+
+
+def _parsed(provider: OpenRouterProvider, frames: list[bytes]) -> float:
+    started = time.perf_counter()
+    for data in frames:
+        chunk = provider._parse_stream_chunk(data)
+        f"data: {chunk.json()}\n\n".encode()
+    return time.perf_counter() - started
+
+
+def _relayed(frames: list[bytes]) -> float:
+    started = time.perf_counter()
+    for data in frames:
+        _relay_frame(data)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    provider = OpenRouterProvider(Settings())
+    frames = _upstream_frames(args.tokens)
+    parsed = min(_parsed(provider, frames) for _ in range(args.repeat))
+    relayed = min(_relayed(frames) for _ in range(args.repeat))
+
+    per_token = lambda seconds: seconds / args.tokens * 1e6  # noqa: E731
+    print(f"tokens per run        : {args.tokens}")
+    print(f"parse + re-serialize  : {per_token(parsed):8.2f} us/token")
+    print(f"relay                 : {per_token(relayed):8.2f} us/token")
+    print(f"speedup               : {parsed / relayed:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
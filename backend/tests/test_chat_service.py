@@ -0,0 +1,331 @@
+import asyncio
+import gc
+import json
+import time
+
+import pytest
+from app.core.config import Settings
+from app.hooks.manager import HookManager
+from app.models.schemas import (
+    ChatCompareRequest,
+    ChatCompletionChoice,
+    ChatCompletionChunk,
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+    ChatMessage,
+    CompareTarget,
+    Role,
+    StreamDelta,
+    UsageStats,
+)
+from app.providers.base import LLMProvider
+from app.providers.registry import ProviderRegistry
+from app.services.batch import BatchRunner
+from app.services.chat import ChatService
+from app.services.response_cache import ResponseCache
+
+
+class _EchoProvider(LLMProvider):
+    """Replies with the last user message after ``delay`` seconds."""
+
+    name = "Echo"
+
+    def __init__(self, settings, provider_id="echo", delay=0.0, streaming=True):
+        super().__init__(settings)
+        self.id = provider_id
+        self.delay = delay
+        self.supports_streaming = streaming
+        self.calls = 0
+
+    async def generate(self, payload):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        text = payload.messages[-1].content
+        return ChatCompletionResponse(
+            model=payload.model or "echo",
+            provider=self.id,
+            choices=[
+                ChatCompletionChoice(
+                    index=0,
+                    message=ChatMessage(role=Role.ASSISTANT, content=text),
+                    finish_reason="stop",
+                )
+            ],
+            usage=UsageStats(completion_tokens=len(text.split())),
+        )
+
+    async def stream(self, payload):
+        self.calls += 1
+        for word in payload.messages[-1].content.split():
+            await asyncio.sleep(self.delay)
+            yield ChatCompletionChunk(
+                id="echo",
+                model=payload.model or "echo",
+                index=0,
+                delta=StreamDelta(content=word),
+                provider=self.id,
+            )
+
+    async def get_models(self):
+        return []
+
+
+def _service(*providers, settings=None):
+    settings = settings or Settings()
+    registry = ProviderRegistry(settings)
+    registry._providers = {provider.id: provider for provider in providers}
+    return ChatService(registry, HookManager())
+
+
+@pytest.mark.asyncio
+async def test_compare_runs_targets_concurrently():
+    settings = Settings()
+    fast = _EchoProvider(settings, "fast", delay=0.0)
+    slow = _EchoProvider(settings, "slow", delay=0.1, streaming=False)
+    service = _service(fast, slow, settings=settings)
+    request = ChatCompareRequest(
+        messages=[ChatMessage(role=Role.USER, content="one two three")],
+        targets=[
+            CompareTarget(provider="fast", model="a"),
+            CompareTarget(provider="slow", model="b"),
+            CompareTarget(provider="missing", model="c"),
+        ],
+    )
+
+    started = time.perf_counter()
+    events = [event async for event in service.compare(request)]
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.25
+    chunks = [event for event in events if event.type == "chunk"]
+    assert {event.target for event in chunks} == {0, 1}
+    summary = events[-1]
+    assert summary.type == "summary"
+    stats = {item.target: item for item in summary.summary}
+    assert stats[0].completion_tokens == 3
+    assert stats[1].completion_tokens == 3 and stats[1].status == "ok"
+    assert stats[2].status == "error"
+
+
+@pytest.mark.asyncio
+async def test_deterministic_completions_are_cached(tmp_path):
+    provider = _EchoProvider(Settings())
+    service = _service(provider)
+    service.response_cache = ResponseCache(
+        max_entries=1, path=str(tmp_path / "cache.sqlite3")
+    )
+    request = ChatCompletionRequest(
+        provider="echo",
+        messages=[ChatMessage(role=Role.USER, content="hello there")],
+        temperature=0,
+        api_key="secret-a",
+    )
+
+    first = await service.complete(request)
+    second = await service.complete(request.copy(update={"api_key": "secret-b"}))
+    assert provider.calls == 1
+    assert second.meta["cache"] == "hit"
+    assert second.choices[0].message.content == first.choices[0].message.content
+
+    await service.complete(request.copy(update={"messages": request.messages * 2}))
+    streamed = await service.complete(request.copy(update={"stream": True}))
+    chunks = [chunk async for chunk in streamed]
+    assert provider.calls == 2
+    assert chunks[0].delta.content == "hello there"
+    assert service.stats()["response_cache"]["disk_hits"] == 1
+
+    await service.complete(request.copy(update={"cache": False}))
+    await service.complete(request.copy(update={"temperature": 0.7}))
+    assert provider.calls == 4
+    service.response_cache.close()
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_generation():
+    provider = _EchoProvider(Settings(), delay=0.05)
+    service = _service(provider)
+    request = ChatCompletionRequest(
+        provider="echo",
+        messages=[ChatMessage(role=Role.USER, content="hello")],
+    )
+
+    results = await asyncio.gather(*(service.complete(request) for _ in range(3)))
+    assert provider.calls == 1
+    assert {result.choices[0].message.content for result in results} == {"hello"}
+    assert service.stats()["coalescing"]["coalesced"] == 2
+
+    first = asyncio.create_task(service.complete(request))
+    second = asyncio.create_task(service.complete(request))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert (await second).choices[0].message.content == "hello"
+    assert provider.calls == 2
+
+    lone = asyncio.create_task(service.complete(request))
+    await asyncio.sleep(0.01)
+    lone.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await lone
+    assert service.stats()["coalescing"]["abandoned"] == 1
+    assert service.stats()["coalescing"]["in_flight"] == 0
+
+    keyed = [request.copy(update={"api_key": key}) for key in ("a", "b", "a")]
+    await asyncio.gather(*(service.complete(item) for item in keyed))
+    assert provider.calls == 5
+    assert service.stats()["coalescing"]["coalesced"] == 4
+
+
+async def _body(*lines):
+    for line in lines:
+        yield line
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_results_and_resumes(tmp_path):
+    settings = Settings(batch_journal_path=str(tmp_path))
+    provider = _EchoProvider(settings)
+    runner = BatchRunner(_service(provider, settings=settings), settings)
+    lines = [
+        b'{"provider": "echo", "messages": [{"role": "user", "content": "a"}]}\n',
+        b'not json\n{"provider": "echo", "messages": [{"role": "user",',
+        b' "content": "b"}]}\n',
+    ]
+
+    records = [
+        json.loads(line)
+        async for line in runner.run(_body(*lines), concurrency=1, batch_id="run-1")
+    ]
+    assert sorted(record["index"] for record in records) == [0, 1, 2]
+    by_index = {record["index"]: record for record in records}
+    assert by_index[0]["response"]["choices"][0]["message"]["content"] == "a"
+    assert "error" in by_index[1]
+    assert provider.calls == 2
+
+    resumed = [
+        json.loads(line) async for line in runner.run(_body(*lines), batch_id="run-1")
+    ]
+    assert [record["index"] for record in resumed] == [1]
+    assert provider.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_backpressure_and_abort():
+    settings = Settings()
+    provider = _EchoProvider(settings)
+    runner = BatchRunner(_service(provider, settings=settings), settings)
+    line = b'{"provider": "echo", "messages": [{"role": "user", "content": "a"}]}\n'
+
+    results = runner.run(_body(*[line] * 20), concurrency=1)
+    first = await results.__anext__()
+    await asyncio.sleep(0.05)
+    # One result handed out, two queued and one waiting to be queued.
+    assert json.loads(first)["index"] == 0
+    assert provider.calls == 4
+    await results.aclose()
+
+    async def failing_body():
+        yield line
+        await asyncio.sleep(0.01)
+        raise RuntimeError("connection reset")
+
+    slow = _EchoProvider(settings, delay=5)
+    runner = BatchRunner(_service(slow, settings=settings), settings)
+    records = await asyncio.wait_for(
+        _collect(runner.run(failing_body(), concurrency=1)), 1
+    )
+    assert records == [{"error": "Batch aborted: connection reset"}]
+
+
+async def _collect(lines):
+    return [json.loads(line) async for line in lines]
+
+
+@pytest.mark.asyncio
+async def test_admission_prefers_interactive_and_rejects_when_full():
+    from app.services.admission import AdmissionRejectedError
+
+    settings = Settings(provider_concurrency={"echo": 1}, admission_queue_size=2)
+    service = _service(_EchoProvider(settings, delay=0.05), settings=settings)
+    order = []
+
+    async def call(text, priority):
+        request = ChatCompletionRequest(
+            provider="echo",
+            priority=priority,
+            cache=False,
+            messages=[ChatMessage(role=Role.USER, content=text)],
+        )
+        response = await service.complete(request)
+        order.append(response.choices[0].message.content)
+
+    first = asyncio.create_task(call("first", "interactive"))
+    await asyncio.sleep(0.01)
+    queued = [
+        asyncio.create_task(call("batch", "batch")),
+        asyncio.create_task(call("interactive", "interactive")),
+    ]
+    await asyncio.sleep(0.01)
+    with pytest.raises(AdmissionRejectedError) as excinfo:
+        await call("overflow", "interactive")
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after >= 1
+
+    await asyncio.gather(first, *queued)
+    assert order == ["first", "interactive", "batch"]
+    stats = service.stats()["admission"]["echo"]
+    assert stats["rejected"] == 1 and stats["in_use"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_releases_admission_slot_even_if_never_consumed():
+    settings = Settings(provider_concurrency={"echo": 1})
+    service = _service(_EchoProvider(settings), settings=settings)
+    request = ChatCompletionRequest(
+        provider="echo",
+        stream=True,
+        cache=False,
+        messages=[ChatMessage(role=Role.USER, content="hello")],
+    )
+
+    stream = await service.complete(request)
+    assert service.stats()["admission"]["echo"]["in_use"] == 1
+    del stream
+    gc.collect()
+    await asyncio.sleep(0.01)
+    assert service.stats()["admission"]["echo"]["in_use"] == 0
+
+    stream = await service.complete(request)
+    assert [chunk.delta.content async for chunk in stream][0] == "hello"
+    assert service.stats()["admission"]["echo"]["in_use"] == 0
+
+
+class _Request:
+    def __init__(self):
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+
+@pytest.mark.asyncio
+async def test_non_streaming_completion_is_cancelled_on_disconnect():
+    from app.routers.chat import _cancel_on_disconnect
+    from fastapi import HTTPException
+
+    async def work(delay):
+        await asyncio.sleep(delay)
+        return "done"
+
+    assert await _cancel_on_disconnect(_Request(), work(0)) == "done"
+
+    request = _Request()
+    slow = asyncio.ensure_future(work(5))
+    pending = asyncio.create_task(_cancel_on_disconnect(request, slow))
+    await asyncio.sleep(0.01)
+    request.gone.set()
+    with pytest.raises(HTTPException) as error:
+        await pending
+    assert error.value.status_code == 499
+    await asyncio.sleep(0)
+    assert slow.cancelled()
@@ -0,0 +1,962 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app.core.config import Settings
+from app.models.schemas import ChatCompletionRequest, ChatMessage, Role
+from app.providers import huggingface
+from app.providers.hf_batching import MicroBatcher
+from app.providers.hf_stopping import GenerationControl
+from app.providers.huggingface import HuggingFaceProvider
+
+_VOCAB = ["<prompt>", "Hello", ",", " wor", "ld", "!"]
+
+
+class _Encoded(dict):
+    def to(self, device):
+        return self
+
+
+class _FakeTokenizer:
+    pad_token_id = None
+    eos_token_id = 0
+
+    def __call__(self, prompt, return_tensors=None, add_special_tokens=True):
+        if return_tensors is None:
+            return {"input_ids": [len(word) for word in prompt.split()]}
+        return _Encoded(input_ids=[[0]])
+
+    def pad(self, encoded, return_tensors=None):
+        return _Encoded(input_ids=encoded["input_ids"])
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(_VOCAB[i] for i in ids)
+
+
+class _FakeModel:
+    device = "cpu"
+
+    def __init__(self, tokens, delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.kwargs = None
+        self.emitted = 0
+        self.aborted = threading.Event()
+
+    def generate(self, input_ids, streamer, **kwargs):
+        self.kwargs = kwargs
+        streamer.put(input_ids)
+        try:
+            for token in self.tokens:
+                threading.Event().wait(self.delay)
+                streamer.put([token])
+                self.emitted += 1
+        except Exception:
+            self.aborted.set()
+            raise
+        streamer.end()
+
+
+class _FakePipeline:
+    def __init__(self, model):
+        self.model = model
+        self.tokenizer = _FakeTokenizer()
+
+
+def _provider(monkeypatch, model):
+    monkeypatch.setattr(huggingface, "hf_pipeline", object())
+    provider = HuggingFaceProvider(
+        Settings(
+            huggingface_stream_queue_size=1,
+            huggingface_engine="pipeline",
+            # The fake model has no forward pass to prefill a cache with.
+            huggingface_prefix_cache_bytes=0,
+        )
+    )
+    provider._pool.add("fake", _FakePipeline(model))
+    return provider
+
+
+def _request(**overrides):
+    return ChatCompletionRequest(
+        model="fake",
+        stream=True,
+        messages=[ChatMessage(role=Role.USER, content="hi")],
+        **overrides,
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_tokens_incrementally(monkeypatch):
+    model = _FakeModel([1, 2, 3, 4, 5])
+    provider = _provider(monkeypatch, model)
+
+    chunks = [chunk async for chunk in provider.stream(_request(temperature=0))]
+
+    assert provider.supports_streaming
+    assert [chunk.delta.content for chunk in chunks[:-1]] == [
+        "Hello",
+        ",",
+        " wor",
+        "ld",
+        "!",
+    ]
+    assert chunks[-1].delta.finish_reason == "stop"
+    assert len({chunk.id for chunk in chunks}) == 1
+    assert model.kwargs["do_sample"] is False
+    # "[User]\nhi\n" and "\n[Assistant]\n" are three fake tokens.
+    assert chunks[-1].meta["usage"] == {
+        "prompt_tokens": 3,
+        "completion_tokens": 5,
+        "total_tokens": 8,
+    }
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_aborts_generation(monkeypatch):
+    model = _FakeModel([1, 2, 3, 4, 5] * 20, delay=0.01)
+    provider = _provider(monkeypatch, model)
+
+    stream = provider.stream(_request())
+    first = await stream.__anext__()
+    await stream.aclose()
+
+    assert first.delta.content == "Hello"
+    assert await asyncio.to_thread(model.aborted.wait, 2)
+    assert model.emitted < 100
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_groups_by_sampling_params():
+    calls = []
+
+    def run_batch(prompts, limits, kwargs, controls):
+        calls.append((list(prompts), list(limits), kwargs))
+        return [(prompt.upper(), limit) for prompt, limit in zip(prompts, limits)]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=2, window=0.02)
+    greedy = {"do_sample": False}
+    sampled = {"do_sample": True, "temperature": 0.7}
+
+    results = await asyncio.gather(
+        batcher.submit("a", 4, greedy),
+        batcher.submit("b", 8, sampled),
+        batcher.submit("c", 2, greedy),
+        batcher.submit("d", 3, greedy),
+    )
+
+    assert results == [("A", 4), ("B", 8), ("C", 2), ("D", 3)]
+    assert sorted(calls, key=lambda call: call[0]) == [
+        (["a", "c"], [4, 2], greedy),
+        (["b"], [8], sampled),
+        (["d"], [3], greedy),
+    ]
+    stats = batcher.stats()
+    assert stats["batches"] == 3 and stats["avg_batch_size"] == pytest.approx(1.33)
+    assert set(stats["by_batch_size"]) <= {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_honours_generation_controls():
+    calls = []
+    release = threading.Event()
+
+    def run_batch(prompts, limits, kwargs, controls):
+        calls.append((list(prompts), list(controls)))
+        release.wait(1)
+        return [(prompt.upper(), limit) for prompt, limit in zip(prompts, limits)]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=8, window=0.02)
+    cancelled = GenerationControl()
+    cancelled.cancel()
+    expired = GenerationControl(timeout=0.001)
+    stopped = GenerationControl(["."])
+
+    results = await asyncio.gather(
+        batcher.submit("a", 4, {}, cancelled),
+        batcher.submit("b", 4, {}, expired),
+        batcher.submit("c", 4, {}, stopped),
+        batcher.submit("d", 4, {}),
+        asyncio.to_thread(release.set),
+    )
+
+    assert calls == [(["c", "d"], [stopped, None])]
+    assert results[:4] == [("", 0), ("", 0), ("C", 4), ("D", 4)]
+    assert cancelled.finish_reason == "cancelled"
+    assert expired.finish_reason == "timeout"
+
+    release.clear()
+    running = GenerationControl()
+    task = asyncio.create_task(batcher.submit("e", 4, {}, running))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert running.cancelled
+    release.set()
+
+
+class _PaddingTokenizer:
+    eos_token_id = 0
+    pad_token_id = 0
+
+    def pad(self, encoded, return_tensors=None):
+        import torch
+
+        rows = encoded["input_ids"]
+        width = max(len(row) for row in rows)
+        ids = [[0] * (width - len(row)) + row for row in rows]
+        mask = [[0] * (width - len(row)) + [1] * len(row) for row in rows]
+        return _TensorBatch(
+            input_ids=torch.tensor(ids), attention_mask=torch.tensor(mask)
+        )
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(64 + token % 26) for token in ids if token)
+
+
+class _TensorBatch(dict):
+    def to(self, device):
+        return self
+
+
+def test_batch_runner_ends_each_row_on_its_own():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from app.providers.hf_batching import make_batch_runner
+
+    torch.manual_seed(0)
+    model = transformers.GPT2LMHeadModel(
+        transformers.GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=64)
+    ).eval()
+    tokenizer = _PaddingTokenizer()
+    run = make_batch_runner(model, tokenizer)
+    prompts = [[5, 6, 7], [9, 3]]
+    greedy = {"do_sample": False, "pad_token_id": 0}
+    reference = run(prompts, [12, 12], greedy, [None, None])
+    stop = reference[0][0][4:6]
+
+    cancelled = GenerationControl()
+    cancelled.cancel()
+    stopped = GenerationControl([stop])
+    results = run(prompts, [12, 5], greedy, [stopped, None])
+    assert results[0][0] == reference[0][0][: reference[0][0].index(stop)]
+    assert stopped.finish_reason == "stop"
+    assert results[1] == (reference[1][0][:5], 5)
+
+    assert run(prompts, [12, 12], greedy, [cancelled] * 2) == [
+        ("", 0),
+        ("", 0),
+    ]
+
+
+def test_batch_runner_reuses_cached_prefixes():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from app.providers.hf_batching import make_batch_runner
+    from app.providers.hf_prefix_cache import PrefixCache
+
+    torch.manual_seed(0)
+    model = transformers.GPT2LMHeadModel(
+        transformers.GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=64)
+    ).eval()
+    tokenizer = _PaddingTokenizer()
+    cache = PrefixCache(max_bytes=1 << 24, block_size=2)
+    plain = make_batch_runner(model, tokenizer)
+    cached = make_batch_runner(model, tokenizer, cache)
+    greedy = {"do_sample": False, "pad_token_id": 0}
+    turns = [
+        [[5, 6, 7, 8, 9]],
+        [[5, 6, 7, 8, 9, 10, 11], [9, 3, 4]],
+        [[5, 6, 7, 8, 9, 10, 11, 12, 13], [9, 3, 4, 2]],
+    ]
+
+    for prompts in turns:
+        limits = [6] * len(prompts)
+        controls = [None] * len(prompts)
+        assert cached(prompts, limits, greedy, controls) == plain(
+            prompts, limits, greedy, controls
+        )
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["reused_tokens"] == 4 + 6 + 2
+
+
+class _CharTokenizer:
+    eos_token_id = None
+
+    def __call__(self, prompt, return_tensors=None):
+        return {"input_ids": [ord(char) % 64 for char in prompt]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(65 + token % 26) for token in ids)
+
+
+@pytest.mark.asyncio
+async def test_continuous_engine_matches_greedy_generate():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from app.providers.hf_continuous import ContinuousBatchingEngine
+    from app.providers.hf_prefix_cache import PrefixCache
+
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=64)
+    model = transformers.GPT2LMHeadModel(config).eval()
+    tokenizer = _CharTokenizer()
+    engine = ContinuousBatchingEngine(
+        model,
+        tokenizer,
+        max_batch_size=4,
+        prefix_cache=PrefixCache(max_bytes=1 << 24, block_size=2),
+    )
+    prompts = {
+        "short": 3,
+        "a much longer prompt": 12,
+        "mid prompt": 7,
+        "a much longer prompt, continued": 5,
+    }
+
+    try:
+        results = await asyncio.gather(
+            *(
+                engine.generate(prompt, max_new_tokens=tokens)
+                for prompt, tokens in prompts.items()
+            )
+        )
+    finally:
+        engine.close()
+
+    for (prompt, tokens), result in zip(prompts.items(), results):
+        input_ids = torch.tensor([tokenizer(prompt)["input_ids"]])
+        expected = model.generate(
+            input_ids, max_new_tokens=tokens, do_sample=False, pad_token_id=0
+        )[0, input_ids.shape[1] :].tolist()
+        assert result.text == tokenizer.decode(expected)
+        assert result.finish_reason == "length"
+    assert engine.stats()["completed"] == len(prompts)
+
+
+@pytest.mark.asyncio
+async def test_closing_continuous_engine_fails_queued_requests(monkeypatch):
+    from app.providers.hf_continuous import ContinuousBatchingEngine
+
+    engine = ContinuousBatchingEngine(None, _CharTokenizer(), max_batch_size=1)
+    # Keep the engine thread from admitting anything so requests stay queued.
+    monkeypatch.setattr(engine, "_ensure_thread", lambda: None)
+    queued = [
+        asyncio.create_task(engine.generate(prompt, max_new_tokens=4))
+        for prompt in ("a", "b", "c")
+    ]
+    await asyncio.sleep(0)
+
+    engine.close()
+    results = await asyncio.wait_for(asyncio.gather(*queued, return_exceptions=True), 1)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        await engine.generate("d", max_new_tokens=1)
+
+
+def test_speculative_decoding_matches_greedy_generate():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from app.providers.hf_speculative import SpeculativeDecoder
+
+    torch.manual_seed(0)
+    target = transformers.GPT2LMHeadModel(
+        transformers.GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=64)
+    ).eval()
+    # A draft identical to the target must have every proposal accepted.
+    for draft, always_accepted in ((target, True), (_tiny_gpt2(transformers), False)):
+        decoder = SpeculativeDecoder(target, draft, draft_tokens=3)
+        for prompt_ids, tokens in (([5], 6), ([1, 2, 3, 4, 5, 6], 11)):
+            result = decoder.generate(prompt_ids, max_new_tokens=tokens)
+            input_ids = torch.tensor([prompt_ids])
+            expected = target.generate(
+                input_ids, max_new_tokens=tokens, do_sample=False, pad_token_id=0
+            )[0, len(prompt_ids) :].tolist()
+            assert result.token_ids == expected
+            assert result.finish_reason == "length"
+            if always_accepted:
+                assert result.stats["accept_rate"] == 1.0
+                assert result.stats["target_forwards"] < tokens
+
+
+def _tiny_gpt2(transformers):
+    config = transformers.GPT2Config(n_layer=1, n_head=2, n_embd=16, vocab_size=64)
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+class _FakeTensor:
+    """Stands in for a ``[1, heads, tokens, dim]`` tensor: 1 byte per token."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.nbytes = tokens
+
+    def __getitem__(self, index):
+        return _FakeTensor(len(range(self.tokens)[index[2]]))
+
+
+def _past(tokens):
+    return ((_FakeTensor(tokens), _FakeTensor(tokens)),)
+
+
+def test_prefix_cache_reuses_longest_prefix_and_evicts_lru():
+    from app.providers.hf_prefix_cache import PrefixCache
+
+    cache = PrefixCache(max_bytes=50, block_size=4)
+    first_turn = list(range(10))
+    cache.store(first_turn, _past(10))
+
+    second_turn = first_turn + [50, 51, 52, 53, 54]
+    past, reused = cache.lookup(second_turn)
+    assert reused == 8 and past[0][0].tokens == 8
+    assert cache.lookup([99] * 12) == (None, 0)
+
+    # Exactly one block: the final token is always left for the model.
+    assert cache.lookup(first_turn[:5])[1] == 4
+    assert cache.lookup(first_turn[:4])[1] == 0
+
+    cache.store([7] * 12, _past(12))
+    assert cache.stats()["evictions"] == 0
+    cache.store([8] * 12, _past(12))
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] <= 50
+    assert cache.lookup(second_turn) == (None, 0)
+    assert stats["hits"] == 2 and stats["token_hit_rate"] > 0
+
+
+class _Tensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class _SizedModel:
+    def __init__(self, nbytes):
+        self._nbytes = nbytes
+
+    def parameters(self):
+        return [_Tensor(self._nbytes)]
+
+    def buffers(self):
+        return []
+
+
+def test_model_pool_enforces_budget_and_idle_ttl():
+    from app.providers.hf_pool import ModelPool
+
+    now = [0.0]
+    evicted = []
+    pool = ModelPool(
+        max_bytes=100,
+        idle_ttl=60,
+        on_evict=lambda entry: evicted.append(entry.model_id),
+        clock=lambda: now[0],
+    )
+    pool.add("a", _FakePipeline(_SizedModel(40)))
+    pool.add("b", _FakePipeline(_SizedModel(40)))
+    now[0] = 10
+    assert pool.get("a") is not None
+
+    assert pool.add("c", _FakePipeline(_SizedModel(50))) == ["b"]
+    assert [entry.model_id for entry in pool.entries()] == ["a", "c"]
+    assert pool.resident_bytes == 90
+
+    now[0] = 40
+    pool.get("c")
+    now[0] = 80
+    assert pool.evict_idle() == ["a"]
+    assert evicted == ["b", "a"] and "c" in pool
+
+
+def test_model_pool_never_evicts_models_in_use():
+    from app.providers.hf_pool import ModelPool
+
+    now = [0.0]
+    pool = ModelPool(max_bytes=100, idle_ttl=60, clock=lambda: now[0])
+    pool.add("a", _FakePipeline(_SizedModel(60)))
+    entry = pool.acquire("a")
+
+    # Over budget while "a" generates; it is trimmed once released.
+    assert pool.add("b", _FakePipeline(_SizedModel(60))) == []
+    now[0] = 100
+    assert pool.evict_idle() == ["b"]
+    assert "a" in pool
+    pool.add("b", _FakePipeline(_SizedModel(60)))
+    now[0] = 110
+    assert pool.release(entry) == ["b"]
+    assert entry.last_used == 110 and entry.active == 0
+
+
+@pytest.mark.asyncio
+async def test_get_models_reports_resident_size(monkeypatch):
+    provider = _provider(monkeypatch, _FakeModel([]))
+    provider._pool.add("sized", _FakePipeline(_SizedModel(1234)))
+
+    models = {model.id: model for model in await provider.get_models()}
+
+    assert models["sized"].meta["resident_bytes"] == 1234
+    assert models["sized"].meta["last_used"]
+
+
+@pytest.mark.asyncio
+async def test_model_loads_are_single_flight_per_model(monkeypatch):
+    calls = []
+
+    def fake_pipeline(task, model, **kwargs):
+        calls.append(model)
+        threading.Event().wait(0.1)
+        if model == "broken":
+            raise OSError("no such model")
+        return _FakePipeline(_FakeModel([]))
+
+    provider = _provider(monkeypatch, _FakeModel([]))
+    monkeypatch.setattr(huggingface, "hf_pipeline", fake_pipeline)
+
+    started = asyncio.get_running_loop().time()
+    loads = asyncio.gather(
+        provider.load_model("a"),
+        provider.load_model("a"),
+        provider.load_model("b"),
+        provider.load_model("broken"),
+        return_exceptions=True,
+    )
+    await asyncio.sleep(0.02)
+    # Already-loaded models stay readable while others load.
+    assert (await provider._acquire("fake")).pipeline is not None
+    loading = {model.id: model for model in await provider.get_models()}
+    assert loading["a"].meta["load"]["status"] == "loading"
+
+    results = await loads
+    assert sorted(calls) == ["a", "b", "broken"]
+    assert asyncio.get_running_loop().time() - started < 0.25
+    assert results[0].loaded and results[2].loaded
+    assert isinstance(results[3], OSError)
+    models = {model.id: model for model in await provider.get_models()}
+    assert models["a"].meta["load"]["status"] == "loaded"
+    assert models["broken"].meta["load"]["error"] == "no such model"
+
+
+@pytest.mark.asyncio
+async def test_acquire_reports_models_evicted_while_loading(monkeypatch):
+    from app.providers.base import ProviderError
+
+    provider = _provider(monkeypatch, _FakeModel([]))
+    loads = []
+
+    async def load_then_lose(model_id, **kwargs):
+        # Another load evicts the model before this caller resumes.
+        loads.append(model_id)
+
+    monkeypatch.setattr(provider, "load_model", load_then_lose)
+
+    with pytest.raises(ProviderError):
+        await provider._acquire("gone")
+    assert loads == ["gone", "gone"]
+
+
+@pytest.mark.asyncio
+async def test_inference_executor_tracks_queue_and_utilization():
+    from app.providers.hf_executor import InferenceExecutor, available_cpus
+
+    executor = InferenceExecutor(workers=1, pin_cpus=True)
+    release = threading.Event()
+    try:
+        first = asyncio.wrap_future(executor.submit(release.wait, 2))
+        second = asyncio.wrap_future(executor.submit(lambda: "done"))
+        await asyncio.sleep(0.05)
+        stats = executor.stats()
+        assert stats["active"] == 1 and stats["queued"] == 1
+        release.set()
+        assert await second == "done"
+        await first
+    finally:
+        executor.shutdown()
+
+    stats = executor.stats()
+    assert stats["completed"] == 2 and stats["queued"] == 0
+    assert stats["torch_threads"] == len(available_cpus())
+    assert 0 < stats["utilization"] <= 1
+
+
+def test_inference_executor_configures_torch_threads_once(monkeypatch):
+    from app.providers import hf_executor
+
+    calls = []
+    monkeypatch.setattr(
+        hf_executor, "configure_torch_threads", lambda *args: calls.append(args)
+    )
+    executor = hf_executor.InferenceExecutor(workers=2, torch_threads=3)
+    release = threading.Event()
+    try:
+        futures = [executor.submit(release.wait, 2) for _ in range(2)]
+        futures.append(executor.submit(lambda: None))
+        release.set()
+        for future in futures:
+            future.result(2)
+    finally:
+        executor.shutdown()
+
+    assert calls == [(3, None)]
+
+
+class _EchoBackend:
+    """Worker backend that streams the prompt back word by word."""
+
+    def load(self, model_id, options):
+        return {"nbytes": 100, "shared_weights": None}
+
+    def unload(self, model_id):
+        return None
+
+    def generate(self, model_id, prompt, options, emit, cancelled):
+        import os
+
+        if not isinstance(prompt, str):
+            prompt = " ".join(message["content"] for message in prompt)
+        if "crash" in prompt:
+            os._exit(1)
+        words = prompt.split()[: options["max_new_tokens"]]
+        for word in words:
+            threading.Event().wait(0.02)
+            if emit is not None:
+                emit(word)
+        return {
+            "text": " ".join(words),
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(words),
+            "pid": os.getpid(),
+        }
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_stream_route_and_restart(monkeypatch):
+    from app.providers.base import ProviderError
+
+    monkeypatch.setattr(huggingface, "hf_pipeline", object())
+    provider = HuggingFaceProvider(
+        Settings(huggingface_worker_processes=2, huggingface_worker_start_method="fork")
+    )
+    workers = provider._workers
+    workers._backend_factory = _EchoBackend
+    await provider.startup()
+    try:
+        info = await provider.load_model("fake")
+        assert info.loaded and provider._pool.entries()[0].nbytes == 100
+
+        chunks = [chunk async for chunk in provider.stream(_request(max_tokens=3))]
+        assert [chunk.delta.content for chunk in chunks[:-1]] == ["hi"]
+        assert chunks[-1].meta["usage"]["completion_tokens"] == 1
+
+        results = await asyncio.gather(
+            workers.generate("fake", "a b c", {"max_new_tokens": 3}),
+            workers.generate("fake", "d e f", {"max_new_tokens": 3}),
+        )
+        assert results[0]["pid"] != results[1]["pid"]
+
+        with pytest.raises(ProviderError):
+            await workers.generate("fake", "crash", {"max_new_tokens": 1})
+        for _ in range(100):
+            stats = workers.stats()
+            if all(worker["alive"] for worker in stats["workers"]):
+                break
+            await asyncio.sleep(0.05)
+        assert stats["crashes"] == 1
+        assert sum(worker["restarts"] for worker in stats["workers"]) == 1
+        result = await workers.generate("fake", "still here", {"max_new_tokens": 2})
+        assert result["text"] == "still here"
+    finally:
+        await provider.aclose()
+
+
+class _ExportingBackend(_EchoBackend):
+    """Echo backend whose first load writes a shared weights file."""
+
+    def __init__(self, weights_dir):
+        self.weights_dir = weights_dir
+
+    def load(self, model_id, options):
+        if options.get("shared_weights"):
+            return {"nbytes": 100, "shared_weights": options["shared_weights"]}
+        path = os.path.join(self.weights_dir, f"{model_id}.pt")
+        with open(path, "w") as handle:
+            handle.write("weights")
+        return {"nbytes": 100, "shared_weights": path, "exported": True}
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_removes_exported_weights(tmp_path):
+    import functools
+
+    from app.providers.hf_workers import WorkerPool
+
+    workers = WorkerPool(
+        workers=2,
+        backend_factory=functools.partial(_ExportingBackend, str(tmp_path)),
+        start_method="fork",
+        torch_threads=None,
+    )
+    await workers.start()
+    try:
+        await workers.load("a", {})
+        await workers.load("b", {})
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["a.pt", "b.pt"]
+        await workers.unload("a")
+        assert [path.name for path in tmp_path.iterdir()] == ["b.pt"]
+    finally:
+        await workers.close()
+    assert not list(tmp_path.iterdir())
+
+
+class _ClosingConn:
+    """Pipe end that breaks once a request has been sent."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        if self.sent:
+            raise BrokenPipeError("worker exited")
+        self.sent.append(message)
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_tolerates_a_broken_worker_pipe():
+    from app.providers.hf_workers import WorkerPool, _Worker
+
+    workers = WorkerPool(workers=1, backend_factory=_EchoBackend)
+    worker = _Worker(0, process=None, conn=_ClosingConn())
+    workers._workers = [worker]
+
+    stream = workers.stream("fake", "a b", {"max_new_tokens": 2})
+    pending = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    request_id = worker.conn.sent[0][1]
+    workers._deliver(request_id, "chunk", "a")
+    assert await pending == "a"
+    await stream.aclose()
+
+    assert not worker.alive and not worker.inflight
+
+
+def test_quantization_modes_are_normalized():
+    from app.providers.base import ProviderError
+    from app.providers.hf_quantization import load_dtype, normalize_quantization
+
+    assert normalize_quantization(None) is None
+    assert normalize_quantization("none") is None
+    assert normalize_quantization("BFloat16") == "bf16"
+    assert normalize_quantization("dynamic_int8") == "int8"
+    assert load_dtype("fp16") == "float16" and load_dtype("int8") is None
+    with pytest.raises(ProviderError):
+        normalize_quantization("gptq-4bit")
+
+
+@pytest.mark.asyncio
+async def test_load_model_rejects_unknown_quantization(monkeypatch):
+    from app.providers.base import ProviderError
+
+    provider = _provider(monkeypatch, _FakeModel([]))
+
+    with pytest.raises(ProviderError):
+        await provider.load_model("other", quantization="awq")
+    models = {model.id: model for model in await provider.get_models()}
+    assert models["other"].meta["load"]["status"] == "failed"
+
+
+def test_quantization_shrinks_linear_layers():
+    torch = pytest.importorskip("torch")
+    from app.providers.hf_quantization import apply_quantization
+
+    def model():
+        return torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.Linear(64, 8))
+
+    inputs = torch.randn(2, 64)
+    reference = model()
+    expected = reference(inputs)
+
+    report = apply_quantization(reference, "int8")
+    assert report["fp32_bytes"] == (64 * 64 + 64 + 64 * 8 + 8) * 4
+    assert report["bytes"] < report["fp32_bytes"] / 2
+    assert torch.allclose(reference(inputs), expected, atol=0.1)
+
+    half = model()
+    report = apply_quantization(half, "bf16")
+    assert report["compression"] == 2.0
+    assert next(half.parameters()).dtype == torch.bfloat16
+
+
+class _TemplateTokenizer:
+    chat_template = "fake"
+
+    def __init__(self):
+        self.encoded = []
+
+    def apply_chat_template(self, messages, tokenize, add_generation_prompt):
+        text = "".join(f"<{m['role']}>{m['content']}</s>" for m in messages)
+        return text + ("<assistant>" if add_generation_prompt else "")
+
+    def __call__(self, text, add_special_tokens=True):
+        self.encoded.append(text)
+        return {"input_ids": [ord(char) for char in text]}
+
+
+def test_prompt_builder_tokenizes_only_new_messages():
+    from app.providers.hf_prompt import PromptBuilder
+
+    tokenizer = _TemplateTokenizer()
+    builder = PromptBuilder(tokenizer)
+    history = [
+        ChatMessage(role=Role.SYSTEM, content="Be brief."),
+        ChatMessage(role=Role.USER, content="hi"),
+    ]
+
+    first = builder.build(history)
+    assert first.text == "<system>Be brief.</s><user>hi</s><assistant>"
+    assert first.token_ids == [ord(char) for char in first.text]
+
+    history += [
+        ChatMessage(role=Role.ASSISTANT, content="hello"),
+        ChatMessage(role=Role.USER, content="bye"),
+    ]
+    tokenizer.encoded.clear()
+    second = builder.build(history)
+    assert second.token_ids == [ord(char) for char in second.text]
+    assert tokenizer.encoded == [
+        "<assistant>hello</s>",
+        "<user>bye</s>",
+        "<assistant>",
+    ]
+    assert builder.stats()["cached_messages"] == 2
+
+
+def _write_safetensors(path, tensors):
+    import json
+    import struct
+
+    header, data = {}, b""
+    for name, (dtype, shape, payload) in tensors.items():
+        header[name] = {
+            "dtype": dtype,
+            "shape": shape,
+            "data_offsets": [len(data), len(data) + len(payload)],
+        }
+        data += payload
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (-len(encoded) % 8)
+    path.write_bytes(struct.pack("<Q", len(encoded)) + encoded + data)
+
+
+def test_local_safetensors_are_found_and_mapped(tmp_path):
+    import struct
+
+    from app.providers.hf_local import (
+        find_local_model,
+        map_safetensors,
+        read_safetensors_header,
+    )
+
+    snapshot = tmp_path / "models--org--tiny" / "snapshots" / "abc"
+    snapshot.mkdir(parents=True)
+    (snapshot / "config.json").write_text("{}")
+    weights = snapshot / "model.safetensors"
+    _write_safetensors(
+        weights, {"w": ("F32", [2, 2], struct.pack("<4f", 1.0, 2.0, 3.0, 4.0))}
+    )
+    (tmp_path / "plain").mkdir()
+    (tmp_path / "plain" / "config.json").write_text("{}")
+
+    assert find_local_model("org/tiny", [str(tmp_path)]) == snapshot
+    assert find_local_model("plain", [str(tmp_path)]) is None
+    header, data_start = read_safetensors_header(weights)
+    assert header["w"]["shape"] == [2, 2] and data_start % 8 == 0
+
+    torch = pytest.importorskip("torch")
+    mapped = map_safetensors(weights)["w"]
+    assert torch.equal(mapped, torch.tensor([[1.0, 2.0], [3.0, 4.0]]))
+
+
+@pytest.mark.asyncio
+async def test_load_model_maps_local_weights(monkeypatch, tmp_path):
+    model_dir = tmp_path / "tiny"
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}")
+    _write_safetensors(model_dir / "model.safetensors", {})
+    mapped = []
+
+    def fake_mapped_pipeline(path, *, torch_dtype=None, device=-1):
+        mapped.append(path)
+        return _FakePipeline(_FakeModel([]))
+
+    monkeypatch.setattr(huggingface, "load_mapped_pipeline", fake_mapped_pipeline)
+    monkeypatch.setattr(huggingface, "hf_pipeline", object())
+    provider = HuggingFaceProvider(Settings(local_models_path=str(tmp_path)))
+
+    info = await provider.load_model("tiny")
+
+    assert mapped == [model_dir]
+    assert info.meta["load_stats"]["loader"] == "mmap"
+    assert info.meta["load_stats"]["load_seconds"] >= 0
+
+
+def test_stop_sequence_matcher_holds_back_partial_matches():
+    from app.providers.hf_stopping import StopSequenceMatcher
+
+    matcher = StopSequenceMatcher(["world", "\n\n"])
+
+    assert matcher.push("Hello wo") == "Hello "
+    assert matcher.push("r") == ""
+    assert matcher.push("ld, and more") == ""
+    assert matcher.stopped and matcher.flush() == ""
+
+    matcher = StopSequenceMatcher(["world"])
+    assert matcher.push("Hello wor") == "Hello "
+    assert matcher.push("d") == "word"
+    assert matcher.push("! w") == "! "
+    assert matcher.flush() == "w"
+
+
+@pytest.mark.asyncio
+async def test_stop_sequence_ends_generation(monkeypatch):
+    model = _FakeModel([1, 2, 3, 4, 5] * 20)
+    provider = _provider(monkeypatch, model)
+
+    chunks = [chunk async for chunk in provider.stream(_request(stop=["world"]))]
+    response = await provider.generate(_request(stop=["world"]))
+
+    assert "".join(chunk.delta.content or "" for chunk in chunks) == "Hello, "
+    assert chunks[-1].delta.finish_reason == "stop"
+    assert response.choices[0].message.content == "Hello, "
+    assert model.aborted.is_set()
+    assert model.emitted < 10
+
+
+@pytest.mark.asyncio
+async def test_deadline_and_cancellation_abort_generation(monkeypatch):
+    model = _FakeModel([1, 2, 3, 4, 5] * 100, delay=0.01)
+    provider = _provider(monkeypatch, model)
+    provider.settings.huggingface_generation_timeout = 0.1
+
+    response = await provider.generate(_request())
+
+    assert response.choices[0].finish_reason == "timeout"
+    assert model.aborted.is_set() and model.emitted < 100
+
+    model = _FakeModel([1, 2, 3, 4, 5] * 100, delay=0.01)
+    provider = _provider(monkeypatch, model)
+    task = asyncio.create_task(provider.generate(_request()))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert await asyncio.to_thread(model.aborted.wait, 2)
+    assert model.emitted < 100
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+
+from app.core.config import Settings
+from app.hooks.examples import AttentionCaptureHook, TokenLogHook
+from app.hooks.manager import HookManager
+from app.models.schemas import ChatCompletionRequest, ChatMessage, Role
+from app.providers.base import ProviderError
+from app.providers.openrouter import OpenRouterProvider
+from app.providers.registry import ProviderRegistry
+from app.services.chat import ChatService
+
+
+def _transport(handler):
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_openrouter_reuses_pooled_client_until_closed():
+    provider = OpenRouterProvider(
+        Settings(), transport=_transport(lambda request: httpx.Response(200, json={}))
+    )
+    await provider.startup()
+    async with provider._client_session() as first:
+        async with provider._client_session() as second:
+            assert first is second
+            assert provider.pool_stats()["requests_in_flight"] == 2
+    assert provider.pool_stats()["clients_created"] == 1
+
+    await provider.aclose()
+    assert first.is_closed
+    assert provider.pool_stats()["open"] is False
+    with pytest.raises(ProviderError):
+        await provider.get_models()
+
+    await provider.startup()
+    assert provider.pool_stats()["clients_created"] == 2
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_model_catalog_serves_stale_while_revalidating():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"data": [{"id": "openai/gpt-4o"}]}, headers={"ETag": '"v1"'}
+        )
+
+    provider = OpenRouterProvider(
+        Settings(model_catalog_ttl=0.0), transport=_transport(handler)
+    )
+    first = await provider.get_models()
+    second = await provider.get_models()
+    assert [model.id for model in first] == [model.id for model in second]
+    await provider._catalog._refresh
+
+    assert len(requests) == 2
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+    stats = provider._catalog.stats()
+    assert stats["stale_hits"] == 1 and stats["not_modified"] == 1
+
+    provider.invalidate_models()
+    await provider.get_models()
+    assert "If-None-Match" not in requests[2].headers
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stream_relays_frames_when_no_hook_observes_them():
+    upstream = [
+        b'{"id":"gen-1","model":"openai/gpt-4o","provider":"OpenAI",'
+        b'"choices":[{"index":0,"delta":{"role":"assistant","content":"Hi"}}]}',
+        b'{"id":"gen-1","model":"openai/gpt-4o",'
+        b'"choices":[{"index":0,"delta":{},"finish_reason":"stop"}]}',
+    ]
+    body = b": OPENROUTER PROCESSING\n\n"
+    body += b"".join(b"data: " + data + b"\n\n" for data in upstream)
+    body += b"data: [DONE]\n\n"
+    provider = OpenRouterProvider(
+        Settings(openrouter_api_key="key"),
+        transport=_transport(lambda request: httpx.Response(200, content=body)),
+    )
+    registry = ProviderRegistry(Settings())
+    registry._providers = {provider.id: provider}
+    hooks = HookManager()
+    hooks.register(TokenLogHook(), is_builtin=True)
+    hooks.register(AttentionCaptureHook(), is_builtin=True)
+    service = ChatService(registry, hooks)
+    request = ChatCompletionRequest(
+        provider=provider.id,
+        messages=[ChatMessage(role=Role.USER, content="Hello!")],
+        stream=True,
+    )
+
+    frames = [frame async for frame in await service.complete(request)]
+    assert frames == [b"data: " + data + b"\n\n" for data in upstream]
+
+    logger = logging.getLogger("app.hooks.examples")
+    level = logger.level
+    logger.setLevel(logging.DEBUG)
+    try:
+        chunks = [chunk async for chunk in await service.complete(request)]
+    finally:
+        logger.setLevel(level)
+    assert [chunk.delta.content for chunk in chunks] == ["Hi", None]
+    assert [chunk.delta.finish_reason for chunk in chunks] == [None, "stop"]
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stream_keeps_a_final_event_without_trailing_newline():
+    body = (
+        b'data: {"id":"gen-1","choices":[{"index":0,"delta":{"content":"Hi"}}]}\n\n'
+        b'data: {"id":"gen-1","choices":[{"index":0,"delta":{"content":"!"},'
+        b'"finish_reason":"stop"}]}'
+    )
+    provider = OpenRouterProvider(
+        Settings(openrouter_api_key="key"),
+        transport=_transport(lambda request: httpx.Response(200, content=body)),
+    )
+    request = ChatCompletionRequest(
+        model="openai/gpt-4o",
+        messages=[ChatMessage(role=Role.USER, content="Hello!")],
+        stream=True,
+    )
+
+    chunks = [chunk async for chunk in provider.stream(request)]
+    assert [chunk.delta.content for chunk in chunks] == ["Hi", "!"]
+    assert chunks[-1].delta.finish_reason == "stop"
+    await provider.aclose()
+
+
+def _completion(content="ok"):
+    return {
+        "id": "gen-1",
+        "model": "openai/gpt-4o",
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_generate_retries_transient_failures_and_honours_retry_after():
+    statuses = iter([503, 429])
+
+    def handler(request):
+        status = next(statuses, 200)
+        if status == 429:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, json=_completion())
+
+    provider = OpenRouterProvider(
+        Settings(openrouter_api_key="key", openrouter_retry_base_delay=0.0),
+        transport=_transport(handler),
+    )
+    request = ChatCompletionRequest(
+        messages=[ChatMessage(role=Role.USER, content="Hello!")]
+    )
+
+    response = await provider.generate(request)
+
+    assert response.choices[0].message.content == "ok"
+    stats = provider._resilience.snapshot()
+    assert stats["attempts"] == 3 and stats["retries"] == 2
+
+    statuses = iter([502, 502, 502])
+    with pytest.raises(httpx.HTTPStatusError):
+        await provider.generate(request)
+    assert provider._resilience.snapshot()["exhausted"] == 1
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_generate_hedges_slow_attempts():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json=_completion(f"attempt-{len(calls)}"))
+
+    provider = OpenRouterProvider(
+        Settings(openrouter_api_key="key", openrouter_hedge_after=0.01),
+        transport=_transport(handler),
+    )
+    request = ChatCompletionRequest(
+        messages=[ChatMessage(role=Role.USER, content="Hello!")]
+    )
+
+    response = await asyncio.wait_for(provider.generate(request), 1)
+
+    assert response.choices[0].message.content == "attempt-2"
+    stats = provider._resilience.snapshot()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    await provider.aclose()
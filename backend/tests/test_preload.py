@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from app.core.config import Settings
+from app.models.schemas import ModelInfo
+from app.providers.base import LLMProvider
+from app.providers.registry import ProviderRegistry
+from app.services.preload import ModelPreloader, estimate_model_bytes
+
+
+class _LocalProvider(LLMProvider):
+    id = "huggingface"
+    name = "Local"
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.loading = set()
+        self.max_loading = set()
+        self.warmed = []
+
+    async def load_model(self, model_id, **kwargs):
+        if model_id == "missing":
+            raise OSError("no such model")
+        self.loading.add(model_id)
+        if len(self.loading) > len(self.max_loading):
+            self.max_loading = set(self.loading)
+        await asyncio.sleep(0.05)
+        self.loading.discard(model_id)
+        return ModelInfo(id=model_id, provider=self.id, loaded=True)
+
+    async def generate(self, payload):
+        self.warmed.append((payload.model, payload.max_tokens))
+
+    async def get_models(self):  # pragma: no cover - unused
+        return []
+
+
+def _write_weights(root, model_id, size):
+    path = root / model_id
+    path.mkdir(parents=True)
+    (path / "model.safetensors").write_bytes(b"\0" * size)
+
+
+@pytest.mark.asyncio
+async def test_preloader_warms_models_within_memory_budget(tmp_path):
+    for model_id in ("a", "b", "c"):
+        _write_weights(tmp_path, model_id, 60)
+    settings = Settings(
+        local_models_path=str(tmp_path),
+        preload_models=["a", "b", "c", "missing"],
+        preload_concurrency=4,
+        preload_memory_bytes=150,
+        preload_warmup_tokens=2,
+    )
+    registry = ProviderRegistry(settings)
+    provider = _LocalProvider(settings)
+    registry._providers = {provider.id: provider}
+    preloader = ModelPreloader(settings, registry)
+
+    assert not preloader.ready
+    preloader.start()
+    await asyncio.sleep(0.02)
+    assert preloader.snapshot()["models"]["a"]["status"] == "loading"
+    await asyncio.wait_for(preloader._task, 2)
+
+    assert preloader.ready
+    # Two 60-byte models fit the 150-byte budget at once; the third waits.
+    assert len(provider.max_loading) == 2
+    assert sorted(provider.warmed) == [("a", 2), ("b", 2), ("c", 2)]
+    models = preloader.snapshot()["models"]
+    assert models["a"]["status"] == "ready"
+    assert models["a"]["estimated_bytes"] == 60
+    assert models["a"]["load_seconds"] >= 0.05
+    assert models["a"]["warmup_seconds"] is not None
+    assert models["missing"]["status"] == "failed"
+    assert models["missing"]["error"] == "no such model"
+
+
+def test_preloader_without_models_is_ready():
+    settings = Settings()
+    preloader = ModelPreloader(settings, ProviderRegistry(settings))
+
+    assert preloader.ready
+    assert estimate_model_bytes("unknown/model", []) is None
@@ -0,0 +1,119 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.core.config import Settings
+from app.models.schemas import ModelInfo
+from app.providers.base import LLMProvider, ProviderError
+from app.providers.registry import ProviderRegistry
+
+
+class _StubProvider(LLMProvider):
+    name = "Stub"
+
+    def __init__(self, settings, provider_id, delay=0.0, error=None):
+        super().__init__(settings)
+        self.id = provider_id
+        self.delay = delay
+        self.error = error
+
+    async def generate(self, payload):  # pragma: no cover - unused
+        raise NotImplementedError
+
+    async def get_models(self):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [ModelInfo(id=f"{self.id}-model", provider=self.id)]
+
+
+@pytest.mark.asyncio
+async def test_list_models_returns_partial_results_with_status():
+    settings = Settings(model_list_timeout=0.05)
+    registry = ProviderRegistry(settings)
+    registry._providers = {
+        "slow": _StubProvider(settings, "slow", delay=5),
+        "broken": _StubProvider(settings, "broken", error=RuntimeError("boom")),
+        "local": _StubProvider(settings, "local"),
+    }
+
+    catalog = await asyncio.wait_for(registry.collect_models(), 1)
+
+    assert [model.id for model in catalog.models] == ["local-model"]
+    statuses = {status.provider: status for status in catalog.providers}
+    assert statuses["slow"].status == "timeout"
+    assert statuses["broken"].status == "error"
+    assert statuses["broken"].error == "boom"
+    assert statuses["local"].model_count == 1
+
+
+def test_providers_are_created_on_first_use():
+    registry = ProviderRegistry(Settings(enabled_providers=["openrouter", "nope"]))
+
+    assert registry.initialized() == []
+    with pytest.raises(ProviderError):
+        registry.get("huggingface")
+    provider = registry.get("openrouter")
+    assert registry.get("openrouter") is provider
+    assert registry.initialized() == ["openrouter"]
+
+
+@pytest.mark.asyncio
+async def test_lazily_created_provider_startup_is_awaited(monkeypatch):
+    from app.providers.openrouter import OpenRouterProvider
+
+    attempts = []
+
+    async def startup(self):
+        attempts.append(self)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("no network")
+
+    monkeypatch.setattr(OpenRouterProvider, "startup", startup)
+    registry = ProviderRegistry(Settings(enabled_providers=["openrouter"]))
+    await registry.startup()
+
+    with pytest.raises(ProviderError, match="no network"):
+        await registry.get_ready("openrouter")
+    assert registry.initialized() == []
+
+    provider = await registry.get_ready("openrouter")
+    assert attempts == [attempts[0], provider]
+    assert await registry.get_ready("openrouter") is provider
+    await registry.aclose()
+
+
+def test_importing_the_app_skips_heavy_libraries():
+    probe = """
+import sys
+import app.main
+from app.core.dependencies import get_provider_registry
+get_provider_registry().get("openrouter")
+print(",".join(m for m in ("torch", "transformers", "huggingface_hub") if m in sys.modules))
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).resolve().parents[1],
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_listing_providers_does_not_construct_them():
+    registry = ProviderRegistry(Settings(openrouter_api_key="key"))
+
+    infos = {info.id: info for info in registry.list_providers()}
+
+    assert registry.initialized() == []
+    assert registry.provider_ids() == ["openrouter", "huggingface"]
+    assert infos["openrouter"].meta["api_key_source"] == "env"
+    assert infos["huggingface"].meta["engine"] == "micro_batch"
+
+    registry.get("openrouter").set_api_key("runtime")
+    assert registry.list_providers()[0].meta["api_key_source"] == "runtime"
@@ -254,7 +254,8 @@ export default function App() {
       if (supportsStreaming) {
         cancelRef.current = streamChatCompletion<ChatCompletionChunk>(requestPayload, {
           onChunk: (chunk) => {
-            const delta = chunk.delta?.content ?? "";
+            const delta =
+              chunk.delta?.content ?? chunk.choices?.[0]?.delta?.content ?? "";
             if (delta) {
               const current = useChatStore.getState().messages;
               if (current[current.length - 1]?.role !== "assistant") return;
@@ -25,12 +25,21 @@ export interface ChatCompletionRequest {
 export interface ChatCompletionChunk {
   id: string;
   model: string;
-  index: number;
-  delta: {
+  index?: number;
+  delta?: {
     content?: string;
     role?: ChatRole;
     finish_reason?: string | null;
   };
+  /** Present on frames relayed verbatim from OpenAI-compatible upstreams. */
+  choices?: Array<{
+    index: number;
+    delta?: {
+      content?: string | null;
+      role?: ChatRole;
+    };
+    finish_reason?: string | null;
+  }>;
   provider: string;
   meta?: Record<string, unknown>;
 }